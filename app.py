@@ -3,12 +3,18 @@ Módulo Principal de la Aplicación Flask - Restaurante Callejón 9
 """
 from dotenv import load_dotenv
 load_dotenv()
-from flask import Flask, request, session, redirect, url_for
+from flask import Flask, redirect, url_for
 from flask_cors import CORS
 from routes import routes_bp
 import os
 import sys
+import threading
 from flask_session import Session
+from services.sessions.session_store import crear_session_interface
+from services.observability.request_logging import RequestLogger
+from services.observability.metrics import RequestMetrics
+from services.support.faq_search import get_faq_index
+from services.scheduler.scheduler import get_scheduler
 from datetime import datetime
 # Configuración de entorno para PySpark
 os.environ["PYSPARK_PYTHON"] = sys.executable
@@ -27,20 +33,22 @@ lista_origenes = [
 
 CORS(app, resources={r"/*": {"origins": lista_origenes}}, supports_credentials=True)
 
-# Logging de peticiones
-@app.before_request
-def log_request_info():
-    """Log de información de cada petición"""
-    if request.path.startswith("/static"):
-        return
-    
-    print(f"\n📡 Petición: {request.method} {request.path}")
-    print(f"   🍪 Cookies: {list(request.cookies.keys())}")
-    
-    if 'usuario_id' in session:
-        print(f"   ✅ Usuario: {session.get('usuario_nombre')} (Rol: {session.get('usuario_rol')})")
-    else:
-        print(f"   ❌ Sin sesión activa")
+# Logging estructurado de peticiones (JSON, asíncrono y muestreado)
+RequestLogger(app)
+
+# Métricas de latencia por ruta y comandos Mongo (expuestas en /metrics)
+RequestMetrics(app)
+
+# Índice de búsqueda de FAQ: se construye al arrancar sin bloquear el inicio
+threading.Thread(target=get_faq_index().refrescar, daemon=True).start()
+
+# Planificador de tareas (respaldos, alertas, consolidaciones, retención).
+# Por defecto corre en su propio proceso, fuera de los workers web
+# (python -m cqrs.commands.admin.run_scheduler_command). SCHEDULER_EMBEDDED=1
+# lo arranca además dentro de cada worker (desarrollo o un solo proceso); la
+# concesión en Mongo hace que cada tarea la ejecute uno solo
+if os.getenv("SCHEDULER_EMBEDDED", "0") == "1":
+    get_scheduler().iniciar()
 
 # Registrar Blueprint de rutas
 app.register_blueprint(routes_bp)
@@ -53,20 +61,27 @@ register_reports_routes(app)
 app.secret_key = os.getenv("SECRET_KEY", "22d6225b061b6b75979d7b4fd5bfb6993b32a66346c0d188fd6f3a37ac36698e")
 
 # Configuración de Sesiones
-session_dir = os.path.join(os.getcwd(), "flask_session")
-if not os.path.exists(session_dir):
-    os.makedirs(session_dir)
+# SESSION_BACKEND: "mongo" (compartido entre workers), "memory" o "filesystem" (legacy)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "mongo")
 
-app.config["SESSION_TYPE"] = "filesystem"
-app.config["SESSION_FILE_DIR"] = session_dir
 app.config["SESSION_PERMANENT"] = True
 app.config["SESSION_USE_SIGNER"] = True
 app.config["SESSION_COOKIE_SECURE"] = False  # True en producción
 app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
 app.config["SESSION_COOKIE_NAME"] = "callejon9_session"
 
-# Inicializar extensión de sesiones
-Session(app)
+if SESSION_BACKEND == "filesystem":
+    session_dir = os.path.join(os.getcwd(), "flask_session")
+    if not os.path.exists(session_dir):
+        os.makedirs(session_dir)
+
+    app.config["SESSION_TYPE"] = "filesystem"
+    app.config["SESSION_FILE_DIR"] = session_dir
+
+    # Inicializar extensión de sesiones
+    Session(app)
+else:
+    app.session_interface = crear_session_interface(SESSION_BACKEND)
 @app.context_processor
 def inject_now():
     return {"now": datetime.now}
@@ -1,6 +1,7 @@
 import os
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from services.observability.metrics import event_listeners
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -15,7 +16,7 @@ if not MONGO_DB_NAME:
     raise ValueError("Error: la variable MONGO_DB_NAME no está definida en el archivo .env")
 
 try:
-    client = MongoClient(MONGO_URI)
+    client = MongoClient(MONGO_URI, event_listeners=event_listeners())
     db = client[MONGO_DB_NAME]
     print(f"[MongoDB] Conectado correctamente a la base '{MONGO_DB_NAME}'")
 except Exception as e:
@@ -5,16 +5,21 @@ from flask import render_template, request, redirect, url_for, flash, jsonify, s
 from bson import json_util
 from config.db import db
 from controllers.notificaciones.notificacion_controller import NotificacionSistemaController
-import zipfile
-import threading
-import schedule
-import time
+from models.respaldo_model import CatalogoRespaldos, VERIFICACION_FALLIDA
+from services.backups.backups import (
+    crear_respaldo, leer_manifest, restaurar_respaldo, restaurar_cadena, planear_restauracion, recolectar_chunks,
+    verificar_respaldo, vista_previa,
+    COLECCIONES_INTERNAS, BACKUP_CODEC, BACKUP_FULL_EVERY_DAYS, BACKUP_AUTO_FORMAT, TIPO_INCREMENTAL, EXTENSION_CAS
+)
+from services.backups.captura import purgar_segmentos
+from services.scheduler.scheduler import get_scheduler
+from services.scheduler.jobs import JOB_RESPALDO, JOB_VERIFICACION, cron_respaldo
 
 class BackupController:
     
-    # Variable de clase para el thread de auto-backup
-    _backup_thread = None
-    _backup_running = False
+    # Fuera del respaldo automático: la configuración y las colecciones internas
+    # (catálogo, historial, captura, planificador, sesiones), que tampoco se restauran
+    COLECCIONES_EXCLUIDAS = ('configuracion',) + COLECCIONES_INTERNAS
     
     @staticmethod
     def index():
@@ -23,29 +28,17 @@ class BackupController:
         if not os.path.exists(backup_dir): 
             os.makedirs(backup_dir)
         
-        # Obtener SOLO los nombres de archivos (strings) - NO diccionarios
-        all_files = []
-        try:
-            files_in_dir = os.listdir(backup_dir)
-            # Filtrar solo archivos (no directorios) y ordenar por fecha de modificación
-            all_files = sorted(
-                [f for f in files_in_dir if os.path.isfile(os.path.join(backup_dir, f))],
-                key=lambda x: os.path.getmtime(os.path.join(backup_dir, x)),
-                reverse=True
-            )
-        except Exception as e:
-            print(f"Error al listar archivos: {e}")
-            all_files = []
+        # Primer uso del catálogo: registra los respaldos que ya estaban en disco
+        if CatalogoRespaldos.contar() == 0:
+            CatalogoRespaldos.sincronizar(backup_dir)
         
-        # --- LÓGICA DE PAGINACIÓN ---
+        # --- LÓGICA DE PAGINACIÓN (consulta indexada sobre el catálogo) ---
         page = request.args.get('page', 1, type=int)
         per_page = 10
-        total_files = len(all_files)
+        total_files = CatalogoRespaldos.contar()
         total_pages = (total_files + per_page - 1) // per_page if total_files > 0 else 1
         
-        start = (page - 1) * per_page
-        end = start + per_page
-        files = all_files[start:end]
+        respaldos = CatalogoRespaldos.listar(skip=max(page - 1, 0) * per_page, limite=per_page)
 
         # Colecciones para el formulario
         collections = [
@@ -68,16 +61,9 @@ class BackupController:
         # Obtener configuración de auto-backup
         auto_backup_config = db.configuracion.find_one({"tipo": "auto_backup"}) or {}
         
-        # ✅ INICIAR AUTO-BACKUP SI ESTÁ CONFIGURADO
-        if auto_backup_config.get('enabled'):
-            BackupController._schedule_auto_backups(
-                auto_backup_config.get('frequency', 'daily'),
-                auto_backup_config.get('hour', '02:00')
-            )
-        
         return render_template(
             "admin/admin/backup.html", 
-            files=files,  # ✅ Lista de STRINGS, NO diccionarios
+            respaldos=respaldos,  # Entradas del catálogo (archivo, tamaño, colecciones, documentos)
             collections=collections,
             page=page,
             total_pages=total_pages,
@@ -93,7 +79,7 @@ class BackupController:
             os.makedirs(backup_dir)
 
         # Captura de datos del formulario
-        selected_collections = request.form.getlist('collections')
+        selected_collections = [c for c in request.form.getlist('collections') if c not in COLECCIONES_INTERNAS]
         time_range = request.form.get('time_range', 'all')
         file_format = request.form.get('format', 'json')
         custom_name = request.form.get('backup_name', 'respaldo').strip()
@@ -106,48 +92,44 @@ class BackupController:
             flash("❌ Debes seleccionar al menos una colección para respaldar", "error")
             return redirect(url_for('routes.admin_backup_view'))
         
-        # Generar nombre de archivo
+        # Nombre base del archivo (la extensión la pone crear_respaldo según el formato)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{custom_name}_{timestamp}.{file_format}"
-        full_path = os.path.join(backup_dir, filename)
 
         try:
-            backup_data = {}
             date_filter = {}
 
             # Filtro por rango de tiempo
             if time_range != 'all':
                 days = 1 if time_range == '24h' else 7 if time_range == '7d' else 30
                 limit_date = datetime.utcnow() - timedelta(days=days)
-                date_filter = {"created_at": {"$gte": limit_date}}
-
-            # Extracción de datos de MongoDB
-            for col_name in selected_collections:
-                try:
-                    data = list(db[col_name].find(date_filter))
-                    # Usamos json_util para manejar ObjectIds y Fechas de Mongo
-                    backup_data[col_name] = json.loads(json_util.dumps(data))
-                except Exception as col_error:
-                    print(f"⚠️ Error al respaldar colección {col_name}: {col_error}")
-                    backup_data[col_name] = []
+                # updated_at incluye los documentos modificados en el rango, no solo los creados
+                date_filter = {"$or": [{"created_at": {"$gte": limit_date}}, {"updated_at": {"$gte": limit_date}}]}
 
             # Guardado físico del archivo
             if file_format == 'json':
-                with open(full_path, 'w', encoding='utf-8') as f:
-                    json.dump(backup_data, f, ensure_ascii=False, indent=4)
+                # Extended JSON por líneas en gzip, escrito en streaming desde los cursores
+                stats = crear_respaldo(f"{custom_name}_{timestamp}", selected_collections, db, date_filter)
+                filename = stats["archivo"]
             elif file_format == 'zip':
-                # Crear archivo temporal JSON
-                temp_json = full_path.replace('.zip', '.json')
-                with open(temp_json, 'w', encoding='utf-8') as f:
-                    json.dump(backup_data, f, ensure_ascii=False, indent=4)
-                
-                # Comprimir a ZIP
-                with zipfile.ZipFile(full_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    zipf.write(temp_json, os.path.basename(temp_json))
-                
-                # Eliminar temporal
-                os.remove(temp_json)
+                # Un miembro por colección escrito directo desde el cursor, con manifest de checksums
+                codec = request.form.get('codec', BACKUP_CODEC)
+                level = request.form.get('level', type=int)
+                stats = crear_respaldo(f"{custom_name}_{timestamp}", selected_collections, db, date_filter,
+                                       formato="zip", codec=codec, nivel=level)
+                filename = stats["archivo"]
+            elif file_format == 'cas':
+                # Solo se escriben los chunks que no estén ya en el almacén deduplicado
+                codec = request.form.get('codec', BACKUP_CODEC)
+                level = request.form.get('level', type=int)
+                stats = crear_respaldo(f"{custom_name}_{timestamp}", selected_collections, db, date_filter,
+                                       formato="cas", codec=codec, nivel=level)
+                filename = stats["archivo"]
+            else:
+                raise ValueError(f"Formato de respaldo no soportado: {file_format}")
             
+            CatalogoRespaldos.registrar(stats, usuario_id=session.get("usuario_id"))
+            # La verificación corre en segundo plano en el siguiente tick del planificador
+            get_scheduler().ejecutar_ahora(JOB_VERIFICACION)
             flash(f"✅ Respaldo '{filename}' generado con éxito. Total de colecciones: {len(selected_collections)}", "success")
             
             # ✨ NOTIFICAR BACKUP CREADO
@@ -182,6 +164,7 @@ class BackupController:
             file_path = os.path.join('static', 'backup', filename)
             if os.path.exists(file_path):
                 os.remove(file_path)
+                CatalogoRespaldos.eliminar(filename)
                 flash(f"✅ Archivo '{filename}' eliminado correctamente.", "success")
             else:
                 flash("❌ El archivo no existe.", "error")
@@ -192,95 +175,172 @@ class BackupController:
 
     @staticmethod
     def restore():
-        """Ejecutar restauración de base de datos"""
+        """Ejecutar restauración de base de datos en streaming, con upserts por lotes"""
         server_file = request.form.get('server_file')
-        file_to_restore = None
+        colecciones = request.form.getlist('restore_collections') or None
+        dry_run = request.form.get('dry_run') in ('1', 'on', 'true')
+        registro = None
 
         try:
             if server_file:
                 # Restaurar desde archivo local en el servidor
-                file_path = os.path.join('static', 'backup', server_file)
+                backup_dir = os.path.join('static', 'backup')
+                file_path = os.path.join(backup_dir, server_file)
+                if not os.path.isfile(file_path):
+                    flash("❌ El archivo no existe.", "error")
+                    return redirect(url_for('routes.admin_backup_view'))
                 
-                # Si es ZIP, extraer primero
-                if server_file.endswith('.zip'):
-                    with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                        # Extraer a carpeta temporal
-                        temp_dir = os.path.join('static', 'backup', 'temp')
-                        os.makedirs(temp_dir, exist_ok=True)
-                        zip_ref.extractall(temp_dir)
-                        
-                        # Buscar el archivo JSON extraído
-                        json_files = [f for f in os.listdir(temp_dir) if f.endswith('.json')]
-                        if json_files:
-                            json_path = os.path.join(temp_dir, json_files[0])
-                            with open(json_path, 'r', encoding='utf-8') as f:
-                                data = json.load(f)
-                        else:
-                            raise Exception("No se encontró archivo JSON en el ZIP")
-                        
-                        # Limpiar carpeta temporal
-                        import shutil
-                        shutil.rmtree(temp_dir)
-                else:
-                    # Archivo JSON directo
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
+                # Un incremental se restaura sobre su respaldo completo y los incrementales previos
+                plan = planear_restauracion(server_file, backup_dir)
+                # Toda la cadena se verifica antes de escribir: un archivo dañado no deja la restauración a medias
+                for archivo in plan:
+                    BackupController._verificar(os.path.join(backup_dir, archivo), archivo)
+                registro = BackupController._registrar_restauracion(
+                    server_file, dry_run, colecciones, [os.path.join(backup_dir, a) for a in plan]
+                )
+                plan, resumen = restaurar_cadena(server_file, db, backup_dir, colecciones, dry_run, registro)
                         
             elif 'backup_file' in request.files:
-                # Restaurar desde archivo subido por el usuario
+                # Restaurar desde archivo subido por el usuario, leído directo del stream
                 file = request.files['backup_file']
                 if file.filename == '':
                     flash("❌ No se seleccionó ningún archivo.", "error")
                     return redirect(url_for('routes.admin_backup_view'))
+                if file.filename.endswith(EXTENSION_CAS):
+                    # Solo es el manifest: los chunks están en el almacén del servidor
+                    flash("❌ Un respaldo deduplicado (.cas.json) no se puede subir: "
+                          "restáuralo desde la lista de respaldos del servidor.", "error")
+                    return redirect(url_for('routes.admin_backup_view'))
                 
-                # Leer archivo
-                if file.filename.endswith('.zip'):
-                    # Procesar ZIP
-                    temp_dir = os.path.join('static', 'backup', 'temp_upload')
-                    os.makedirs(temp_dir, exist_ok=True)
-                    
-                    zip_path = os.path.join(temp_dir, file.filename)
-                    file.save(zip_path)
-                    
-                    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_dir)
-                    
-                    json_files = [f for f in os.listdir(temp_dir) if f.endswith('.json')]
-                    if json_files:
-                        with open(os.path.join(temp_dir, json_files[0]), 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                    else:
-                        raise Exception("No se encontró JSON en el ZIP")
-                    
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                else:
-                    # JSON directo
-                    data = json.loads(file.read().decode('utf-8'))
+                BackupController._verificar(file.stream, file.filename)
+                # Un incremental subido sin su cadena solo se aplica encima de los datos actuales
+                manifest = leer_manifest(file.stream)
+                incremental = (manifest or {}).get("tipo") == TIPO_INCREMENTAL
+                registro = BackupController._registrar_restauracion(file.filename, dry_run, colecciones, [file.stream])
+                plan = [file.filename]
+                resumen = restaurar_respaldo(file.stream, db, reemplazar=not incremental, colecciones=colecciones,
+                                             dry_run=dry_run, progreso=registro)
             else:
                 flash("❌ No hay origen de datos para restaurar.", "error")
                 return redirect(url_for('routes.admin_backup_view'))
 
-            # Proceso de restauración en MongoDB
-            restored_collections = 0
-            for col_name, documents in data.items():
-                if documents:
-                    try:
-                        # Convertir JSON a objetos BSON (ObjectIds, Dates)
-                        bson_docs = json_util.loads(json.dumps(documents))
-                        db[col_name].drop()  # Limpia la colección actual
-                        db[col_name].insert_many(bson_docs)
-                        restored_collections += 1
-                    except Exception as col_error:
-                        print(f"⚠️ Error restaurando {col_name}: {col_error}")
-            
-            flash(f"✅ Sistema restaurado con éxito. {restored_collections} colecciones restauradas.", "success")
+            BackupController._terminar_restauracion(registro, resumen)
+            restored_collections = len(resumen["colecciones"])
+            cadena = f" ({len(plan)} respaldos aplicados)" if len(plan) > 1 else ""
+
+            if dry_run:
+                detalle = "; ".join(resumen["errores"][:3])
+                categoria = "error" if resumen["invalidos"] else "success"
+                flash(f"🔎 Validación completada sin escribir datos: {resumen['documentos']} documentos válidos "
+                      f"en {restored_collections} colecciones{cadena}, {resumen['invalidos']} inválidos. {detalle}", categoria)
+            else:
+                flash(f"✅ Sistema restaurado con éxito. {restored_collections} colecciones restauradas "
+                      f"({resumen['documentos']} documentos){cadena}.", "success")
             
         except Exception as e:
             print(f"❌ Error en la restauración: {str(e)}")
             flash(f"❌ Error en la restauración: {str(e)}", "error")
+            if registro:
+                BackupController._terminar_restauracion(registro, error=str(e))
             
         return redirect(url_for('routes.admin_backup_view'))
+
+    @staticmethod
+    def _verificar(origen, nombre):
+        """
+        Verifica un respaldo antes de restaurarlo; si está en el catálogo
+        guarda el resultado y compara también el SHA-256 del archivo
+
+        Raises:
+            ValueError: Si el respaldo no pasó la verificación
+        """
+        entrada = CatalogoRespaldos.obtener(nombre) if isinstance(origen, str) else None
+        resultado = verificar_respaldo(origen, sha256=(entrada or {}).get("sha256"))
+        if entrada:
+            CatalogoRespaldos.registrar_verificacion(nombre, resultado)
+        # Sin manifest (formato anterior) no hay contra qué verificar: se restaura como antes
+        if resultado["valido"] is False:
+            raise ValueError(f"El respaldo '{nombre}' no pasó la verificación: {'; '.join(resultado['errores'][:3])}")
+        return resultado
+
+    @staticmethod
+    def preview(filename):
+        """Colecciones y documentos de un respaldo leídos solo de su manifest, con su verificación (JSON)"""
+        file_path = os.path.join('static', 'backup', filename)
+        if not os.path.isfile(file_path):
+            return jsonify({"success": False, "message": "El archivo no existe"}), 404
+
+        try:
+            respaldo = vista_previa(file_path)
+        except Exception as e:
+            return jsonify({"success": False, "message": f"No se pudo leer el manifest: {e}"}), 422
+
+        entrada = CatalogoRespaldos.obtener(filename) or {}
+        return jsonify({
+            "success": True,
+            "respaldo": respaldo,  # None en el formato anterior, sin manifest
+            "verificacion": json.loads(json_util.dumps(entrada.get("verificacion")))
+        })
+
+    @staticmethod
+    def _registrar_restauracion(nombre, dry_run, colecciones, origenes):
+        """
+        Crea el registro de progreso en "restauraciones" y devuelve el callback
+        que lo actualiza después de cada lote
+        """
+        # Total esperado desde los manifest (los respaldos del formato anterior no lo tienen)
+        total = 0
+        for origen in origenes:
+            manifest = leer_manifest(origen)
+            if not manifest:
+                total = None
+                break
+            total += sum(d.get("documentos", 0) for c, d in manifest["colecciones"].items()
+                         if not colecciones or c in colecciones)
+
+        registro_id = db.restauraciones.insert_one({
+            "archivo": nombre,
+            "estado": "en_curso",
+            "dry_run": dry_run,
+            "colecciones_seleccionadas": colecciones,
+            "total": total,
+            "documentos": 0,
+            "usuario_id": session.get("usuario_id"),
+            "inicio": datetime.utcnow()
+        }).inserted_id
+
+        def progreso(resumen):
+            db.restauraciones.update_one({"_id": registro_id}, {"$set": {
+                "coleccion": resumen["coleccion"],
+                "colecciones": resumen["colecciones"],
+                "documentos": resumen["documentos"],
+                "actualizado": datetime.utcnow()
+            }})
+
+        progreso.registro_id = registro_id
+        return progreso
+
+    @staticmethod
+    def _terminar_restauracion(registro, resumen=None, error=None):
+        cambios = {"estado": "error" if error else "completada", "fin": datetime.utcnow()}
+        if resumen:
+            cambios.update(colecciones=resumen["colecciones"], documentos=resumen["documentos"],
+                           invalidos=resumen["invalidos"], errores=resumen["errores"])
+        if error:
+            cambios["error"] = error
+        db.restauraciones.update_one({"_id": registro.registro_id}, {"$set": cambios})
+
+    @staticmethod
+    def restore_progress():
+        """Estado de la última restauración (consultado por la vista mientras corre)"""
+        registro = db.restauraciones.find_one(sort=[("inicio", -1)])
+        if not registro:
+            return jsonify({"success": True, "restauracion": None})
+
+        registro["_id"] = str(registro["_id"])
+        total = registro.get("total")
+        registro["porcentaje"] = round(100 * registro.get("documentos", 0) / total, 1) if total else None
+        return jsonify({"success": True, "restauracion": json.loads(json_util.dumps(registro))})
     
     @staticmethod
     def configure_auto_backup():
@@ -307,12 +367,11 @@ class BackupController:
                 upsert=True
             )
             
-            # Iniciar o detener el scheduler
+            # El planificador recalcula la próxima ejecución con el nuevo horario
+            get_scheduler().programar(JOB_RESPALDO, cron=cron_respaldo(frequency, hour), habilitado=bool(enabled))
             if enabled:
-                BackupController._schedule_auto_backups(frequency, hour)
                 message = "✅ Respaldos automáticos activados correctamente"
             else:
-                BackupController._backup_running = False
                 message = "✅ Respaldos automáticos desactivados"
             
             return jsonify({
@@ -328,104 +387,136 @@ class BackupController:
             }), 500
     
     @staticmethod
-    def _schedule_auto_backups(frequency, hour):
-        """Programar respaldos automáticos"""
-        if BackupController._backup_running:
-            return  # Ya está corriendo
+    def scheduler_status():
+        """Tareas programadas con su próxima ejecución y su historial reciente (JSON)"""
+        tareas = get_scheduler().estado(historial=request.args.get('historial', 10, type=int))
+        return jsonify({"success": True, "tareas": json.loads(json_util.dumps(tareas))})
+    
+    @staticmethod
+    def _ejecutar_respaldo_automatico():
+        """
+        Ejecutar respaldo automático programado (tarea respaldo_automatico del
+        planificador; los errores se propagan para quedar en su historial)
+        """
+        print("🤖 Ejecutando respaldo automático...")
         
-        BackupController._backup_running = True
+        backup_dir = os.path.join('static', 'backup')
+        os.makedirs(backup_dir, exist_ok=True)
         
-        def run_scheduler():
-            # Limpiar trabajos anteriores
-            schedule.clear()
-            
-            # Programar según frecuencia
-            if frequency == 'daily':
-                schedule.every().day.at(hour).do(BackupController._ejecutar_respaldo_automatico)
-            elif frequency == 'weekly':
-                schedule.every().monday.at(hour).do(BackupController._ejecutar_respaldo_automatico)
-            elif frequency == 'monthly':
-                schedule.every(30).days.at(hour).do(BackupController._ejecutar_respaldo_automatico)
-            
-            print(f"📅 Auto-backup programado: {frequency} a las {hour}")
-            
-            # Loop del scheduler
-            while BackupController._backup_running:
-                schedule.run_pending()
-                time.sleep(60)  # Revisar cada minuto
+        # Obtener todas las colecciones (excepto configuración y el propio registro de respaldos)
+        collections = [c for c in db.list_collection_names() if c not in BackupController.COLECCIONES_EXCLUIDAS]
+        
+        # Incremental sobre el último respaldo automático mientras la cadena sea reciente
+        base = BackupController._base_incremental(backup_dir)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        nombre = f"auto_backup_{timestamp}" + ("_inc" if base else "")
+        stats = crear_respaldo(nombre, collections, db, directorio=backup_dir, formato=BACKUP_AUTO_FORMAT, base=base)
+        CatalogoRespaldos.registrar(stats, automatico=True)
+        get_scheduler().ejecutar_ahora(JOB_VERIFICACION)
         
-        # Crear thread daemon
-        if BackupController._backup_thread is None or not BackupController._backup_thread.is_alive():
-            BackupController._backup_thread = threading.Thread(target=run_scheduler, daemon=True)
-            BackupController._backup_thread.start()
-            print("🤖 Thread de auto-backup iniciado")
+        print(f"✅ Respaldo automático {stats['manifest']['tipo']} creado: {stats['archivo']} "
+              f"({stats['documentos']} documentos en {stats['segundos']:.1f}s)")
+        return stats
     
     @staticmethod
-    def _ejecutar_respaldo_automatico():
-        """Ejecutar respaldo automático programado"""
-        try:
-            print("🤖 Ejecutando respaldo automático...")
-            
-            backup_dir = os.path.join('static', 'backup')
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            # Obtener todas las colecciones
-            collections = db.list_collection_names()
-            
-            # Crear respaldo
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"auto_backup_{timestamp}.json"
-            full_path = os.path.join(backup_dir, filename)
-            
-            backup_data = {}
-            for col_name in collections:
-                if col_name != 'configuracion':  # Excluir configuración
-                    try:
-                        data = list(db[col_name].find())
-                        backup_data[col_name] = json.loads(json_util.dumps(data))
-                    except Exception as e:
-                        print(f"⚠️ Error al respaldar {col_name}: {e}")
-                        backup_data[col_name] = []
-            
-            with open(full_path, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, ensure_ascii=False, indent=4)
-            
-            print(f"✅ Respaldo automático creado: {filename}")
-            
-            # Limpiar respaldos antiguos
-            BackupController._limpiar_respaldos_antiguos()
-            
-        except Exception as e:
-            print(f"❌ Error en respaldo automático: {e}")
-    
+    def _verificar_pendientes(limite=20):
+        """
+        Verifica los respaldos del catálogo con verificación pendiente (tarea
+        verificacion_respaldos del planificador) y notifica los que fallan
+
+        Returns:
+            tuple: (verificados, fallidos)
+        """
+        backup_dir = os.path.join('static', 'backup')
+        verificados = fallidos = 0
+        for entrada in CatalogoRespaldos.pendientes_verificacion(limite):
+            archivo = entrada["archivo"]
+            ruta = os.path.join(backup_dir, archivo)
+            if os.path.isfile(ruta):
+                resultado = verificar_respaldo(ruta, sha256=entrada.get("sha256"))
+            else:
+                resultado = {"valido": False, "errores": ["El archivo no existe"], "segundos": 0.0}
+            verificacion = CatalogoRespaldos.registrar_verificacion(archivo, resultado)
+            verificados += 1
+
+            if verificacion["estado"] == VERIFICACION_FALLIDA:
+                fallidos += 1
+                detalle = "; ".join(verificacion["errores"][:3])
+                print(f"❌ El respaldo {archivo} no pasó la verificación: {detalle}")
+                try:
+                    NotificacionSistemaController.notificar_error(
+                        usuario_id=None,
+                        tipo_error="BACKUP_VERIFICACION",
+                        descripcion=f"El respaldo {archivo} no se puede restaurar: {detalle}"
+                    )
+                except Exception as notif_error:
+                    print(f"⚠️ Error al notificar verificación: {notif_error}")
+        return verificados, fallidos
+
+    @staticmethod
+    def _base_incremental(backup_dir):
+        """Último respaldo automático del catálogo si su cadena sigue vigente, o None para uno completo"""
+        if BACKUP_FULL_EVERY_DAYS <= 0:
+            return None
+
+        ultimo = CatalogoRespaldos.ultimo_automatico()
+        if not ultimo or not ultimo.get("colecciones"):
+            return None
+
+        completo = CatalogoRespaldos.obtener(ultimo["completo"])
+        # La cadena solo sirve si todos sus archivos siguen en disco
+        if completo is None or not all(os.path.exists(os.path.join(backup_dir, a))
+                                       for a in (ultimo["archivo"], completo["archivo"])):
+            return None
+
+        antiguedad = datetime.utcnow() - completo["creado"]
+        return ultimo if antiguedad < timedelta(days=BACKUP_FULL_EVERY_DAYS) else None
+
     @staticmethod
     def _limpiar_respaldos_antiguos():
-        """Eliminar respaldos antiguos según la retención configurada"""
+        """
+        Eliminar respaldos antiguos según la retención configurada (tarea
+        retencion_respaldos del planificador)
+
+        Returns:
+            int: Archivos eliminados
+        """
+        deleted_count = 0
         try:
             config = db.configuracion.find_one({"tipo": "auto_backup"})
             if not config:
-                return
+                return deleted_count
             
             retention_days = config.get('retention_days', 30)
             backup_dir = os.path.join('static', 'backup')
             
-            if not os.path.exists(backup_dir):
-                return
-            
-            now = datetime.now()
-            deleted_count = 0
-            
-            for filename in os.listdir(backup_dir):
-                if filename.startswith('auto_backup_'):
-                    file_path = os.path.join(backup_dir, filename)
-                    file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    
-                    if (now - file_time).days > retention_days:
-                        os.remove(file_path)
-                        deleted_count += 1
+            # Una cadena (completo + incrementales) se elimina entera cuando su
+            # respaldo más reciente vence; borrar solo el completo dejaría
+            # incrementales imposibles de restaurar
+            for filename in CatalogoRespaldos.cadenas_vencidas(retention_days):
+                file_path = os.path.join(backup_dir, filename)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    deleted_count += 1
+                CatalogoRespaldos.eliminar(filename)
             
             if deleted_count > 0:
                 print(f"🗑️ Eliminados {deleted_count} respaldos antiguos")
+            
+            # Chunks que solo usaban los respaldos eliminados (o borrados a mano)
+            chunks, liberados = recolectar_chunks(backup_dir)
+            if chunks:
+                print(f"🧹 Eliminados {chunks} chunks sin referencias ({liberados / 1048576:.1f} MB)")
+            
+            # Cambios capturados anteriores al respaldo más antiguo: ya no hay base donde reproducirlos
+            mas_antiguo = CatalogoRespaldos.mas_antiguo()
+            if mas_antiguo:
+                segmentos = purgar_segmentos(mas_antiguo)
+                if segmentos:
+                    print(f"🧹 Eliminados {segmentos} segmentos de cambios anteriores al respaldo más antiguo")
                 
         except Exception as e:
-            print(f"Error al limpiar respaldos antiguos: {e}")
\ No newline at end of file
+            print(f"Error al limpiar respaldos antiguos: {e}")
+            raise
+
+        return deleted_count
@@ -1,7 +1,9 @@
-from flask import render_template, request, redirect, url_for, session, flash, jsonify
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, g
 from models.empleado_model import Usuario, RolPermisos
 from controllers.notificaciones.notificacion_controller import NotificacionSistemaController
 from services.security.two_factor_service import TwoFactorService
+from services.security.password_service import PasswordService, PasswordServiceBusy
+from services.security.rate_limiter import get_login_limiter
 import secrets
 import logging
 from functools import wraps
@@ -41,6 +43,8 @@ def login_required(f):
 
 
 def rol_required(roles_permitidos):
+    roles = frozenset(str(r) for r in roles_permitidos)
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -48,7 +52,7 @@ def rol_required(roles_permitidos):
                 return redirect(url_for("routes.login"))
             
             rol_actual = session.get("usuario_rol")
-            if str(rol_actual) not in [str(r) for r in roles_permitidos]:
+            if str(rol_actual) not in roles:
                 flash("No tienes permisos para acceder a esta pagina", "error")
                 return redirect(url_for("routes.login"))
             
@@ -74,6 +78,31 @@ def permiso_required(permiso):
     return decorator
 
 
+# Perfil del usuario autenticado (no se copia a la sesion)
+PERFILES_POR_ROL = {
+    "2": Usuario.get_perfil_mesero,
+    "3": Usuario.get_perfil_cocina,
+    "4": Usuario.get_perfil_inventario
+}
+
+
+def perfil_actual():
+    """
+    Devuelve el perfil especifico del rol del usuario en sesion.
+    Se consulta una sola vez por peticion y se guarda en flask.g.
+    """
+    if "perfil" not in g:
+        perfil = None
+        get_perfil = PERFILES_POR_ROL.get(str(session.get("usuario_rol")))
+        if get_perfil and "usuario_id" in session:
+            try:
+                perfil = get_perfil(Usuario.find_by_id(session["usuario_id"]))
+            except Exception as e:
+                logging.warning(f"No se pudo cargar el perfil: {e}")
+        g.perfil = perfil or {}
+    return g.perfil
+
+
 class AuthController:
     
     @staticmethod
@@ -96,6 +125,14 @@ class AuthController:
                 "message": "Por favor completa todos los campos"
             })
         
+        # Throttling antes de cualquier consulta de usuario o bcrypt
+        limiter = get_login_limiter()
+        ip = request.remote_addr
+        espera = limiter.verificar(ip=ip, email=email)
+        if espera:
+            logging.warning(f"Login bloqueado por rate limit - Email: {email} | IP: {ip}")
+            return AuthController._respuesta_bloqueo(espera)
+        
         try:
             usuario_doc = Usuario.find_by_email(email)
         except Exception as e:
@@ -106,6 +143,7 @@ class AuthController:
             })
         
         if not usuario_doc:
+            limiter.registrar_fallo(ip=ip, email=email)
             return jsonify({
                 "status": "error",
                 "message": "Credenciales incorrectas"
@@ -118,13 +156,24 @@ class AuthController:
                 "message": "No tienes permisos para acceder al sistema"
             })
         
-        stored_password = usuario_doc.get("usuario_clave", "")
-        if stored_password != password:
+        try:
+            clave_valida = AuthController._verificar_clave(usuario_doc, password)
+        except PasswordServiceBusy:
+            logging.warning(f"Pool de contraseñas saturado - Email: {email}")
+            return jsonify({
+                "status": "error",
+                "message": "El servidor esta ocupado, intenta de nuevo"
+            }), 503
+        
+        if not clave_valida:
+            limiter.registrar_fallo(ip=ip, email=email)
             return jsonify({
                 "status": "error",
                 "message": "Credenciales incorrectas"
             })
         
+        limiter.registrar_exito(email=email)
+        
         # Verificar estado de 2FA del usuario
         is_2fa_enabled = usuario_doc.get("2fa_enabled", False)
         logging.info(f"2FA status para {email}: enabled={is_2fa_enabled}")
@@ -135,6 +184,41 @@ class AuthController:
         logging.info(f"Login sin 2FA para {email}")
         return AuthController._crear_sesion(usuario_doc, rol)
     
+    @staticmethod
+    def _respuesta_bloqueo(espera):
+        response = jsonify({
+            "status": "error",
+            "message": f"Demasiados intentos. Intenta de nuevo en {espera} segundos"
+        })
+        response.headers["Retry-After"] = str(espera)
+        return response, 429
+    
+    @staticmethod
+    def _verificar_clave(usuario_doc, password):
+        """
+        Verifica la clave aceptando hashes bcrypt y claves legacy en texto plano.
+        En el primer login exitoso con clave legacy (o con un costo bcrypt
+        distinto al configurado) se guarda el hash actualizado.
+        """
+        stored_password = usuario_doc.get("usuario_clave") or ""
+        
+        if PasswordService.get_rounds(stored_password) is not None:
+            clave_valida, nuevo_hash = PasswordService.verify_and_update(password, stored_password)
+        else:
+            clave_valida = bool(stored_password) and secrets.compare_digest(
+                stored_password.encode("utf-8"), password.encode("utf-8")
+            )
+            nuevo_hash = PasswordService.hash_password(password) if clave_valida else None
+        
+        if nuevo_hash:
+            try:
+                Usuario.update_password(str(usuario_doc["_id"]), nuevo_hash)
+                logging.info(f"Hash de clave actualizado para {usuario_doc.get('usuario_email')}")
+            except Exception as e:
+                logging.warning(f"No se pudo actualizar el hash de clave: {e}")
+        
+        return clave_valida
+    
     @staticmethod
     def _iniciar_2fa(usuario_doc, rol):
         user_id = str(usuario_doc["_id"])
@@ -180,6 +264,14 @@ class AuthController:
         
         logging.info(f"verify_2fa iniciado para user_id: {user_id}")
         
+        limiter = get_login_limiter()
+        ip = request.remote_addr
+        clave_2fa = f"2fa:{user_id}"
+        espera = limiter.verificar(ip=ip, email=clave_2fa)
+        if espera:
+            logging.warning(f"verify_2fa bloqueado por rate limit - user_id: {user_id} | IP: {ip}")
+            return AuthController._respuesta_bloqueo(espera)
+        
         try:
             usuario_doc = Usuario.find_by_id(user_id)
         except Exception as e:
@@ -215,11 +307,14 @@ class AuthController:
             codigo_valido = TwoFactorService.verificar_codigo_temporal(user_id, codigo)
         
         if not codigo_valido:
+            limiter.registrar_fallo(ip=ip, email=clave_2fa)
             return jsonify({
                 "status": "error",
                 "message": "Codigo de verificacion incorrecto"
             })
         
+        limiter.registrar_exito(email=clave_2fa)
+        
         logging.info(f"2FA verificado exitosamente para usuario: {user_id}")
         
         session.pop("2fa_pending_user_id", None)
@@ -247,16 +342,10 @@ class AuthController:
         session["usuario_foto"] = usuario_doc.get("usuario_foto", "")
         session["token_session"] = token_session
         session["theme"] = SESSION_CONFIG["theme_default"]
-        session["permisos"] = RolPermisos.get_permisos(rol)
         
         session["2fa_enabled"] = usuario_doc.get("2fa_enabled", False)
         session["2fa_verificado"] = True
         
-        if rol == "2":
-            session["perfil_mesero"] = Usuario.get_perfil_mesero(usuario_doc)
-        elif rol == "3":
-            session["perfil_cocina"] = Usuario.get_perfil_cocina(usuario_doc)
-        
         endpoint_data = ROL_ENDPOINTS.get(rol)
         
         if endpoint_data:
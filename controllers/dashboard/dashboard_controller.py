@@ -5,6 +5,8 @@ CORRECCIÓN: Agregado soporte para rol de inventario (4) en validación
 from flask import request, session, redirect, url_for, render_template, jsonify
 from controllers.inventario.inventarioController import InventarioController
 from models.empleado_model import Usuario, RolPermisos
+from services.security.password_service import PasswordService
+from controllers.auth.AuthController import perfil_actual
 from config.db import db
 from bson.objectid import ObjectId
 from datetime import datetime
@@ -69,7 +71,7 @@ class DashboardController:
         if "usuario_rol" not in session or str(session["usuario_rol"]) != "2":
             return redirect(url_for("routes.login"))
         
-        perfil_mesero = session.get("perfil_mesero", {})
+        perfil_mesero = perfil_actual()
         comandas_activas = []
         
         stats = {
@@ -92,7 +94,7 @@ class DashboardController:
         if "usuario_rol" not in session or str(session["usuario_rol"]) != "3":
             return redirect(url_for("routes.login"))
         
-        perfil_cocina = session.get("perfil_cocina", {})
+        perfil_cocina = perfil_actual()
         comandas_pendientes = []
         
         stats = {
@@ -167,7 +169,7 @@ class DashboardController:
                     "usuario_nombre": data["nombre"],
                     "usuario_apellidos": data["apellidos"],
                     "usuario_email": data["email"].lower(),
-                    "usuario_clave": data["password"],
+                    "usuario_clave": PasswordService.hash_password(data["password"]),
                     "usuario_rol": data["rol"],
                     "usuario_telefono": data.get("telefono", ""),
                     "usuario_foto": None,
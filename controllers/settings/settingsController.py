@@ -116,7 +116,11 @@ class SettingsController:
         tipo = request.json.get('tipo', 'app')
 
         if tipo == 'app':
-            secret_key = TwoFactorService.generar_secret()
+            # Un reintento del setup reutiliza el secret pendiente: el QR es el mismo
+            # (la app no queda con una cuenta vieja) y lo sirve la cache de QRService
+            secret_key = session.get('temp_2fa_secret') if session.get('temp_2fa_tipo') == 'app' else None
+            if not secret_key or request.json.get('regenerar'):
+                secret_key = TwoFactorService.generar_secret()
             username = user.get('usuario_email')
 
             if not username:
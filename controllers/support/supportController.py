@@ -2,9 +2,68 @@ from flask import render_template, request, jsonify, session, redirect, url_for
 from config.db import db
 from bson.objectid import ObjectId
 from datetime import datetime, timedelta
+import logging
+import os
+import time
+import threading
+from models.soporte_model import (
+    Ticket, PrioridadTicket, ESTADOS_ABIERTOS, ESTADOS_CERRADOS,
+    normalizar_estado, normalizar_prioridad
+)
+from services.support.faq_search import get_faq_index, FAQ_MIN_SCORE
+from services.support.embeddings import get_similarity_service, EmbeddingsNoDisponibles
+
+# Similitud mínima para considerar una FAQ semántica como respuesta
+FAQ_MIN_SIMILITUD = float(os.getenv("FAQ_MIN_SIMILITUD", "0.6"))
+
+# Paginación de listados de tickets
+TICKETS_PER_PAGE = int(os.getenv("TICKETS_PER_PAGE", "50"))
+# Vigencia de la respuesta cacheada del dashboard de soporte
+SUPPORT_DASHBOARD_CACHE_SECONDS = int(os.getenv("SUPPORT_DASHBOARD_CACHE_SECONDS", "5"))
 
 
 class supportController:
+    _dashboard_cache = None
+    _dashboard_lock = threading.Lock()
+
+    #   UTILIDADES
+    @staticmethod
+    def _nombres_clientes(tickets):
+        """
+        Resuelve el nombre de cliente de todos los tickets con una sola consulta $in
+        (en lugar de un find_one por ticket)
+
+        Returns:
+            dict: {str(usuario_id): "Nombre Apellidos"}
+        """
+        ids = set()
+        for t in tickets:
+            if t.get("usuario_id"):
+                try:
+                    ids.add(ObjectId(t["usuario_id"]))
+                except Exception:
+                    pass
+
+        if not ids:
+            return {}
+
+        usuarios = db.usuarios.find(
+            {"_id": {"$in": list(ids)}},
+            {"usuario_nombre": 1, "usuario_apellidos": 1}
+        )
+        return {
+            str(u["_id"]): f"{u.get('usuario_nombre', '')} {u.get('usuario_apellidos', '')}".strip()
+            for u in usuarios
+        }
+
+    @staticmethod
+    def _paginacion(total):
+        """Lee ?page= y ?per_page= y devuelve (page, per_page, total_pages, skip)"""
+        per_page = min(max(request.args.get("per_page", TICKETS_PER_PAGE, type=int), 1), 200)
+        total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+        page = min(max(request.args.get("page", 1, type=int), 1), total_pages)
+        return page, per_page, total_pages, (page - 1) * per_page
+
     #   DASHBOARD PRINCIPAL
     @staticmethod
     def Dashboardsoporte():
@@ -14,217 +73,179 @@ class supportController:
                 return render_template("support/dashboard.html")
             return redirect(url_for("routes.login"))
         except Exception as e:
-            print(f"Error en Dashboardsoporte: {e}")
+            logging.error(f"Error en Dashboardsoporte: {e}")
             return render_template("support/dashboard.html")
 
 
     @staticmethod
-    def DashboardData():
-        """API que devuelve los datos del dashboard"""
-        try:
-            print("\n" + "="*50)
-            print("INICIANDO DashboardData...")
-            print("="*50)
-            
-            # === CONTADORES PRINCIPALES ===
-            total = db.tickets.count_documents({})
-            print(f"Total de tickets: {total}")
-            
-            abiertos = db.tickets.count_documents({"estado": {"$in": ["Abierto", "abierto", "pendiente", "Pendiente"]}})
-            cerrados = db.tickets.count_documents({"estado": {"$in": ["Cerrado", "cerrado", "resuelto", "Resuelto"]}})
-            criticos = db.tickets.count_documents({"prioridad": {"$in": ["Alta", "alta", "critica", "crítica"]}})
+    def _nombre_cliente(ticket, nombres, defecto):
+        """Nombre del cliente desde el $lookup o, si no resolvió, desde el mapa por id"""
+        cliente = ticket.get("cliente") or []
+        if cliente:
+            return f"{cliente[0].get('usuario_nombre', '')} {cliente[0].get('usuario_apellidos', '')}".strip()
+        return nombres.get(str(ticket.get("usuario_id")), defecto)
 
-            print(f"CONTADORES:")
-            print(f"   Total: {total}")
-            print(f"   Abiertos: {abiertos}")
-            print(f"   Cerrados: {cerrados}")
-            print(f"   Críticos: {criticos}")
+    @staticmethod
+    def _pipeline_dashboard():
+        """Pipeline $facet con todos los datos del dashboard (un solo round trip)"""
+        cliente = [
+            {"$lookup": {"from": "usuarios", "localField": "usuario_id", "foreignField": "_id", "as": "cliente"}},
+            {"$project": {
+                "asunto": 1, "titulo": 1, "tipo": 1, "estado": 1, "prioridad": 1,
+                "asesor": 1, "fecha": 1, "usuario_id": 1,
+                "cliente.usuario_nombre": 1, "cliente.usuario_apellidos": 1
+            }}
+        ]
+        return [
+            {"$facet": {
+                "estados": [
+                    {"$group": {"_id": "$estado", "cantidad": {"$sum": 1}}}
+                ],
+                "prioridades": [
+                    {"$group": {"_id": "$prioridad", "cantidad": {"$sum": 1}}}
+                ],
+                "evolucion": [
+                    {"$match": {"fecha": {"$gte": datetime.now() - timedelta(days=180), "$ne": None}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m", "date": "$fecha"}},
+                        "cantidad": {"$sum": 1}
+                    }},
+                    {"$sort": {"_id": 1}}
+                ],
+                "alertas": [
+                    {"$match": Ticket.filtro(estados=ESTADOS_ABIERTOS)},
+                    {"$sort": {"_id": -1}},
+                    {"$limit": 5}
+                ] + cliente,
+                "ultimos": [
+                    {"$sort": {"_id": -1}},
+                    {"$limit": 10}
+                ] + cliente
+            }}
+        ]
 
-            # === AGRUPACIÓN POR ESTADO ===
-            try:
-                pipeline_estados = [
-                    {
-                        "$group": {
-                            "_id": "$estado",
-                            "cantidad": {"$sum": 1}
-                        }
-                    },
-                    {"$sort": {"cantidad": -1}}
-                ]
-
-                estados_raw = list(db.tickets.aggregate(pipeline_estados))
-                datos_estados = []
-                
-                for e in estados_raw:
-                    estado_nombre = e.get("_id")
-                    if estado_nombre:
-                        datos_estados.append({
-                            "estado": str(estado_nombre),
-                            "cantidad": e["cantidad"]
-                        })
-                
-                if not datos_estados:
-                    datos_estados = [{"estado": "Sin datos", "cantidad": 0}]
-                    
-                print(f"ESTADOS: {datos_estados}")
-            except Exception as e:
-                print(f"Error en agregación de estados: {e}")
-                datos_estados = [{"estado": "Error", "cantidad": 0}]
-
-            # === EVOLUCIÓN TEMPORAL ===
-            datos_evolucion = []
+    @staticmethod
+    def _datos_dashboard():
+        """Ejecuta el $facet y da forma a la respuesta del dashboard"""
+        pipeline = supportController._pipeline_dashboard()
+        try:
+            resultado = next(Ticket.collection.aggregate(pipeline), {})
+        except Exception as e:
+            # Una sección que falla tumba todo el $facet: se reintenta por sección
+            # y la que vuelva a fallar queda vacía
+            logging.error(f"Error en el $facet del dashboard de soporte: {e}")
+            resultado = {}
+            for seccion, etapas in pipeline[0]["$facet"].items():
+                try:
+                    resultado[seccion] = list(Ticket.collection.aggregate(etapas))
+                except Exception as e:
+                    logging.error(f"Error en la sección '{seccion}' del dashboard de soporte: {e}")
+                    resultado[seccion] = []
+
+        # === CONTADORES Y ESTADOS (variantes agrupadas por estado canónico) ===
+        por_estado = {}
+        for e in resultado.get("estados", []):
+            estado = normalizar_estado(e["_id"])
+            por_estado[estado] = por_estado.get(estado, 0) + e["cantidad"]
+
+        total = sum(por_estado.values())
+        abiertos = por_estado.get("pendiente", 0)
+        cerrados = por_estado.get("cerrado", 0) + por_estado.get("resuelto", 0)
+        criticos = sum(
+            p["cantidad"] for p in resultado.get("prioridades", [])
+            if normalizar_prioridad(p["_id"]) == PrioridadTicket.ALTA
+        )
+
+        datos_estados = [
+            {"estado": estado, "cantidad": cantidad}
+            for estado, cantidad in sorted(por_estado.items(), key=lambda x: x[1], reverse=True)
+        ] or [{"estado": "Sin datos", "cantidad": 0}]
+
+        # === EVOLUCIÓN TEMPORAL ===
+        meses_es = {
+            "01": "Ene", "02": "Feb", "03": "Mar", "04": "Abr",
+            "05": "May", "06": "Jun", "07": "Jul", "08": "Ago",
+            "09": "Sep", "10": "Oct", "11": "Nov", "12": "Dic"
+        }
+        datos_evolucion = []
+        for e in resultado.get("evolucion", []):
             try:
-                ahora = datetime.now()
-                hace_6_meses = ahora - timedelta(days=180)
+                año, mes = e["_id"].split("-")
+                mes_nombre = f"{meses_es.get(mes, mes)} {año[-2:]}"
+            except Exception:
+                mes_nombre = str(e.get("_id", "N/A"))
+            datos_evolucion.append({"mes": mes_nombre, "cantidad": e["cantidad"]})
+
+        # Ids guardados como string no resuelven en el $lookup: una sola consulta extra
+        pendientes = [
+            t for t in resultado.get("alertas", []) + resultado.get("ultimos", [])
+            if not t.get("cliente") and isinstance(t.get("usuario_id"), str)
+        ]
+        nombres = supportController._nombres_clientes(pendientes)
+
+        def fecha_creacion(t):
+            return t["fecha"].strftime("%d/%m/%Y %H:%M") if isinstance(t.get("fecha"), datetime) else "N/A"
+
+        # === ALERTAS ===
+        alertas = [{
+            "_id": str(a["_id"]),
+            "estado": normalizar_estado(a.get("estado")),
+            "titulo": a.get("asunto") or a.get("titulo") or a.get("tipo") or f"Ticket #{str(a['_id'])[-6:]}",
+            "cliente": supportController._nombre_cliente(a, nombres, "Sin cliente"),
+            "fecha_creacion": fecha_creacion(a)
+        } for a in resultado.get("alertas", [])]
+
+        # === ÚLTIMOS TICKETS ===
+        ultimos = [{
+            "_id": str(t["_id"]),
+            "cliente": supportController._nombre_cliente(t, nombres, "Sin especificar"),
+            "tipo": t.get("asunto") or t.get("tipo") or "General",
+            "estado": normalizar_estado(t.get("estado")),
+            "prioridad": normalizar_prioridad(t.get("prioridad")),
+            "asignado_a": t.get("asesor") or "Sin asignar",
+            "fecha_creacion": fecha_creacion(t)
+        } for t in resultado.get("ultimos", [])]
+
+        logging.debug(f"Dashboard soporte: total={total} abiertos={abiertos} cerrados={cerrados} criticos={criticos}")
+
+        return {
+            "resumen": {
+                "total": total,
+                "abiertos": abiertos,
+                "cerrados": cerrados,
+                "criticos": criticos
+            },
+            "estados": datos_estados,
+            "evolucion": datos_evolucion,
+            "alertas": alertas,
+            "tickets": ultimos
+        }
 
-                ticket_sample = db.tickets.find_one()
-                print(f"Ticket de ejemplo: {ticket_sample}")
-                
-                if ticket_sample and "fecha" in ticket_sample:
-                    pipeline_evolucion = [
-                        {
-                            "$match": {
-                                "fecha": {"$gte": hace_6_meses, "$exists": True, "$ne": None}
-                            }
-                        },
-                        {
-                            "$group": {
-                                "_id": {
-                                    "$dateToString": {
-                                        "format": "%Y-%m",
-                                        "date": "$fecha"
-                                    }
-                                },
-                                "cantidad": {"$sum": 1}
-                            }
-                        },
-                        {"$sort": {"_id": 1}}
-                    ]
-
-                    evolucion_raw = list(db.tickets.aggregate(pipeline_evolucion))
-                    
-                    meses_es = {
-                        "01": "Ene", "02": "Feb", "03": "Mar", "04": "Abr",
-                        "05": "May", "06": "Jun", "07": "Jul", "08": "Ago",
-                        "09": "Sep", "10": "Oct", "11": "Nov", "12": "Dic"
-                    }
-                    
-                    for e in evolucion_raw:
-                        try:
-                            año, mes = e["_id"].split("-")
-                            mes_nombre = f"{meses_es.get(mes, mes)} {año[-2:]}"
-                            datos_evolucion.append({
-                                "mes": mes_nombre,
-                                "cantidad": e["cantidad"]
-                            })
-                        except:
-                            datos_evolucion.append({
-                                "mes": str(e.get("_id", "N/A")),
-                                "cantidad": e["cantidad"]
-                            })
-                else:
-                    print("No hay campo 'fecha' en los tickets")
-                    datos_evolucion = []
-                
-                print(f"EVOLUCIÓN: {datos_evolucion}")
-            except Exception as e:
-                print(f"Error en evolución temporal: {e}")
-                datos_evolucion = []
+    @staticmethod
+    def invalidar_cache_dashboard():
+        """Descarta la respuesta cacheada (tras modificar tickets)"""
+        with supportController._dashboard_lock:
+            supportController._dashboard_cache = None
 
-            # === ALERTAS ===
-            alertas = []
-            try:
-                alertas_cursor = db.tickets.find({
-                    "estado": {"$in": ["Abierto", "abierto", "pendiente", "Pendiente", "en_revision"]}
-                }).sort("_id", -1).limit(5)
-
-                for a in alertas_cursor:
-                    usuario_nombre = "Sin cliente"
-                    if a.get("usuario_id"):
-                        try:
-                            from bson.objectid import ObjectId
-                            usuario = db.usuarios.find_one({"_id": ObjectId(a["usuario_id"])})
-                            if usuario:
-                                usuario_nombre = f"{usuario.get('usuario_nombre', '')} {usuario.get('usuario_apellidos', '')}".strip()
-                        except:
-                            pass
-                    
-                    alerta_data = {
-                        "_id": str(a["_id"]),
-                        "estado": a.get("estado", "N/A"),
-                        "titulo": a.get("asunto") or a.get("titulo") or a.get("tipo") or f"Ticket #{str(a['_id'])[-6:]}",
-                        "cliente": usuario_nombre
-                    }
-                    
-                    if "fecha" in a and isinstance(a["fecha"], datetime):
-                        alerta_data["fecha_creacion"] = a["fecha"].strftime("%d/%m/%Y %H:%M")
-                    else:
-                        alerta_data["fecha_creacion"] = "N/A"
-                    
-                    alertas.append(alerta_data)
-
-                print(f"ALERTAS: {len(alertas)} encontradas")
-            except Exception as e:
-                print(f"Error en alertas: {e}")
-                alertas = []
-
-            # === ÚLTIMOS TICKETS ===
-            ultimos = []
-            try:
-                tickets_cursor = db.tickets.find().sort("_id", -1).limit(10)
-                
-                for t in tickets_cursor:
-                    usuario_nombre = "Sin especificar"
-                    if t.get("usuario_id"):
-                        try:
-                            from bson.objectid import ObjectId
-                            usuario = db.usuarios.find_one({"_id": ObjectId(t["usuario_id"])})
-                            if usuario:
-                                usuario_nombre = f"{usuario.get('usuario_nombre', '')} {usuario.get('usuario_apellidos', '')}".strip()
-                        except:
-                            pass
-                    
-                    ticket_data = {
-                        "_id": str(t["_id"]),
-                        "cliente": usuario_nombre,
-                        "tipo": t.get("asunto") or t.get("tipo") or "General",
-                        "estado": t.get("estado", "pendiente"),
-                        "prioridad": t.get("prioridad", "media"),
-                        "asignado_a": t.get("asesor") or "Sin asignar"
-                    }
-                    
-                    if "fecha" in t and isinstance(t["fecha"], datetime):
-                        ticket_data["fecha_creacion"] = t["fecha"].strftime("%d/%m/%Y %H:%M")
-                    else:
-                        ticket_data["fecha_creacion"] = "N/A"
-                    
-                    ultimos.append(ticket_data)
-
-                print(f"TICKETS: {len(ultimos)} recientes")
-            except Exception as e:
-                print(f"Error en últimos tickets: {e}")
-                ultimos = []
-
-            # === RESPUESTA FINAL ===
-            respuesta = {
-                "resumen": {
-                    "total": total,
-                    "abiertos": abiertos,
-                    "cerrados": cerrados,
-                    "criticos": criticos
-                },
-                "estados": datos_estados,
-                "evolucion": datos_evolucion,
-                "alertas": alertas,
-                "tickets": ultimos
-            }
+    @staticmethod
+    def DashboardData():
+        """API que devuelve los datos del dashboard (cacheados SUPPORT_DASHBOARD_CACHE_SECONDS)"""
+        try:
+            ahora = time.monotonic()
+            with supportController._dashboard_lock:
+                cache = supportController._dashboard_cache
+                if cache and ahora - cache[1] < SUPPORT_DASHBOARD_CACHE_SECONDS:
+                    return jsonify(cache[0])
+
+            respuesta = supportController._datos_dashboard()
+
+            with supportController._dashboard_lock:
+                supportController._dashboard_cache = (respuesta, ahora)
 
-            print("DashboardData completado exitosamente")
-            print("="*50 + "\n")
             return jsonify(respuesta)
 
         except Exception as e:
-            print(f"ERROR CRÍTICO en DashboardData: {e}")
+            logging.error(f"ERROR CRÍTICO en DashboardData: {e}")
             import traceback
             traceback.print_exc()
             
@@ -251,7 +272,7 @@ class supportController:
                     return render_template("support/comunicacion_ticket.html")
             return redirect(url_for("routes.login"))
         except Exception as e:
-            print(f"Error en ChatFAQ: {e}")
+            logging.error(f"Error en ChatFAQ: {e}")
             import traceback
             traceback.print_exc()
             # Intentar ambos nombres
@@ -263,66 +284,119 @@ class supportController:
 
     @staticmethod
     def ProcesarPreguntaFAQ():
-        """Procesa preguntas del chat FAQ"""
+        """Procesa preguntas del chat FAQ con el índice BM25 de la colección faq"""
         try:
             data = request.get_json()
-            pregunta = data.get("pregunta", "").lower().strip()
-            
-            respuestas = {
-                "horario": {
-                    "keywords": ["horario", "hora", "atención", "atencion"],
-                    "respuesta": "⏰ Nuestro horario es Lunes a Viernes 9AM-6PM, Sábados 9AM-2PM"
-                },
-                "ticket": {
-                    "keywords": ["ticket", "seguimiento", "estado"],
-                    "respuesta": "🎫 Puedes consultar tu ticket en 'Mis Tickets' con tu número de referencia"
-                },
-                "contacto": {
-                    "keywords": ["contacto", "whatsapp", "teléfono", "telefono"],
-                    "respuesta": "📞 WhatsApp: +52 722 123 4567 | Email: soporte@tuempresa.com",
-                    "necesita_humano": True
-                }
-            }
-            
-            for categoria, info in respuestas.items():
-                if any(kw in pregunta for kw in info["keywords"]):
-                    return jsonify({
-                        "respuesta": info["respuesta"],
-                        "necesita_humano": info.get("necesita_humano", False)
-                    })
+            pregunta = data.get("pregunta", "").strip()
+            try:
+                top_k = min(max(int(data.get("top_k", 3)), 1), 10)
+            except (TypeError, ValueError):
+                top_k = 3
+
+            resultados = get_faq_index().buscar(pregunta, top_k)
+            sugerencias = [{
+                "pregunta": entrada.get("pregunta", ""),
+                "respuesta": entrada.get("respuesta", ""),
+                "score": puntaje
+            } for puntaje, entrada in resultados]
+
+            if resultados and resultados[0][0] >= FAQ_MIN_SCORE:
+                puntaje, mejor = resultados[0]
+                return jsonify({
+                    "respuesta": mejor.get("respuesta", ""),
+                    "necesita_humano": mejor.get("necesita_humano", False),
+                    "score": puntaje,
+                    "resultados": sugerencias
+                })
+
+            # Sin coincidencia léxica: búsqueda semántica por embeddings
+            semantica = supportController._faq_semantica(pregunta)
+            if semantica:
+                return jsonify(dict(semantica, resultados=sugerencias))
             
             return jsonify({
                 "respuesta": "🤔 No tengo una respuesta específica. ¿Te conecto con un asesor?",
-                "necesita_humano": True
+                "necesita_humano": True,
+                "resultados": sugerencias
             })
             
         except Exception as e:
-            print(f"Error en ProcesarPreguntaFAQ: {e}")
+            logging.error(f"Error en ProcesarPreguntaFAQ: {e}")
+            return jsonify({"error": str(e)}), 500
+
+
+    @staticmethod
+    def _faq_semantica(pregunta):
+        """Mejor FAQ por similitud de embeddings (None si no hay modelo o no supera el mínimo)"""
+        try:
+            resultados = get_similarity_service().buscar_faq(pregunta, 1)
+        except (EmbeddingsNoDisponibles, ImportError, OSError, ValueError) as e:
+            # Sin modelo, sin dependencias, con archivos ilegibles o de otra dimensión queda solo BM25
+            logging.debug(f"FAQ semántica no disponible: {e}")
+            return None
+        if not resultados or resultados[0][1] < FAQ_MIN_SIMILITUD:
+            return None
+
+        faq_id, similitud = resultados[0]
+        faq = db.faq.find_one({"_id": ObjectId(faq_id)})
+        if not faq:
+            return None
+        return {
+            "respuesta": faq.get("respuesta", ""),
+            "necesita_humano": faq.get("necesita_humano", False),
+            "similitud": similitud
+        }
+
+
+    #   TICKETS SIMILARES
+    @staticmethod
+    def TicketsSimilares(ticket_id):
+        """API con los tickets más parecidos a uno dado (posibles duplicados)"""
+        try:
+            ticket = db.tickets.find_one({"_id": ObjectId(ticket_id)}, {"asunto": 1, "descripcion": 1})
+            if not ticket:
+                return jsonify({"error": "Ticket no encontrado"}), 404
+
+            top_k = min(max(request.args.get("top_k", 5, type=int), 1), 20)
+            similares = get_similarity_service().tickets_similares(ticket, top_k=top_k)
+
+            docs = {
+                str(t["_id"]): t for t in db.tickets.find(
+                    {"_id": {"$in": [ObjectId(i) for i, _ in similares]}},
+                    {"asunto": 1, "estado": 1, "fecha": 1}
+                )
+            }
+            return jsonify({"similares": [{
+                "id": i,
+                "similitud": similitud,
+                "asunto": docs[i].get("asunto", ""),
+                "estado": docs[i].get("estado", ""),
+                "fecha_creacion": docs[i]["fecha"].strftime("%Y-%m-%d %H:%M") if isinstance(docs[i].get("fecha"), datetime) else "N/A"
+            } for i, similitud in similares if i in docs]})
+
+        except (EmbeddingsNoDisponibles, ImportError, OSError, ValueError) as e:
+            return jsonify({"error": str(e)}), 503
+        except Exception as e:
+            logging.error(f"Error en TicketsSimilares: {e}")
             return jsonify({"error": str(e)}), 500
 
 
     #   TICKETS ACTIVOS
     @staticmethod
     def TicketsActivos():
-        """Muestra todos los tickets con filtros"""
+        """Muestra los tickets paginados (?page=, ?per_page=) con filtros"""
         try:
+            total = Ticket.contar()
+            page, per_page, total_pages, skip = supportController._paginacion(total)
+
+            tickets_raw = list(Ticket.buscar(orden=("_id", -1), skip=skip, limite=per_page))
+            nombres = supportController._nombres_clientes(tickets_raw)
+
             tickets = []
-            tickets_cursor = db.tickets.find().sort("_id", -1)
-
-            for t in tickets_cursor:
-                # Obtener nombre del usuario
-                usuario_nombre = "Sin nombre"
-                if t.get("usuario_id"):
-                    try:
-                        usuario = db.usuarios.find_one({"_id": ObjectId(t["usuario_id"])})
-                        if usuario:
-                            usuario_nombre = f"{usuario.get('usuario_nombre', '')} {usuario.get('usuario_apellidos', '')}".strip()
-                    except:
-                        pass
-                
+            for t in tickets_raw:
                 tickets.append({
                     "id": str(t["_id"]),
-                    "cliente_nombre": usuario_nombre,
+                    "cliente_nombre": nombres.get(str(t.get("usuario_id")), "Sin nombre"),
                     "tipo_incidencia": t.get("asunto", "No especificado"),
                     "estado": t.get("estado", "pendiente"),
                     "prioridad": t.get("prioridad", "media"),
@@ -330,13 +404,20 @@ class supportController:
                     "ultima_actualizacion": t["ultima_actualizacion"].strftime("%Y-%m-%d %H:%M") if isinstance(t.get("ultima_actualizacion"), datetime) else "N/A",
                 })
 
-            return render_template("support/tickets.html", tickets=tickets)
+            return render_template(
+                "support/tickets.html",
+                tickets=tickets,
+                total=total,
+                page=page,
+                per_page=per_page,
+                total_pages=total_pages
+            )
 
         except Exception as e:
-            print(f"Error al cargar tickets: {e}")
+            logging.error(f"Error al cargar tickets: {e}")
             import traceback
             traceback.print_exc()
-            return render_template("support/tickets.html", tickets=[], error=str(e))
+            return render_template("support/tickets.html", tickets=[], total=0, page=1, per_page=TICKETS_PER_PAGE, total_pages=1, error=str(e))
 
 
     #   ALERTAS
@@ -344,27 +425,17 @@ class supportController:
     def AlertasSoporte():
         """Muestra alertas de tickets pendientes"""
         try:
-            print("Cargando alertas...")
+            logging.debug("Cargando alertas...")
             
-            alertas = list(db.tickets.find({
-                "estado": {"$in": ["Abierto", "abierto", "pendiente", "Pendiente", "en_revision", "en revisión", "En revisión"]}
-            }).sort("_id", -1).limit(100))
+            alertas = list(Ticket.buscar(estados=ESTADOS_ABIERTOS, limite=100))
 
-            print(f"Total de tickets encontrados: {len(alertas)}")
+            logging.debug(f"Total de tickets encontrados: {len(alertas)}")
+            nombres = supportController._nombres_clientes(alertas)
 
             for a in alertas:
                 a["_id"] = str(a["_id"])
-                
-                # Obtener nombre del usuario
-                usuario_nombre = "Sin cliente"
-                if a.get("usuario_id"):
-                    try:
-                        usuario = db.usuarios.find_one({"_id": ObjectId(a["usuario_id"])})
-                        if usuario:
-                            usuario_nombre = f"{usuario.get('usuario_nombre', '')} {usuario.get('usuario_apellidos', '')}".strip()
-                    except:
-                        pass
-                
+                usuario_nombre = nombres.get(str(a.get("usuario_id")), "Sin cliente")
+
                 # Usar 'fecha' y 'asunto'
                 if isinstance(a.get("fecha"), datetime):
                     a["fecha_creacion"] = a["fecha"].strftime("%Y-%m-%d %H:%M")
@@ -379,14 +450,12 @@ class supportController:
                 a["asignado_a"] = a.get("asesor", "")
                 a["descripcion"] = a.get("descripcion", "")
 
-            print(f"Alertas procesadas: {len(alertas)}")
-            if alertas:
-                print(f"Ejemplo de alerta: {alertas[0]}")
+            logging.debug(f"Alertas procesadas: {len(alertas)}")
 
             return render_template("support/alertas.html", alertas=alertas)
 
         except Exception as e:
-            print(f"Error en AlertasSoporte: {e}")
+            logging.error(f"Error en AlertasSoporte: {e}")
             import traceback
             traceback.print_exc()
             return render_template("support/alertas.html", alertas=[], error=str(e))
@@ -397,14 +466,12 @@ class supportController:
     def HistorialSoporte():
         """Muestra historial de tickets cerrados"""
         try:
-            print("Cargando historial...")
+            logging.debug("Cargando historial...")
             
             # Obtener tickets cerrados/resueltos
-            historial = list(db.tickets.find({
-                "estado": {"$in": ["Cerrado", "cerrado", "resuelto", "Resuelto", "completado", "Completado"]}
-            }).sort("_id", -1).limit(200))
+            historial = list(Ticket.buscar(estados=ESTADOS_CERRADOS, limite=200))
 
-            print(f"Tickets cerrados encontrados: {len(historial)}")
+            logging.debug(f"Tickets cerrados encontrados: {len(historial)}")
 
             for h in historial:
                 h["_id"] = str(h["_id"])
@@ -425,12 +492,12 @@ class supportController:
                 h["asesor"] = h.get("asesor") or h.get("asignado_a", "")
                 h["descripcion"] = h.get("descripcion") or h.get("detalle", "")
 
-            print(f"Historial procesado: {len(historial)} tickets")
+            logging.debug(f"Historial procesado: {len(historial)} tickets")
 
             return render_template("support/historial.html", historial=historial)
 
         except Exception as e:
-            print(f"Error en HistorialSoporte: {e}")
+            logging.error(f"Error en HistorialSoporte: {e}")
             import traceback
             traceback.print_exc()
             return render_template("support/historial.html", historial=[], error=str(e))
@@ -441,10 +508,10 @@ class supportController:
     def MetricasSoporte():
         """Dashboard de métricas avanzadas"""
         try:
-            total_tickets = db.tickets.count_documents({})
-            abiertos = db.tickets.count_documents({"estado": {"$in": ["Abierto", "abierto", "pendiente"]}})
-            cerrados = db.tickets.count_documents({"estado": {"$in": ["Cerrado", "cerrado", "resuelto"]}})
-            criticos = db.tickets.count_documents({"prioridad": {"$in": ["Alta", "alta", "critica"]}})
+            total_tickets = Ticket.contar()
+            abiertos = Ticket.contar(estados=ESTADOS_ABIERTOS)
+            cerrados = Ticket.contar(estados=ESTADOS_CERRADOS)
+            criticos = Ticket.contar(prioridades=PrioridadTicket.ALTA)
 
             datos = {
                 "resumen": {
@@ -462,7 +529,7 @@ class supportController:
             return render_template("support/metricas.html", datos=datos)
 
         except Exception as e:
-            print(f"Error en MetricasSoporte: {e}")
+            logging.error(f"Error en MetricasSoporte: {e}")
             return render_template("support/metricas.html", error=str(e))
 
 
@@ -471,7 +538,7 @@ class supportController:
     def GestionEquipo():
         """Gestión de asignación de tickets"""
         try:
-            print("Cargando gestión de equipo...")
+            logging.debug("Cargando gestión de equipo...")
             
             # Obtener asesores INTERNOS
             asesores_cursor = db.usuarios.find(
@@ -497,39 +564,29 @@ class supportController:
                         "email": a.get("usuario_email", "Sin email")
                     })
 
-            print(f"👥 Asesores encontrados: {len(asesores)}")
+            logging.debug(f"👥 Asesores encontrados: {len(asesores)}")
 
             # Obtener tickets activos
             tickets = []
-            tickets_cursor = db.tickets.find({
-                "estado": {"$nin": ["cerrado", "Cerrado", "resuelto", "Resuelto"]}
-            }).sort("_id", -1).limit(50)
-
-            for t in tickets_cursor:
-                # Obtener nombre del usuario
-                usuario_nombre = "Sin nombre"
-                if t.get("usuario_id"):
-                    try:
-                        usuario = db.usuarios.find_one({"_id": ObjectId(t["usuario_id"])})
-                        if usuario:
-                            usuario_nombre = f"{usuario.get('usuario_nombre', '')} {usuario.get('usuario_apellidos', '')}".strip()
-                    except:
-                        pass
-                
+            # Todo lo que no está cerrado, incluidos estados desconocidos o vacíos
+            tickets_raw = list(Ticket.buscar(excluir_estados=ESTADOS_CERRADOS, orden=("_id", -1), limite=50))
+            nombres = supportController._nombres_clientes(tickets_raw)
+
+            for t in tickets_raw:
                 tickets.append({
                     "id": str(t["_id"]),
-                    "cliente_nombre": usuario_nombre,
+                    "cliente_nombre": nombres.get(str(t.get("usuario_id")), "Sin nombre"),
                     "asesor": t.get("asesor", ""),
                     "area": t.get("asunto", "general"),
                     "estado": t.get("estado", "pendiente")
                 })
 
-            print(f"Tickets activos: {len(tickets)}")
+            logging.debug(f"Tickets activos: {len(tickets)}")
 
             return render_template("support/gestion.html", tickets=tickets, asesores=asesores)
 
         except Exception as e:
-            print(f"Error en GestionEquipo: {e}")
+            logging.error(f"Error en GestionEquipo: {e}")
             import traceback
             traceback.print_exc()
             return render_template("support/gestion.html", tickets=[], asesores=[], error=str(e))
@@ -546,31 +603,30 @@ class supportController:
             if not ticket_id:
                 return jsonify({"error": "ID de ticket requerido"}), 400
 
+            estado = normalizar_estado(data["estado"], None) if "estado" in data else None
+            prioridad = normalizar_prioridad(data["prioridad"], None) if "prioridad" in data else None
+
+            if "estado" in data and estado is None:
+                return jsonify({"error": f"Estado no válido: {data['estado']}"}), 400
+            if "prioridad" in data and prioridad is None:
+                return jsonify({"error": f"Prioridad no válida: {data['prioridad']}"}), 400
+
             update_fields = {}
-            
-            if "estado" in data:
-                update_fields["estado"] = data["estado"]
-            if "prioridad" in data:
-                update_fields["prioridad"] = data["prioridad"]
             if "asesor" in data:
                 update_fields["asesor"] = data["asesor"]
             if "asignado_a" in data:
                 update_fields["asignado_a"] = data["asignado_a"]
-            
-            update_fields["ultima_actualizacion"] = datetime.now()
 
-            resultado = db.tickets.update_one(
-                {"_id": ObjectId(ticket_id)},
-                {"$set": update_fields}
-            )
+            resultado = Ticket.actualizar(ticket_id, estado=estado, prioridad=prioridad, **update_fields)
 
             if resultado.modified_count > 0:
+                supportController.invalidar_cache_dashboard()
                 return jsonify({"success": True, "mensaje": "Ticket actualizado"})
             else:
                 return jsonify({"success": False, "mensaje": "No se realizaron cambios"})
 
         except Exception as e:
-            print(f"Error en ActualizarTicket: {e}")
+            logging.error(f"Error en ActualizarTicket: {e}")
             return jsonify({"error": str(e)}), 500
 
 
@@ -0,0 +1,115 @@
+# application/commands/admin/backfill_ticket_estados_command.py
+"""
+Migración única de estado/prioridad de tickets a sus valores canónicos
+(EstadoTicket / PrioridadTicket) y creación de los índices compuestos.
+
+Al terminar sin pendientes lo registra en "configuracion": desde entonces
+los filtros de soporte dejan de incluir las grafías históricas. Hasta que
+se ejecute las vistas siguen encontrando los tickets con grafías antiguas.
+
+Uso:
+    python -m cqrs.commands.admin.backfill_ticket_estados_command [--batch N]
+"""
+import time
+import argparse
+from pymongo import UpdateOne
+from models.soporte_model import (
+    Ticket, EstadoTicket, PrioridadTicket, normalizar_estado, normalizar_prioridad
+)
+
+
+class BackfillTicketEstadosCommand:
+    def __init__(self, batch_size: int = 500, on_progress=None):
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+
+    @staticmethod
+    def pending_filter():
+        """Tickets con estado o prioridad fuera de los valores canónicos."""
+        return {"$or": [
+            {"estado": {"$nin": [e.value for e in EstadoTicket]}},
+            {"prioridad": {"$nin": [p.value for p in PrioridadTicket]}}
+        ]}
+
+    def _operacion(self, doc, stats):
+        """UpdateOne condicionado a que los valores no hayan cambiado mientras tanto."""
+        estado = normalizar_estado(doc.get("estado"), None)
+        prioridad = normalizar_prioridad(doc.get("prioridad"), None)
+
+        if estado is None and doc.get("estado") is not None:
+            stats["desconocidos"].append(str(doc["_id"]))
+        if prioridad is None and doc.get("prioridad") is not None:
+            stats["desconocidos"].append(str(doc["_id"]))
+
+        return UpdateOne(
+            {"_id": doc["_id"], "estado": doc.get("estado"), "prioridad": doc.get("prioridad")},
+            {"$set": {
+                "estado": (estado or EstadoTicket.PENDIENTE).value,
+                "prioridad": (prioridad or PrioridadTicket.MEDIA).value
+            }}
+        )
+
+    def _guardar(self, operaciones):
+        if not operaciones:
+            return 0
+        return Ticket.collection.bulk_write(operaciones, ordered=False).modified_count
+
+    def execute(self):
+        """Ejecuta la migración. Retorna (exito, estadisticas o mensaje de error)."""
+        try:
+            total = Ticket.collection.count_documents(self.pending_filter())
+        except Exception as e:
+            return False, f"Error de base de datos al contar tickets: {e}"
+
+        stats = {"total": total, "procesados": 0, "migrados": 0, "desconocidos": [], "segundos": 0.0}
+        inicio = time.perf_counter()
+
+        try:
+            cursor = Ticket.collection.find(
+                self.pending_filter(),
+                {"_id": 1, "estado": 1, "prioridad": 1}
+            ).batch_size(self.batch_size)
+
+            lote = []
+            for doc in cursor:
+                lote.append(self._operacion(doc, stats))
+                if len(lote) >= self.batch_size:
+                    self._consumir(lote, stats, inicio)
+                    lote = []
+            self._consumir(lote, stats, inicio)
+
+            Ticket.asegurar_indices()
+            # Un ticket escrito con una grafía antigua durante la migración la deja pendiente
+            if Ticket.collection.count_documents(self.pending_filter(), limit=1) == 0:
+                Ticket.marcar_datos_canonicos()
+        except Exception as e:
+            return False, f"Error durante la migración: {e}"
+
+        return True, stats
+
+    def _consumir(self, lote, stats, inicio):
+        stats["migrados"] += self._guardar(lote)
+        stats["procesados"] += len(lote)
+        stats["segundos"] = time.perf_counter() - inicio
+        if self.on_progress and lote:
+            self.on_progress(dict(stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normaliza estado/prioridad de tickets")
+    parser.add_argument("--batch", type=int, default=500, help="Tickets por lote")
+    args = parser.parse_args()
+
+    def mostrar(stats):
+        print(f"   {stats['procesados']}/{stats['total']} procesados | {stats['migrados']} migrados")
+
+    print("🎫 Normalizando estado y prioridad de tickets...")
+    ok, resultado = BackfillTicketEstadosCommand(args.batch, mostrar).execute()
+    if ok:
+        print(f"✅ Migración completa: {resultado['migrados']} de {resultado['total']} "
+              f"en {resultado['segundos']:.1f}s")
+        if resultado["desconocidos"]:
+            print(f"⚠️  Valores no reconocidos (se asignó el valor por defecto): "
+                  f"{', '.join(sorted(set(resultado['desconocidos'])))}")
+    else:
+        print(f"❌ {resultado}")
@@ -102,8 +102,8 @@ class CreateAdminCommand:
             "usuario_permisos": permisos,
             "usuario_direccion": self.data.get("direccion", ""),
             "usuario_telefono": self.data.get("telefono", ""),
-            "created_at": datetime.now(),
-            "updated_at": datetime.now(),
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
         }
         
         # 3. Crear el usuario en la DB (función de modelo asumida)
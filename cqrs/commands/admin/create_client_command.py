@@ -57,8 +57,8 @@ class CreateClientCommand:
             "cliente_email": correo,
             "cliente_telefono": self.data.get("telefono"),
             "cliente_status": self.data.get("status", 0), # Asume un status por defecto
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 
-            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "created_at": datetime.utcnow(), 
+            "updated_at": datetime.utcnow()
         }
         
         # 2. Guardar en la DB
@@ -32,7 +32,7 @@ class CreateFinancieraCommand:
             "nombre_comercial": self.data["nombre_comercial"],
             "contacto_email": self.data["contacto_email"],
             "telefono": self.data.get("telefono", None),
-            "created_at": datetime.now(),
+            "created_at": datetime.utcnow(),
             # Otros campos por defecto...
         }
         
@@ -0,0 +1,126 @@
+# application/commands/admin/migrate_passwords_command.py
+"""
+Migración en lote de contraseñas en texto plano (usuario_clave) a bcrypt.
+
+Uso:
+    python -m cqrs.commands.admin.migrate_passwords_command [--workers N] [--batch N]
+"""
+import os
+import re
+import time
+import bcrypt
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pymongo import UpdateOne
+from datetime import datetime
+from models.empleado_model import Usuario
+from services.security.password_service import PasswordService
+
+# Hashes bcrypt ya migrados: $2a$, $2b$, $2y$
+BCRYPT_REGEX = re.compile(r"^\$2[aby]\$")
+
+
+def _hashear_lote(pares, rounds):
+    """Hashea un lote [(id, clave)] en un proceso del pool."""
+    return [
+        (_id, clave, bcrypt.hashpw(clave.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8"))
+        for _id, clave in pares
+    ]
+
+
+class MigratePasswordsCommand:
+    def __init__(self, workers: int = None, batch_size: int = 100, rounds: int = None, on_progress=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.rounds = rounds or PasswordService.BCRYPT_ROUNDS
+        self.on_progress = on_progress
+
+    @staticmethod
+    def pending_filter():
+        """Usuarios cuya clave sigue en texto plano."""
+        return {"usuario_clave": {"$nin": [None, ""], "$not": BCRYPT_REGEX}}
+
+    def _lotes(self):
+        """Recorre los pendientes con un cursor y los agrupa en lotes."""
+        cursor = Usuario.collection.find(
+            self.pending_filter(),
+            {"_id": 1, "usuario_clave": 1}
+        ).batch_size(self.batch_size)
+
+        lote = []
+        for doc in cursor:
+            lote.append((doc["_id"], str(doc["usuario_clave"])))
+            if len(lote) >= self.batch_size:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    def _guardar(self, resultados):
+        """Guarda un lote hasheado; solo si la clave no cambió mientras tanto."""
+        operaciones = [
+            UpdateOne(
+                {"_id": _id, "usuario_clave": clave},
+                {"$set": {"usuario_clave": hashed, "updated_at": datetime.utcnow()}}
+            )
+            for _id, clave, hashed in resultados
+        ]
+        if not operaciones:
+            return 0
+        return Usuario.collection.bulk_write(operaciones, ordered=False).modified_count
+
+    def execute(self):
+        """Ejecuta la migración. Retorna (exito, estadisticas o mensaje de error)."""
+        try:
+            total = Usuario.collection.count_documents(self.pending_filter())
+        except Exception as e:
+            return False, f"Error de base de datos al contar usuarios: {e}"
+
+        stats = {"total": total, "procesados": 0, "migrados": 0, "segundos": 0.0, "por_segundo": 0.0}
+        if total == 0:
+            return True, stats
+
+        inicio = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                # Se mantienen como máximo 2 lotes por proceso en vuelo
+                en_vuelo = []
+                for lote in self._lotes():
+                    en_vuelo.append(pool.submit(_hashear_lote, lote, self.rounds))
+                    if len(en_vuelo) >= self.workers * 2:
+                        self._consumir(en_vuelo.pop(0), stats, inicio)
+                for futuro in en_vuelo:
+                    self._consumir(futuro, stats, inicio)
+        except Exception as e:
+            return False, f"Error durante la migración: {e}"
+
+        return True, stats
+
+    def _consumir(self, futuro, stats, inicio):
+        resultados = futuro.result()
+        stats["migrados"] += self._guardar(resultados)
+        stats["procesados"] += len(resultados)
+        stats["segundos"] = time.perf_counter() - inicio
+        stats["por_segundo"] = stats["procesados"] / stats["segundos"] if stats["segundos"] else 0.0
+        if self.on_progress:
+            self.on_progress(dict(stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra usuario_clave en texto plano a bcrypt")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (default: CPUs)")
+    parser.add_argument("--batch", type=int, default=100, help="Usuarios por lote")
+    parser.add_argument("--rounds", type=int, default=None, help="Costo bcrypt (default: BCRYPT_ROUNDS)")
+    args = parser.parse_args()
+
+    def mostrar(stats):
+        print(f"   {stats['procesados']}/{stats['total']} procesados | "
+              f"{stats['migrados']} migrados | {stats['por_segundo']:.1f} usuarios/s")
+
+    print("🔐 Migrando contraseñas a bcrypt...")
+    ok, resultado = MigratePasswordsCommand(args.workers, args.batch, args.rounds, mostrar).execute()
+    if ok:
+        print(f"✅ Migración completa: {resultado['migrados']} de {resultado['total']} "
+              f"en {resultado['segundos']:.1f}s")
+    else:
+        print(f"❌ {resultado}")
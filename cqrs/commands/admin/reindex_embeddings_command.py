@@ -0,0 +1,51 @@
+# application/commands/admin/reindex_embeddings_command.py
+"""
+Recodifica FAQ y tickets con el modelo de embeddings local y reescribe las
+matrices float16 que el servicio de similitud abre con mmap.
+
+Uso:
+    python -m cqrs.commands.admin.reindex_embeddings_command [--solo faq|tickets]
+"""
+import time
+import argparse
+from services.support.embeddings import get_similarity_service, EmbeddingsNoDisponibles
+
+
+class ReindexEmbeddingsCommand:
+    def __init__(self, faq: bool = True, tickets: bool = True):
+        self.faq = faq
+        self.tickets = tickets
+
+    def execute(self):
+        """Ejecuta la reindexación. Retorna (exito, estadisticas o mensaje de error)."""
+        servicio = get_similarity_service()
+        stats = {"faq": 0, "tickets": 0, "segundos": 0.0}
+        inicio = time.perf_counter()
+        try:
+            if self.faq:
+                stats["faq"] = servicio.reindexar_faq()
+            if self.tickets:
+                stats["tickets"] = servicio.reindexar_tickets()
+        except EmbeddingsNoDisponibles as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Error durante la reindexación: {e}"
+
+        stats["segundos"] = time.perf_counter() - inicio
+        return True, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reindexa embeddings de FAQ y tickets")
+    parser.add_argument("--solo", choices=["faq", "tickets"], default=None, help="Reindexar solo una colección")
+    args = parser.parse_args()
+
+    print("🧠 Reindexando embeddings...")
+    ok, resultado = ReindexEmbeddingsCommand(
+        faq=args.solo in (None, "faq"),
+        tickets=args.solo in (None, "tickets")
+    ).execute()
+    if ok:
+        print(f"✅ {resultado['faq']} FAQ y {resultado['tickets']} tickets en {resultado['segundos']:.1f}s")
+    else:
+        print(f"❌ {resultado}")
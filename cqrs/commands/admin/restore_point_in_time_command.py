@@ -0,0 +1,81 @@
+# application/commands/admin/restore_point_in_time_command.py
+"""
+Restaura la base como estaba en un momento dado: el respaldo más reciente
+anterior a ese momento (con su cadena de incrementales) y encima los
+cambios capturados desde el respaldo completo de esa cadena
+(services/backups/captura.py).
+
+Ejemplo: deshacer un delete_usuarios_batch_command ejecutado a las 18:00
+
+    python -m cqrs.commands.admin.restore_point_in_time_command --hasta "2025-03-14 17:59" --colecciones usuarios
+
+La hora se interpreta en SCHEDULER_TZ (hora local del restaurante).
+Con --dry-run solo lee y valida el respaldo y los cambios.
+"""
+import argparse
+from datetime import datetime
+import pytz
+from models.respaldo_model import CatalogoRespaldos
+from services.backups.backups import BACKUP_DIR
+from services.backups.captura import restaurar_a_momento, CAPTURA_DIR
+from services.scheduler.scheduler import SCHEDULER_TZ
+
+
+class RestorePointInTimeCommand:
+    def __init__(self, hasta: datetime, archivo: str = None, colecciones: list = None, dry_run: bool = False,
+                 directorio: str = BACKUP_DIR, directorio_cambios: str = CAPTURA_DIR):
+        self.hasta = hasta
+        self.archivo = archivo
+        self.colecciones = colecciones
+        self.dry_run = dry_run
+        self.directorio = directorio
+        self.directorio_cambios = directorio_cambios
+
+    def execute(self):
+        """Ejecuta la recuperación. Retorna (exito, estadisticas o mensaje de error)."""
+        archivo = self.archivo
+        if archivo is None:
+            entrada = CatalogoRespaldos.anterior_a(self.hasta, self.colecciones)
+            if entrada is None:
+                requisito = f"con {', '.join(self.colecciones)}" if self.colecciones else "automáticos"
+                return False, (f"No hay respaldos {requisito} sin filtro anteriores a "
+                               f"{self.hasta.isoformat()} UTC")
+            archivo = entrada["archivo"]
+
+        try:
+            plan, respaldo, cambios = restaurar_a_momento(
+                self.hasta, archivo, directorio=self.directorio, directorio_cambios=self.directorio_cambios,
+                colecciones=self.colecciones, dry_run=self.dry_run
+            )
+        except Exception as e:
+            return False, f"Error al restaurar: {e}"
+
+        return True, {"plan": plan, "respaldo": respaldo, "cambios": cambios}
+
+
+def _hora_local(texto):
+    """Fecha local (SCHEDULER_TZ) a UTC naive"""
+    local = pytz.timezone(SCHEDULER_TZ).localize(datetime.fromisoformat(texto))
+    return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recuperación de la base a un momento dado")
+    parser.add_argument("--hasta", required=True, help="Fecha y hora local, p. ej. '2025-03-14 17:59:30'")
+    parser.add_argument("--archivo", help="Respaldo base (por defecto el más reciente anterior que sirva de base)")
+    parser.add_argument("--colecciones", nargs="+", help="Solo estas colecciones")
+    parser.add_argument("--dry-run", action="store_true", help="Solo lee y valida, sin escribir")
+    args = parser.parse_args()
+
+    hasta = _hora_local(args.hasta)
+    print(f"⏪ Restaurando al {args.hasta} ({SCHEDULER_TZ}) = {hasta.isoformat()} UTC"
+          f"{' [dry-run]' if args.dry_run else ''}...")
+    ok, resultado = RestorePointInTimeCommand(hasta, args.archivo, args.colecciones, args.dry_run).execute()
+    if ok:
+        respaldo, cambios = resultado["respaldo"], resultado["cambios"]
+        print(f"✅ Respaldo: {' -> '.join(resultado['plan'])} ({respaldo['documentos']} documentos, "
+              f"{respaldo['segundos']:.1f}s)")
+        print(f"✅ Cambios: {cambios['registros']} reproducidos ({cambios['borrados']} borrados) "
+              f"hasta {cambios['ultimo']} en {cambios['segundos']:.1f}s")
+    else:
+        print(f"❌ {resultado}")
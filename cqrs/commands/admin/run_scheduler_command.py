@@ -0,0 +1,63 @@
+# application/commands/admin/run_scheduler_command.py
+"""
+Proceso dedicado del planificador de tareas: ejecuta respaldos, alertas,
+consolidaciones y retención fuera de los workers web. Es la forma por
+defecto de correr las tareas (SCHEDULER_EMBEDDED=0 en la aplicación); si
+también corre embebido, la concesión en Mongo evita que una tarea se
+ejecute dos veces.
+
+Uso:
+    python -m cqrs.commands.admin.run_scheduler_command [--once] [--listar] [--ejecutar TAREA]
+"""
+import time
+import argparse
+from services.scheduler.scheduler import get_scheduler
+
+
+class RunSchedulerCommand:
+    def __init__(self, once: bool = False, ejecutar: str = None):
+        self.once = once
+        self.ejecutar = ejecutar
+
+    def execute(self):
+        """Ejecuta las tareas vencidas. Retorna (exito, ejecuciones o mensaje de error)."""
+        try:
+            scheduler = get_scheduler()
+            if self.ejecutar:
+                if self.ejecutar not in scheduler.jobs:
+                    return False, f"Tarea desconocida: {self.ejecutar}"
+                scheduler.ejecutar_ahora(self.ejecutar)
+
+            if self.once or self.ejecutar:
+                return True, scheduler.ejecutar_pendientes()
+
+            scheduler.iniciar()
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return True, []
+        except Exception as e:
+            return False, f"Error en el planificador: {e}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planificador de tareas periódicas")
+    parser.add_argument("--once", action="store_true", help="Ejecuta las tareas vencidas y termina")
+    parser.add_argument("--listar", action="store_true", help="Muestra las tareas y su próxima ejecución")
+    parser.add_argument("--ejecutar", help="Ejecuta ya una tarea (si ningún otro proceso la tiene)")
+    args = parser.parse_args()
+
+    if args.listar:
+        for tarea in get_scheduler().estado(historial=1):
+            ultima = tarea["historial"][0] if tarea["historial"] else {}
+            print(f"{'✅' if tarea.get('habilitado') else '⏸️'} {tarea['_id']:22} {tarea.get('cron', ''):15} "
+                  f"próxima {tarea.get('next_run')} UTC | última: {ultima.get('estado', '-')} "
+                  f"{ultima.get('duracion_ms', '')}")
+    else:
+        print("⏰ Planificador de tareas iniciado...")
+        ok, resultado = RunSchedulerCommand(args.once, args.ejecutar).execute()
+        if ok:
+            for registro in resultado:
+                print(f"   {registro['job']}: {registro['estado']} en {registro['duracion_ms']:.0f} ms")
+        else:
+            print(f"❌ {resultado}")
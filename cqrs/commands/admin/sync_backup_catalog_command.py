@@ -0,0 +1,47 @@
+# application/commands/admin/sync_backup_catalog_command.py
+"""
+Concilia el catálogo de respaldos (colección "respaldos") con los archivos de
+static/backup: registra los que falten leyendo su manifest y elimina las
+entradas de archivos borrados a mano.
+
+Uso:
+    python -m cqrs.commands.admin.sync_backup_catalog_command [--directorio static/backup]
+"""
+import time
+import argparse
+from models.respaldo_model import CatalogoRespaldos
+from services.backups.backups import BACKUP_DIR
+
+
+class SyncBackupCatalogCommand:
+    def __init__(self, directorio: str = BACKUP_DIR):
+        self.directorio = directorio
+
+    def execute(self):
+        """Ejecuta la conciliación. Retorna (exito, estadisticas o mensaje de error)."""
+        inicio = time.perf_counter()
+        try:
+            registrados, eliminados = CatalogoRespaldos.sincronizar(self.directorio)
+        except Exception as e:
+            return False, f"Error al sincronizar el catálogo: {e}"
+
+        return True, {
+            "registrados": registrados,
+            "eliminados": eliminados,
+            "total": CatalogoRespaldos.contar(),
+            "segundos": time.perf_counter() - inicio
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincroniza el catálogo de respaldos con el directorio")
+    parser.add_argument("--directorio", default=BACKUP_DIR, help="Directorio de respaldos")
+    args = parser.parse_args()
+
+    print("🗂️ Sincronizando catálogo de respaldos...")
+    ok, resultado = SyncBackupCatalogCommand(args.directorio).execute()
+    if ok:
+        print(f"✅ {resultado['registrados']} registrados, {resultado['eliminados']} eliminados, "
+              f"{resultado['total']} en catálogo ({resultado['segundos']:.1f}s)")
+    else:
+        print(f"❌ {resultado}")
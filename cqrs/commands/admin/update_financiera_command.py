@@ -33,7 +33,7 @@ class UpdateFinancieraCommand:
             return False, error
 
         update_data = self.data.copy()
-        update_data["updated_at"] = datetime.now()
+        update_data["updated_at"] = datetime.utcnow()
 
         # 1. Actualizar la financiera en la DB (función de modelo asumida)
         try:
@@ -45,7 +45,7 @@ class UpdateUserCommand:
         if "rol_id" in update_data:
             update_data["rol_id"] = ObjectId(update_data["rol_id"])
 
-        update_data["updated_at"] = datetime.now()
+        update_data["updated_at"] = datetime.utcnow()
 
         # 3. Actualizar el usuario en la DB (función de modelo asumida)
         try:
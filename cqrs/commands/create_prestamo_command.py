@@ -25,8 +25,8 @@ class CreatePrestamoHandler:
             "prestamo_observaciones": data.get("observaciones"),
             "creado_por": ObjectId(usuario_id),
             "financiera_id": ObjectId(data.get("financiera_id")), # Asegúrate de pasar esto
-            "created_at": datetime.now(),
-            "updated_at": datetime.now(),
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
             "deleted_at": None
         }
 
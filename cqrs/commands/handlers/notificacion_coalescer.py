@@ -0,0 +1,160 @@
+"""
+Coalescer de Notificaciones - Sistema Restaurante Callejón 9
+Agrupa eventos repetidos (mismo destinatario y mismo tipo) dentro de una
+ventana corta y emite una sola notificación agregada con el detalle adjunto.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime
+from pytz import timezone
+
+# Zona horaria de Mexico City (CST/CDT)
+Mexico_TZ = timezone('America/Mexico_City')
+
+# Ventana de agrupación en segundos (0 = sin agrupar, envío inmediato)
+VENTANA_SEGUNDOS = float(os.getenv("NOTIF_COALESCE_SECONDS", "5"))
+
+# Máximo de detalles adjuntos a una notificación agregada
+MAX_DETALLES = int(os.getenv("NOTIF_COALESCE_MAX_DETALLES", "200"))
+
+
+def get_mexico_datetime():
+    """Obtiene la fecha y hora actual en zona horaria de Mexico"""
+    return datetime.now(Mexico_TZ)
+
+
+class NotificacionCoalescer:
+    """
+    Buffer de notificaciones agrupadas por (id_usuario, tipo)
+
+    El primer evento de una clave abre una ventana; los eventos que llegan
+    dentro de esa ventana se acumulan y al cerrarla se emite una única
+    notificación. Si la ventana solo recibió un evento se emite tal cual.
+    """
+
+    def __init__(self, ventana_segundos=VENTANA_SEGUNDOS, max_detalles=MAX_DETALLES, emisor=None):
+        self.ventana_segundos = ventana_segundos
+        self.max_detalles = max_detalles
+        self._emisor = emisor
+        self._lock = threading.Lock()
+        self._pendientes = {}
+
+    def _emitir(self, tipo, mensaje, id_usuario, datos_extra):
+        """Envía la notificación final (por defecto vía NotificacionCommandHandler)"""
+        if self._emisor is None:
+            # Import diferido: notificacion_handler importa este módulo
+            from cqrs.commands.handlers.notificacion_handler import NotificacionCommandHandler
+            self._emisor = NotificacionCommandHandler.crear_notificacion
+
+        return self._emisor(
+            tipo=tipo,
+            mensaje=mensaje,
+            id_usuario=id_usuario,
+            datos_extra=datos_extra
+        )
+
+    def agregar(self, id_usuario, tipo, mensaje, datos_extra=None, mensaje_agrupado=None):
+        """
+        Registra un evento en la ventana de su clave
+
+        Args:
+            id_usuario: ID del usuario destinatario
+            tipo: Tipo de notificación
+            mensaje: Mensaje del evento individual
+            datos_extra: Detalle del evento
+            mensaje_agrupado: Plantilla con {total} para la notificación agregada
+
+        Returns:
+            dict: Resultado de la operación
+        """
+        if self.ventana_segundos <= 0:
+            return self._emitir(tipo, mensaje, id_usuario, datos_extra)
+
+        clave = (str(id_usuario), tipo)
+
+        with self._lock:
+            grupo = self._pendientes.get(clave)
+
+            if grupo is None:
+                grupo = {
+                    "mensaje": mensaje,
+                    "mensaje_agrupado": mensaje_agrupado,
+                    "total": 0,
+                    "detalles": [],
+                    "inicio": get_mexico_datetime()
+                }
+                timer = threading.Timer(self.ventana_segundos, self.flush, args=(clave,))
+                timer.daemon = True
+                grupo["timer"] = timer
+                self._pendientes[clave] = grupo
+                timer.start()
+
+            grupo["total"] += 1
+            if len(grupo["detalles"]) < self.max_detalles:
+                grupo["detalles"].append(datos_extra or {})
+
+            total = grupo["total"]
+
+        return {
+            "success": True,
+            "agrupada": True,
+            "pendientes": total,
+            "mensaje": "Notificación en cola de agrupación"
+        }
+
+    def flush(self, clave=None):
+        """
+        Emite las notificaciones pendientes
+
+        Args:
+            clave: (id_usuario, tipo) a emitir; None emite todas
+
+        Returns:
+            list: Resultados de las notificaciones emitidas
+        """
+        with self._lock:
+            if clave is None:
+                grupos = list(self._pendientes.items())
+                self._pendientes.clear()
+            else:
+                grupo = self._pendientes.pop(clave, None)
+                grupos = [(clave, grupo)] if grupo else []
+
+        resultados = []
+        for (id_usuario, tipo), grupo in grupos:
+            grupo["timer"].cancel()
+
+            try:
+                if grupo["total"] == 1:
+                    resultado = self._emitir(tipo, grupo["mensaje"], id_usuario, grupo["detalles"][0])
+                else:
+                    plantilla = grupo["mensaje_agrupado"] or "{total} eventos " + tipo
+                    resultado = self._emitir(
+                        tipo,
+                        plantilla.format(total=grupo["total"]),
+                        id_usuario,
+                        {
+                            "agrupada": True,
+                            "total": grupo["total"],
+                            "detalles": grupo["detalles"],
+                            "desde": grupo["inicio"].isoformat(),
+                            "hasta": get_mexico_datetime().isoformat()
+                        }
+                    )
+            except Exception as e:
+                logging.error(f"Error emitiendo notificación agrupada {tipo}: {e}")
+                resultado = {"success": False, "error": str(e)}
+
+            resultados.append(resultado)
+
+        return resultados
+
+
+# Instancia compartida por el proceso
+coalescer_notificaciones = NotificacionCoalescer()
+
+# No perder eventos en cola al apagar el worker
+atexit.register(coalescer_notificaciones.flush)
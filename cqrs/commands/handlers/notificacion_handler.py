@@ -8,6 +8,7 @@ from bson import ObjectId
 from pytz import timezone
 from models.notificacion import Notificacion
 from services.notificaciones.notification_service import notificar_usuario
+from cqrs.commands.handlers.notificacion_coalescer import coalescer_notificaciones
 
 # Zona horaria de Mexico City (CST/CDT)
 Mexico_TZ = timezone('America/Mexico_City')
@@ -308,9 +309,22 @@ class NotificacionSistemaHandler:
             }
         )
 
+    # Mensajes para notificaciones de inventario agrupadas
+    MENSAJES_INVENTARIO_AGRUPADO = {
+        "ENTRADA_REGISTRADA": "{total} entradas registradas",
+        "SALIDA_REGISTRADA": "{total} salidas registradas",
+        "MERMA_REGISTRADA": "{total} mermas registradas",
+        "STOCK_BAJO": "{total} insumos con stock bajo"
+    }
+
     @classmethod
     def notificar_inventario(cls, id_usuario, tipo_movimiento, nombre_insumo, cantidad):
-        """Notifica movimientos de inventario"""
+        """
+        Notifica movimientos de inventario
+
+        Los movimientos del mismo tipo para el mismo usuario se agrupan en
+        una sola notificación (ver NotificacionCoalescer).
+        """
         tipos = {
             "entrada": "ENTRADA_REGISTRADA",
             "salida": "SALIDA_REGISTRADA",
@@ -321,13 +335,14 @@ class NotificacionSistemaHandler:
         tipo = tipos.get(tipo_movimiento, "STOCK_BAJO")
         mensaje = f"{tipo_movimiento.title()}: {nombre_insumo} - {cantidad} unidades"
         
-        return NotificacionCommandHandler.crear_notificacion(
+        return coalescer_notificaciones.agregar(
+            id_usuario=id_usuario,
             tipo=tipo,
             mensaje=mensaje,
-            id_usuario=id_usuario,
             datos_extra={
                 "insumo": nombre_insumo,
                 "cantidad": cantidad,
                 "timestamp": get_mexico_datetime().isoformat()
-            }
+            },
+            mensaje_agrupado=cls.MENSAJES_INVENTARIO_AGRUPADO.get(tipo)
         )
\ No newline at end of file
@@ -4,6 +4,8 @@ Modelo de Usuario - Sistema de Roles para Restaurante
 
 from config.db import db
 from datetime import datetime
+import threading
+import time
 from bson.objectid import ObjectId
 
 
@@ -81,6 +83,16 @@ class Usuario:
             }}
         )
 
+    @classmethod
+    def update_password(cls, user_id, hashed_password):
+        return cls.collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$set": {
+                "usuario_clave": hashed_password,
+                "updated_at": datetime.utcnow()
+            }}
+        )
+
     @classmethod
     def update_2fa_status(cls, user_id, is_enabled, tipo=None, secret=None, telefono=None):
         return cls.collection.update_one(
@@ -213,19 +225,87 @@ class RolPermisos:
         }
     }
     
+    # Indice compilado: rol -> frozenset de permisos ("modulo:<x>" para modulos)
+    # Los cambios guardados con actualizar_rol() incrementan la version en
+    # configuracion y cada worker recompila al detectarla.
+    collection = db["configuracion"]
+    VERSION_CHECK_SECONDS = 30
+    
+    _permisos = None
+    _indice = None
+    _version = None
+    _version_checked_at = 0.0
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _compilar_rol(permisos_rol):
+        permisos = {k for k, v in permisos_rol.items() if v is True}
+        permisos.update(f"modulo:{m}" for m in permisos_rol.get("modulos", []))
+        return frozenset(permisos)
+    
+    @classmethod
+    def _cargar(cls):
+        doc = cls.collection.find_one({"tipo": "permisos_roles"}) or {}
+        permisos = {rol: dict(datos) for rol, datos in cls.PERMISOS.items()}
+        for rol, datos in (doc.get("roles") or {}).items():
+            permisos.setdefault(str(rol), {}).update(datos)
+        
+        cls._permisos = permisos
+        cls._indice = {rol: cls._compilar_rol(datos) for rol, datos in permisos.items()}
+        cls._version = doc.get("version", 0)
+    
+    @classmethod
+    def indice(cls):
+        """Indice compilado de permisos; se recarga si cambio la version"""
+        ahora = time.monotonic()
+        if cls._indice is not None and ahora - cls._version_checked_at < cls.VERSION_CHECK_SECONDS:
+            return cls._indice
+        
+        with cls._lock:
+            if cls._indice is None or ahora - cls._version_checked_at >= cls.VERSION_CHECK_SECONDS:
+                try:
+                    doc = cls.collection.find_one({"tipo": "permisos_roles"}, {"version": 1}) or {}
+                    if cls._indice is None or doc.get("version", 0) != cls._version:
+                        cls._cargar()
+                except Exception:
+                    # Sin base de datos se usan los permisos por defecto
+                    if cls._indice is None:
+                        cls._permisos = cls.PERMISOS
+                        cls._indice = {rol: cls._compilar_rol(d) for rol, d in cls.PERMISOS.items()}
+                cls._version_checked_at = ahora
+        return cls._indice
+    
+    @classmethod
+    def invalidar(cls):
+        """Fuerza la recarga del indice en la siguiente consulta"""
+        cls._version_checked_at = 0.0
+        cls._version = None
+    
+    @classmethod
+    def actualizar_rol(cls, rol, permisos):
+        """Guarda permisos personalizados de un rol e incrementa la version"""
+        cambios = {f"roles.{rol}.{k}": v for k, v in permisos.items()}
+        cambios["updated_at"] = datetime.utcnow()
+        result = cls.collection.update_one(
+            {"tipo": "permisos_roles"},
+            {"$set": cambios, "$inc": {"version": 1}},
+            upsert=True
+        )
+        cls.invalidar()
+        return result
+    
     @classmethod
     def get_permisos(cls, rol):
-        return cls.PERMISOS.get(str(rol), {})
+        cls.indice()
+        return cls._permisos.get(str(rol), {})
     
     @classmethod
     def tiene_permiso(cls, rol, permiso):
-        permisos_rol = cls.get_permisos(str(rol))
-        return permisos_rol.get(permiso, False)
+        return permiso in cls.indice().get(str(rol), frozenset())
     
     @classmethod
     def puede_acceder_modulo(cls, rol, modulo):
-        permisos_rol = cls.get_permisos(str(rol))
-        return modulo in permisos_rol.get("modulos", [])
+        return f"modulo:{modulo}" in cls.indice().get(str(rol), frozenset())
     
     @classmethod
     def get_nombre_rol(cls, rol):
@@ -70,7 +70,43 @@ class ReportsModel:
         ]
         
         return list(ReportsModel.pedidos.aggregate(pipeline))
-    
+
+    @staticmethod
+    def consolidar_estadisticas_diarias(hasta=None, dias_maximos=31):
+        """
+        Guarda en estadisticas_diarias el resumen de ventas de cada día cerrado
+        que aún no esté consolidado (desde el último guardado hasta ayer)
+
+        Args:
+            hasta: datetime - Día límite (exclusivo); por defecto hoy (UTC)
+            dias_maximos: int - Días hacia atrás a revisar si la colección está vacía
+
+        Returns:
+            int: Días consolidados
+        """
+        hasta = (hasta or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        ultimo = db.estadisticas_diarias.find_one(sort=[("fecha", -1)])
+        desde = ultimo["fecha"] + timedelta(days=1) if ultimo else hasta - timedelta(days=dias_maximos)
+        if desde >= hasta:
+            return 0
+
+        resumen = {r["_id"]: r for r in ReportsModel.ventas_por_periodo(desde, hasta - timedelta(microseconds=1), 'dia')}
+        dias = 0
+        dia = desde
+        while dia < hasta:
+            datos = resumen.get(dia.strftime("%Y-%m-%d"), {})
+            db.estadisticas_diarias.update_one({"fecha": dia}, {"$set": {
+                "fecha": dia,
+                "total_ventas": datos.get("total_ventas", 0),
+                "num_pedidos": datos.get("num_pedidos", 0),
+                "total_propinas": datos.get("total_propinas", 0),
+                "promedio_por_pedido": datos.get("promedio_por_pedido", 0),
+                "actualizado": datetime.utcnow()
+            }}, upsert=True)
+            dia += timedelta(days=1)
+            dias += 1
+        return dias
+
     @staticmethod
     def utilidad_bruta(fecha_inicio, fecha_fin):
         """
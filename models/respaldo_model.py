@@ -0,0 +1,246 @@
+"""
+Catálogo de respaldos
+=====================
+Un documento por archivo en static/backup, registrado al escribirlo:
+
+    {
+        "archivo": "auto_backup_20250101_020000.zip",
+        "bytes": 8123456, "sha256": "...", "creado": datetime,
+        "automatico": True, "tipo": "completo" | "incremental",
+        "base": ..., "completo": ...,            # cadena incremental
+        "formato": "zip", "codec": "gzip",
+        "filtrado": False,                       # generado con filtro (rango de tiempo)
+        "documentos": 557755,
+        "colecciones": {"ventas": {"documentos": 150000, "sha256": "...", "bytes": ...,
+                                   "marca_agua": '{"_id": {"$oid": ...}}'}},
+        "verificacion": {"estado": "pendiente" | "ok" | "fallida" | "sin_manifest",
+                         "fecha": datetime, "errores": [...], "segundos": 1.2}
+    }
+
+La marca de agua se guarda como texto Extended JSON: sus claves empiezan
+con "$" y Mongo no las admite como nombres de campo.
+
+El listado, la retención y la elección de la base incremental son consultas
+indexadas sobre esta colección, sin listar ni abrir los archivos.
+
+Cada respaldo nuevo queda con verificación "pendiente"; la tarea
+verificacion_respaldos lo recorre con verificar_respaldo y guarda el
+resultado.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from pymongo import DESCENDING
+from config.db import db
+from services.backups.backups import leer_manifest, sha256_archivo, BACKUP_DIR, TIPO_COMPLETO
+
+VERIFICACION_PENDIENTE = "pendiente"
+VERIFICACION_OK = "ok"
+VERIFICACION_FALLIDA = "fallida"
+VERIFICACION_SIN_MANIFEST = "sin_manifest"
+
+
+class CatalogoRespaldos:
+    collection = db["respaldos"]
+    _indices_creados = False
+
+    @staticmethod
+    def asegurar_indices():
+        """Índices del catálogo (una vez por proceso)"""
+        if CatalogoRespaldos._indices_creados:
+            return
+        CatalogoRespaldos.collection.create_index("archivo", unique=True)
+        CatalogoRespaldos.collection.create_index([("creado", DESCENDING)])
+        CatalogoRespaldos.collection.create_index([("automatico", 1), ("creado", DESCENDING)])
+        CatalogoRespaldos.collection.create_index("completo")
+        CatalogoRespaldos.collection.create_index([("verificacion.estado", 1), ("creado", 1)])
+        CatalogoRespaldos._indices_creados = True
+
+    @staticmethod
+    def registrar(stats, automatico=False, usuario_id=None):
+        """
+        Registra un respaldo recién escrito a partir de las estadísticas de crear_respaldo
+
+        Returns:
+            dict: Entrada del catálogo
+        """
+        CatalogoRespaldos.asegurar_indices()
+        manifest = stats["manifest"]
+        entrada = {
+            "archivo": stats["archivo"],
+            "bytes": stats["bytes"],
+            "sha256": stats.get("sha256"),
+            "creado": datetime.fromisoformat(manifest["creado"]),
+            "automatico": automatico,
+            "usuario_id": usuario_id,
+            "tipo": manifest.get("tipo", TIPO_COMPLETO),
+            "base": manifest.get("base"),
+            "completo": manifest.get("completo") or stats["archivo"],
+            "formato": manifest.get("formato"),
+            "codec": manifest.get("codec"),
+            "filtrado": manifest.get("filtro") not in (None, "{}"),
+            "documentos": stats["documentos"],
+            # La lista de chunks de los respaldos "cas" se queda en su manifest
+            "colecciones": {
+                c: {**{k: v for k, v in datos.items() if k != "chunks"},
+                    "marca_agua": json.dumps(datos.get("marca_agua"))}
+                for c, datos in manifest["colecciones"].items()
+            },
+            # Un archivo reescrito con el mismo nombre se vuelve a verificar
+            "verificacion": {"estado": VERIFICACION_PENDIENTE}
+        }
+        CatalogoRespaldos.collection.update_one({"archivo": entrada["archivo"]}, {"$set": entrada}, upsert=True)
+        return entrada
+
+    @staticmethod
+    def listar(skip=0, limite=10):
+        """Respaldos del más reciente al más antiguo, paginados"""
+        CatalogoRespaldos.asegurar_indices()
+        return list(CatalogoRespaldos.collection.find({}, {"_id": 0}).sort("creado", DESCENDING)
+                    .skip(skip).limit(limite))
+
+    @staticmethod
+    def contar():
+        return CatalogoRespaldos.collection.count_documents({})
+
+    @staticmethod
+    def obtener(archivo):
+        return CatalogoRespaldos.collection.find_one({"archivo": archivo}, {"_id": 0})
+
+    @staticmethod
+    def eliminar(archivo):
+        CatalogoRespaldos.collection.delete_one({"archivo": archivo})
+
+    @staticmethod
+    def pendientes_verificacion(limite=20):
+        """Respaldos con verificación pendiente, del más antiguo al más reciente"""
+        CatalogoRespaldos.asegurar_indices()
+        return list(CatalogoRespaldos.collection.find(
+            {"verificacion.estado": VERIFICACION_PENDIENTE}, {"_id": 0, "archivo": 1, "sha256": 1}
+        ).sort("creado", 1).limit(limite))
+
+    @staticmethod
+    def registrar_verificacion(archivo, resultado):
+        """
+        Guarda el resultado de verificar_respaldo en la entrada del catálogo
+
+        Returns:
+            dict: Verificación guardada (estado, fecha, errores, segundos)
+        """
+        if resultado["valido"] is None:
+            estado = VERIFICACION_SIN_MANIFEST
+        else:
+            estado = VERIFICACION_OK if resultado["valido"] else VERIFICACION_FALLIDA
+        verificacion = {
+            "estado": estado,
+            "fecha": datetime.utcnow(),
+            "errores": resultado["errores"][:20],
+            "segundos": round(resultado["segundos"], 3)
+        }
+        CatalogoRespaldos.collection.update_one({"archivo": archivo}, {"$set": {"verificacion": verificacion}})
+        return verificacion
+
+    @staticmethod
+    def anterior_a(fecha, colecciones=None):
+        """
+        Respaldo más reciente creado antes de `fecha` (UTC) que sirve de base
+        para una recuperación a un momento: sin filtro y con todas las
+        `colecciones` pedidas. Sin colecciones solo sirve un respaldo
+        automático, el único que contiene la base completa.
+        """
+        CatalogoRespaldos.asegurar_indices()
+        consulta = {"creado": {"$lte": fecha}, "formato": {"$ne": "legado"}}
+        if colecciones:
+            # Las entradas anteriores a "filtrado" solo se aceptan si son automáticas (nunca llevan filtro)
+            consulta["$or"] = [{"automatico": True}, {"filtrado": False}]
+            consulta.update({f"colecciones.{c}": {"$exists": True} for c in colecciones})
+        else:
+            consulta["automatico"] = True
+        return CatalogoRespaldos.collection.find_one(consulta, {"_id": 0}, sort=[("creado", DESCENDING)])
+
+    @staticmethod
+    def mas_antiguo():
+        """Fecha del respaldo más antiguo del catálogo, o None"""
+        entrada = CatalogoRespaldos.collection.find_one({}, {"creado": 1}, sort=[("creado", 1)])
+        return entrada["creado"] if entrada else None
+
+    @staticmethod
+    def ultimo_automatico():
+        """
+        Respaldo automático más reciente con sus marcas de agua decodificadas,
+        listo para usarse como `base` de crear_respaldo
+        """
+        CatalogoRespaldos.asegurar_indices()
+        entrada = CatalogoRespaldos.collection.find_one({"automatico": True}, {"_id": 0},
+                                                        sort=[("creado", DESCENDING)])
+        if entrada:
+            for datos in entrada.get("colecciones", {}).values():
+                datos["marca_agua"] = json.loads(datos.get("marca_agua") or "null")
+        return entrada
+
+    @staticmethod
+    def cadenas_vencidas(retention_days):
+        """
+        Archivos de las cadenas automáticas cuyo respaldo más reciente es
+        anterior a la retención (una cadena se elimina completa o no se elimina)
+        """
+        CatalogoRespaldos.asegurar_indices()
+        limite = datetime.utcnow() - timedelta(days=retention_days)
+        cadenas = CatalogoRespaldos.collection.aggregate([
+            {"$match": {"automatico": True}},
+            {"$group": {"_id": "$completo", "ultimo": {"$max": "$creado"}, "archivos": {"$push": "$archivo"}}},
+            {"$match": {"ultimo": {"$lt": limite}}}
+        ])
+        return [archivo for cadena in cadenas for archivo in cadena["archivos"]]
+
+    @staticmethod
+    def sincronizar(directorio=BACKUP_DIR):
+        """
+        Concilia el catálogo con el directorio: registra los archivos que no
+        están (respaldos previos al catálogo o copiados a mano) y elimina las
+        entradas cuyo archivo ya no existe
+
+        Returns:
+            tuple: (registrados, eliminados)
+        """
+        CatalogoRespaldos.asegurar_indices()
+        if not os.path.isdir(directorio):
+            return 0, 0
+
+        en_disco = {
+            f for f in os.listdir(directorio)
+            if os.path.isfile(os.path.join(directorio, f)) and not f.endswith(".part")
+        }
+        catalogados = set(CatalogoRespaldos.collection.distinct("archivo"))
+
+        registrados = 0
+        for archivo in sorted(en_disco - catalogados):
+            ruta = os.path.join(directorio, archivo)
+            try:
+                manifest = leer_manifest(ruta)
+            except Exception as e:
+                logging.warning(f"Manifest ilegible en {archivo}: {e}")
+                manifest = None
+
+            colecciones = (manifest or {}).get("colecciones", {})
+            CatalogoRespaldos.registrar({
+                "archivo": archivo,
+                "bytes": os.path.getsize(ruta),
+                "sha256": sha256_archivo(ruta),
+                "documentos": sum(d.get("documentos", 0) for d in colecciones.values()),
+                "manifest": manifest or {
+                    # Formato anterior sin manifest: solo se conoce el archivo
+                    "creado": datetime.utcfromtimestamp(os.path.getmtime(ruta)).isoformat(),
+                    "formato": "legado",
+                    "colecciones": {}
+                }
+            }, automatico=archivo.startswith("auto_backup_"))
+            registrados += 1
+
+        faltantes = list(catalogados - en_disco)
+        if faltantes:
+            CatalogoRespaldos.collection.delete_many({"archivo": {"$in": faltantes}})
+
+        return registrados, len(faltantes)
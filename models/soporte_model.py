@@ -1,18 +1,139 @@
 # models/soporte_model.py
+import time
 from config.db import db
 from bson.objectid import ObjectId
 from datetime import datetime
+from enum import Enum
+
+# ==========================================
+# ENUMS DE TICKETS
+# ==========================================
+
+class EstadoTicket(str, Enum):
+    """Estados canónicos de un ticket"""
+    PENDIENTE = "pendiente"
+    EN_REVISION = "en_revision"
+    RESUELTO = "resuelto"
+    CERRADO = "cerrado"
+
+class PrioridadTicket(str, Enum):
+    """Prioridades canónicas de un ticket"""
+    BAJA = "baja"
+    MEDIA = "media"
+    ALTA = "alta"
+
+
+# Grafías históricas (en minúsculas) -> valor canónico
+ESTADOS_TICKET = {
+    "pendiente": EstadoTicket.PENDIENTE,
+    "abierto": EstadoTicket.PENDIENTE,
+    "en_revision": EstadoTicket.EN_REVISION,
+    "en revision": EstadoTicket.EN_REVISION,
+    "en revisión": EstadoTicket.EN_REVISION,
+    "resuelto": EstadoTicket.RESUELTO,
+    "completado": EstadoTicket.RESUELTO,
+    "cerrado": EstadoTicket.CERRADO
+}
+
+PRIORIDADES_TICKET = {
+    "baja": PrioridadTicket.BAJA,
+    "media": PrioridadTicket.MEDIA,
+    "normal": PrioridadTicket.MEDIA,
+    "alta": PrioridadTicket.ALTA,
+    "critica": PrioridadTicket.ALTA,
+    "crítica": PrioridadTicket.ALTA,
+    "urgente": PrioridadTicket.ALTA
+}
+
+ESTADOS_ABIERTOS = (EstadoTicket.PENDIENTE, EstadoTicket.EN_REVISION)
+ESTADOS_CERRADOS = (EstadoTicket.RESUELTO, EstadoTicket.CERRADO)
+
+
+def normalizar_estado(estado, defecto=EstadoTicket.PENDIENTE):
+    """Estado canónico para cualquier grafía conocida ("Abierto" -> pendiente); defecto si no se reconoce"""
+    return ESTADOS_TICKET.get(str(estado or "").strip().lower(), defecto)
+
+
+def normalizar_prioridad(prioridad, defecto=PrioridadTicket.MEDIA):
+    """Prioridad canónica para cualquier grafía conocida ("Crítica" -> alta); defecto si no se reconoce"""
+    return PRIORIDADES_TICKET.get(str(prioridad or "").strip().lower(), defecto)
+
+
+def _canonicos(valores, enum):
+    """Valida que todos los valores sean canónicos del enum; lanza ValueError si no"""
+    if isinstance(valores, (str, Enum)):
+        valores = [valores]
+    canonicos = []
+    for valor in valores:
+        try:
+            canonicos.append(enum(valor).value)
+        except ValueError:
+            raise ValueError(f"Valor no canónico para {enum.__name__}: {valor!r}")
+    return canonicos
+
+
+def _variantes(canonicos, grafias):
+    """Valores canónicos más todas sus grafías históricas (minúsculas, capitalizadas y mayúsculas)"""
+    variantes = set(canonicos)
+    for grafia, canonico in grafias.items():
+        if canonico.value in canonicos:
+            variantes.update({grafia, grafia.capitalize(), grafia.title(), grafia.upper()})
+    return sorted(variantes)
+
 
 class Ticket:
     collection = db.tickets
+    _indices_creados = False
+    # Marca en "configuracion" que escribe backfill_ticket_estados_command al terminar
+    migracion_collection = db["configuracion"]
+    _migrado = False
+    _migrado_revisado = 0.0
+    MIGRACION_REVISION_SEGUNDOS = 60
+
+    @staticmethod
+    def datos_canonicos():
+        """
+        True si los tickets guardados ya tienen estado y prioridad canónicos
+        (backfill completo). Mientras no, los filtros incluyen las grafías
+        históricas; se revisa como máximo cada MIGRACION_REVISION_SEGUNDOS.
+        """
+        if Ticket._migrado:
+            return True
+        ahora = time.monotonic()
+        if ahora - Ticket._migrado_revisado >= Ticket.MIGRACION_REVISION_SEGUNDOS:
+            Ticket._migrado_revisado = ahora
+            marca = Ticket.migracion_collection.find_one({"tipo": "tickets_canonicos"}, {"completado": 1}) or {}
+            Ticket._migrado = bool(marca.get("completado"))
+        return Ticket._migrado
+
+    @staticmethod
+    def marcar_datos_canonicos():
+        """Registra que ya no quedan tickets con grafías históricas"""
+        Ticket.migracion_collection.update_one(
+            {"tipo": "tickets_canonicos"},
+            {"$set": {"completado": True, "fecha": datetime.utcnow()}},
+            upsert=True
+        )
+        Ticket._migrado = True
+
+    @staticmethod
+    def asegurar_indices():
+        """Índices compuestos para los filtros del módulo de soporte (una vez por proceso)"""
+        if Ticket._indices_creados:
+            return
+        Ticket.collection.create_index([("estado", 1), ("fecha", -1)])
+        Ticket.collection.create_index([("prioridad", 1), ("estado", 1)])
+        Ticket.collection.create_index("usuario_id")
+        Ticket._indices_creados = True
 
     @staticmethod
-    def crear_ticket(usuario_id, asunto, descripcion):
+    def crear_ticket(usuario_id, asunto, descripcion, prioridad=PrioridadTicket.MEDIA):
         ticket = {
             "usuario_id": ObjectId(usuario_id),
             "asunto": asunto,
             "descripcion": descripcion,
-            "estado": "Pendiente",
+            "estado": EstadoTicket.PENDIENTE.value,
+            "prioridad": _canonicos(prioridad, PrioridadTicket)[0],
             "fecha": datetime.utcnow()
         }
         return Ticket.collection.insert_one(ticket)
@@ -21,10 +142,110 @@ class Ticket:
     def obtener_tickets(usuario_id):
         return list(Ticket.collection.find({"usuario_id": ObjectId(usuario_id)}).sort("fecha", -1))
 
+    @staticmethod
+    def filtro(estados=None, prioridades=None, desde=None, excluir_estados=None):
+        """
+        Construye el filtro de tickets. Solo acepta valores canónicos
+        (EstadoTicket / PrioridadTicket o su valor); cualquier otro lanza ValueError.
+        Hasta que el backfill termine también coincide con las grafías históricas
+        ("Abierto", "Crítica"...) de esos valores.
+
+        Args:
+            excluir_estados: Estados a excluir ($nin; incluye estados desconocidos o sin estado)
+        """
+        if Ticket.datos_canonicos():
+            estados_de = prioridades_de = lambda canonicos: canonicos
+        else:
+            estados_de = lambda canonicos: _variantes(canonicos, ESTADOS_TICKET)
+            prioridades_de = lambda canonicos: _variantes(canonicos, PRIORIDADES_TICKET)
+
+        filtro = {}
+        if estados is not None:
+            filtro["estado"] = {"$in": estados_de(_canonicos(estados, EstadoTicket))}
+        if excluir_estados is not None:
+            filtro.setdefault("estado", {})["$nin"] = estados_de(_canonicos(excluir_estados, EstadoTicket))
+        if prioridades is not None:
+            filtro["prioridad"] = {"$in": prioridades_de(_canonicos(prioridades, PrioridadTicket))}
+        if desde is not None:
+            filtro["fecha"] = {"$gte": desde}
+        return filtro
+
+    @staticmethod
+    def buscar(estados=None, prioridades=None, desde=None, orden=("fecha", -1),
+               skip=0, limite=0, proyeccion=None, excluir_estados=None):
+        """Cursor de tickets filtrados por valores canónicos"""
+        Ticket.asegurar_indices()
+        cursor = Ticket.collection.find(Ticket.filtro(estados, prioridades, desde, excluir_estados), proyeccion)
+        if orden:
+            cursor = cursor.sort(*orden)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limite:
+            cursor = cursor.limit(limite)
+        return cursor
+
+    @staticmethod
+    def contar(estados=None, prioridades=None, desde=None):
+        """Número de tickets filtrados por valores canónicos"""
+        Ticket.asegurar_indices()
+        return Ticket.collection.count_documents(Ticket.filtro(estados, prioridades, desde))
+
+    @staticmethod
+    def actualizar(ticket_id, estado=None, prioridad=None, **campos):
+        """Actualiza un ticket; estado y prioridad deben ser canónicos"""
+        if estado is not None:
+            campos["estado"] = _canonicos(estado, EstadoTicket)[0]
+        if prioridad is not None:
+            campos["prioridad"] = _canonicos(prioridad, PrioridadTicket)[0]
+        campos["ultima_actualizacion"] = datetime.now()
+        return Ticket.collection.update_one({"_id": ObjectId(ticket_id)}, {"$set": campos})
+
 
 class FAQ:
     collection = db.faq
+    # Documento de versión en "configuracion": cada cambio la incrementa y los
+    # índices de búsqueda en memoria se reconstruyen al detectarla.
+    version_collection = db["configuracion"]
 
     @staticmethod
     def obtener_faq():
         return list(FAQ.collection.find().sort("orden", 1))
+
+    @staticmethod
+    def obtener_version():
+        doc = FAQ.version_collection.find_one({"tipo": "faq_version"}, {"version": 1}) or {}
+        return doc.get("version", 0)
+
+    @staticmethod
+    def _incrementar_version():
+        FAQ.version_collection.update_one(
+            {"tipo": "faq_version"},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    @staticmethod
+    def crear(pregunta, respuesta, keywords=None, orden=0, necesita_humano=False):
+        result = FAQ.collection.insert_one({
+            "pregunta": pregunta,
+            "respuesta": respuesta,
+            "keywords": keywords or [],
+            "orden": orden,
+            "necesita_humano": necesita_humano,
+            "created_at": datetime.utcnow()
+        })
+        FAQ._incrementar_version()
+        return result
+
+    @staticmethod
+    def actualizar(faq_id, **campos):
+        campos["updated_at"] = datetime.utcnow()
+        result = FAQ.collection.update_one({"_id": ObjectId(faq_id)}, {"$set": campos})
+        FAQ._incrementar_version()
+        return result
+
+    @staticmethod
+    def eliminar(faq_id):
+        result = FAQ.collection.delete_one({"_id": ObjectId(faq_id)})
+        FAQ._incrementar_version()
+        return result
@@ -2,8 +2,8 @@
 Módulo de Rutas - Sistema de Restaurante Callejón 9
 Roles: 1=Admin, 2=Mesero, 3=Cocina, 4=Inventario
 """
-from flask import Blueprint, render_template, session, redirect, url_for, request
-from controllers.auth.AuthController import AuthController, login_required, rol_required, permiso_required
+from flask import Blueprint, render_template, session, redirect, url_for, request, Response
+from controllers.auth.AuthController import AuthController, login_required, rol_required, permiso_required, perfil_actual
 from controllers.dashboard.dashboard_controller import DashboardController
 from controllers.admin.BackupController import BackupController
 from controllers.inventario.inventarioController import InventarioController
@@ -192,6 +192,23 @@ def admin_empleados_crear():
 def admin_reportes():
     return DashboardController.reportes()
 
+# --- Métricas (Prometheus) ---
+@routes_bp.route("/metrics")
+@login_required
+@rol_required(['1'])
+def admin_metrics():
+    from services.observability.metrics import registry
+    from services.security.rate_limiter import get_login_limiter
+
+    stats = get_login_limiter().estadisticas()
+    extras = {
+        "callejon9_login_rechazados_total": ("counter", "Intentos de login rechazados por rate limit", [
+            ('tipo="ip"', stats["bloqueados_ip"]),
+            ('tipo="email"', stats["bloqueados_email"])
+        ])
+    }
+    return Response(registry.prometheus(extras), mimetype="text/plain; version=0.0.4")
+
 # ============================================
 #  PANEL DE MESERO (Rol 2)
 # ============================================
@@ -211,7 +228,7 @@ def mesero_mesas():
     if "usuario_rol" not in session or str(session["usuario_rol"]) != "2":
         return redirect(url_for("routes.login"))
     
-    perfil_mesero = session.get("perfil_mesero", {})
+    perfil_mesero = perfil_actual()
     stats = {
         "mesas_asignadas": perfil_mesero.get("mesas_asignadas", []),
         "comandas_activas": 0,
@@ -230,7 +247,7 @@ def mesero_comandas():
     if "usuario_rol" not in session or str(session["usuario_rol"]) != "2":
         return redirect(url_for("routes.login"))
     
-    perfil_mesero = session.get("perfil_mesero", {})
+    perfil_mesero = perfil_actual()
     stats = {
         "mesas_asignadas": perfil_mesero.get("mesas_asignadas", []),
     }
@@ -247,7 +264,7 @@ def mesero_menu():
     if "usuario_rol" not in session or str(session["usuario_rol"]) != "2":
         return redirect(url_for("routes.login"))
     
-    perfil_mesero = session.get("perfil_mesero", {})
+    perfil_mesero = perfil_actual()
     stats = {
         "mesas_asignadas": perfil_mesero.get("mesas_asignadas", []),
     }
@@ -297,7 +314,7 @@ def cocina_pedidos():
     if "usuario_rol" not in session or str(session["usuario_rol"]) != "3":
         return redirect(url_for("routes.login"))
     
-    perfil_cocina = session.get("perfil_cocina", {})
+    perfil_cocina = perfil_actual()
     
     return render_template("cocina/pedidos.html",
                          perfil=perfil_cocina)
@@ -449,6 +466,19 @@ def admin_backup_delete(filename):
 def admin_backup_restore():
     return BackupController.restore()
 
+# Progreso de la Restauración en Curso
+@routes_bp.route('/admin/backup/restore/progress', methods=['GET'])
+@login_required
+@rol_required(['1'])
+def admin_backup_restore_progress():
+    return BackupController.restore_progress()
+
+@routes_bp.route('/admin/backup/preview/<filename>', methods=['GET'])
+@login_required
+@rol_required(['1'])
+def admin_backup_preview(filename):
+    return BackupController.preview(filename)
+
 # Configuración de Backup Automático
 @routes_bp.route('/admin/backup/configure', methods=['POST'])
 @login_required
@@ -456,6 +486,13 @@ def admin_backup_restore():
 def admin_backup_configure():
     return BackupController.configure_auto_backup()
 
+# Estado del Planificador de Tareas
+@routes_bp.route('/admin/scheduler/status', methods=['GET'])
+@login_required
+@rol_required(['1'])
+def admin_scheduler_status():
+    return BackupController.scheduler_status()
+
 # ============================================
 #  MÓDULO DE REPORTES
 # ============================================
@@ -1,9 +1,7 @@
 import pyotp
-import qrcode
-import base64
-import io
 import random
 import string
+from services.security.qr_service import QRService
 
 class TwoFactorService:
     """
@@ -35,16 +33,9 @@ class TwoFactorService:
     def generate_qr_code(provisioning_uri):
         """
         Genera el código QR para el URI de aprovisionamiento y lo devuelve en formato base64.
+        Delegado a QRService (misma caché que el setup de 2FA).
         """
-        # Crear la imagen QR
-        img = qrcode.make(provisioning_uri)
-        
-        # Usar un buffer en memoria para guardar la imagen (evitar archivos temporales)
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        
-        # Devolver la imagen codificada en base64
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return QRService.render_base64(provisioning_uri, "png")
 
     @staticmethod
     def verify_code(secret_key, otp_code):
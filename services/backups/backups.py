@@ -0,0 +1,1042 @@
+"""
+Motor de Respaldos - Restaurante Callejón 9
+===========================================
+Exporta colecciones en streaming: cada cursor se recorre por lotes y cada
+documento se escribe directamente como una línea de Extended JSON en el
+destino comprimido. La memoria usada no depende del tamaño de la base.
+
+Formatos:
+    - .jsonl.gz: gzip con secciones por colección (un miembro gzip por sección)
+          {"$coleccion": "usuarios"}        <- inicio de sección
+          {"_id": {"$oid": "..."}, ...}     <- documentos de esa colección
+          {"$manifest": {...}}              <- última línea
+    - .zip: un miembro por colección y un manifest.json. Cada miembro se
+      guarda sin compresión ZIP y contiene un stream ya comprimido:
+          usuarios.jsonl.gz   (codec "gzip")
+          usuarios.jsonl.zst  (codec "zstd"; requiere el paquete opcional "zstandard")
+      Los ZIP anteriores con miembros usuarios.jsonl (deflate) se siguen leyendo.
+    - .cas.json: solo el manifest, con la lista de chunks de cada colección
+      en el almacén direccionado por contenido <directorio>/chunks (ver
+      chunks.py). Los chunks que no cambiaron se comparten entre respaldos.
+
+Respaldos incrementales: el manifest guarda por colección una marca de agua
+(máximo _id y máximo updated_at al iniciar). Un incremental exporta solo lo
+insertado o modificado después de la marca de su respaldo base (menos un
+margen de BACKUP_WATERMARK_OVERLAP_SECONDS), y planear_restauracion()
+compone el completo con su cadena de incrementales.
+Los borrados no se capturan hasta el siguiente respaldo completo.
+
+Con BACKUP_WORKERS > 1 las colecciones se exportan en paralelo a archivos
+temporales y luego se copian al respaldo en el orden pedido.
+
+El manifest registra por colección el número de documentos y el SHA-256 de
+las líneas sin comprimir; verificar_respaldo() los recalcula recorriendo el
+archivo. leer_manifest() no recorre el respaldo en ningún formato: en ZIP y
+.cas.json es un archivo aparte y en .jsonl.gz el último miembro gzip, que se
+busca desde el final del archivo.
+
+Ninguna clave de un documento Mongo puede empezar con "$", así que las
+marcas no se confunden con documentos.
+"""
+
+import os
+import io
+import json
+import gzip
+import time
+import hashlib
+import logging
+import shutil
+import zlib
+import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson import BSON, ObjectId, json_util
+from pymongo import InsertOne, ReplaceOne
+from services.backups.chunks import AlmacenChunks, trocear, BACKUP_CHUNK_GC_GRACE_HOURS
+
+# Configuración
+BACKUP_DIR = os.path.join("static", "backup")
+BACKUP_BATCH_SIZE = int(os.getenv("BACKUP_BATCH_SIZE", "1000"))
+BACKUP_GZIP_LEVEL = int(os.getenv("BACKUP_GZIP_LEVEL", "6"))
+BACKUP_CODEC = os.getenv("BACKUP_CODEC", "gzip")
+BACKUP_ZSTD_LEVEL = int(os.getenv("BACKUP_ZSTD_LEVEL", "3"))
+BACKUP_WORKERS = int(os.getenv("BACKUP_WORKERS", "4"))
+# Días máximos de una cadena incremental antes de forzar un respaldo completo (0 = siempre completo)
+BACKUP_FULL_EVERY_DAYS = int(os.getenv("BACKUP_FULL_EVERY_DAYS", "7"))
+# Margen que se resta a la marca de agua: cubre relojes desfasados y ObjectId no monótonos entre workers
+BACKUP_WATERMARK_OVERLAP_SECONDS = int(os.getenv("BACKUP_WATERMARK_OVERLAP_SECONDS", "60"))
+# Formato de los respaldos automáticos: "cas" deduplica lo que no cambió entre noches
+BACKUP_AUTO_FORMAT = os.getenv("BACKUP_AUTO_FORMAT", "cas")
+
+EXTENSION_JSONL = ".jsonl.gz"
+EXTENSION_ZIP = ".zip"
+EXTENSION_CAS = ".cas.json"
+DIRECTORIO_CHUNKS = "chunks"
+MARCA_COLECCION = "$coleccion"
+MARCA_MANIFEST = "$manifest"
+MANIFEST_ZIP = "manifest.json"
+MANIFEST_VERSION = 1
+MAX_BSON_SIZE = 16 * 1024 * 1024
+
+# Estado operativo del sistema, no datos del negocio: no se respaldan, no se
+# capturan y, si vienen en un respaldo anterior, no se restauran. Restaurarlas
+# rebobinaría el catálogo, el estado de la captura de cambios, las concesiones
+# del planificador y revivirían sesiones y códigos vencidos.
+COLECCIONES_INTERNAS = (
+    "respaldos", "restauraciones", "captura_estado",
+    "scheduler_jobs", "scheduler_historial",
+    "sesiones", "rate_limits", "codigos_2fa"
+)
+
+# Inicio de la cabecera de los miembros gzip que escribe _compresor (sin nombre, mtime=0)
+CABECERA_GZIP = b"\x1f\x8b\x08\x00\x00\x00\x00\x00"
+
+CODECS = ("gzip", "zstd")
+TIPO_COMPLETO = "completo"
+TIPO_INCREMENTAL = "incremental"
+
+_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+def _linea(doc):
+    return json_util.dumps(doc, json_options=_JSON_OPTIONS, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("El códec zstd requiere el paquete 'zstandard' (pip install zstandard)")
+    return zstandard
+
+
+class _SalidaHash:
+    """Escribe texto como UTF-8 en un stream binario acumulando SHA-256, bytes y líneas"""
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+        self.lineas = 0
+
+    def write(self, texto):
+        datos = texto.encode("utf-8")
+        self.sha256.update(datos)
+        self.bytes += len(datos)
+        # Cada documento es exactamente una línea (Extended JSON escapa los saltos)
+        self.lineas += datos.count(b"\n")
+        self.destino.write(datos)
+
+
+def exportar_coleccion(coleccion, salida, filtro=None, batch_size=BACKUP_BATCH_SIZE):
+    """
+    Escribe los documentos de una colección en `salida` (acepta write(str)), lote por lote
+
+    Returns:
+        int: Documentos escritos
+    """
+    total = 0
+    lote = []
+    for doc in coleccion.find(filtro or {}).batch_size(batch_size):
+        lote.append(_linea(doc))
+        if len(lote) >= batch_size:
+            salida.write("".join(lote))
+            total += len(lote)
+            lote = []
+    if lote:
+        salida.write("".join(lote))
+        total += len(lote)
+    return total
+
+
+def _compresor(destino, codec, nivel):
+    """Stream comprimido completo (gzip o zstd) sobre un destino binario que no se cierra"""
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=nivel).stream_writer(destino, closefd=False)
+    return gzip.GzipFile(filename="", fileobj=destino, mode="wb", compresslevel=nivel, mtime=0)
+
+
+def _exportar_seccion(destino, database, col_name, filtro, codec, nivel, batch_size, marca):
+    """
+    Escribe una colección como un stream comprimido independiente en `destino`
+
+    Al ser autocontenido, el stream puede generarse en un hilo sobre un
+    archivo temporal y copiarse después al respaldo sin recomprimir: gzip
+    admite miembros concatenados y en ZIP cada colección es su propio miembro.
+
+    Returns:
+        dict: Entrada del manifest (documentos, sha256, bytes y error si lo hubo)
+    """
+    entrada = {}
+    with _compresor(destino, codec, nivel) as comprimido:
+        if marca:
+            comprimido.write((json.dumps({MARCA_COLECCION: col_name}) + "\n").encode("utf-8"))
+        salida = _SalidaHash(comprimido)
+        try:
+            exportar_coleccion(database[col_name], salida, filtro, batch_size)
+        except Exception as e:
+            logging.warning(f"Error al respaldar colección {col_name}: {e}")
+            entrada["error"] = str(e)
+
+    entrada.update(documentos=salida.lineas, sha256=salida.sha256.hexdigest(), bytes=salida.bytes)
+    return entrada
+
+
+def _exportar_en_paralelo(colecciones, directorio, workers, exportar):
+    """
+    Exporta cada colección a un archivo temporal en un pool acotado de hilos
+
+    Los cursores son independientes y la espera de red y la compresión
+    (zlib/zstd liberan el GIL) se solapan entre colecciones.
+
+    Returns:
+        dict: {colección: (ruta temporal, entrada del manifest)} listo para ensamblar
+    """
+    def tarea(col_name):
+        ruta = os.path.join(directorio, f"{col_name}.part")
+        with open(ruta, "wb") as destino:
+            return ruta, exportar(destino, col_name)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="respaldo") as pool:
+        futuros = {col_name: pool.submit(tarea, col_name) for col_name in colecciones}
+        return {col_name: futuro.result() for col_name, futuro in futuros.items()}
+
+
+def _exportar_chunks(almacen, database, col_name, filtro, batch_size):
+    """
+    Exporta una colección al almacén de chunks
+
+    Se recorre ordenada por _id (índice): con el mismo contenido el orden, y
+    por lo tanto los chunks, se repiten de un respaldo al siguiente.
+
+    Returns:
+        dict: Entrada del manifest (chunks, nuevos, bytes_nuevos, documentos, sha256, bytes)
+    """
+    entrada = {"chunks": [], "nuevos": 0, "bytes_nuevos": 0}
+    sha256, documentos, total = hashlib.sha256(), 0, 0
+    cursor = database[col_name].find(filtro or {}).sort("_id", 1).batch_size(batch_size)
+    try:
+        for datos in trocear(_linea(doc).encode("utf-8") for doc in cursor):
+            clave, escritos = almacen.guardar(datos)
+            entrada["chunks"].append(clave)
+            if escritos:
+                entrada["nuevos"] += 1
+                entrada["bytes_nuevos"] += escritos
+            # Solo cuenta lo que quedó en chunks guardados
+            sha256.update(datos)
+            documentos += datos.count(b"\n")
+            total += len(datos)
+    except Exception as e:
+        logging.warning(f"Error al respaldar colección {col_name}: {e}")
+        entrada["error"] = str(e)
+
+    entrada.update(documentos=documentos, sha256=sha256.hexdigest(), bytes=total)
+    return entrada
+
+
+def _escribir_chunks(temporal, colecciones, database, filtros, codec, nivel, batch_size, workers, manifest):
+    almacen = AlmacenChunks(os.path.join(os.path.dirname(temporal) or ".", DIRECTORIO_CHUNKS), codec, nivel)
+
+    def exportar(col_name):
+        return _exportar_chunks(almacen, database, col_name, filtros.get(col_name), batch_size)
+
+    if workers > 1 and len(colecciones) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="respaldo") as pool:
+            exportadas = dict(zip(colecciones, pool.map(exportar, colecciones)))
+    else:
+        exportadas = {col_name: exportar(col_name) for col_name in colecciones}
+
+    for col_name in colecciones:
+        manifest["colecciones"][col_name].update(exportadas[col_name])
+    manifest["almacen"] = DIRECTORIO_CHUNKS
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, default=str)
+
+
+def _a_json(valor):
+    return json.loads(json_util.dumps(valor, json_options=_JSON_OPTIONS))
+
+
+def _de_json(valor):
+    return json_util.loads(json.dumps(valor), json_options=_JSON_OPTIONS)
+
+
+def marca_agua(coleccion):
+    """
+    Marca de agua actual de una colección: máximo _id y máximo updated_at
+
+    Returns:
+        dict: {"_id": ..., "updated_at": ...} en Extended JSON, o None si está vacía
+    """
+    try:
+        marca = {}
+        for campo in ("_id", "updated_at"):
+            doc = next(iter(coleccion.find({campo: {"$exists": True}}, {campo: 1}).sort(campo, -1).limit(1)), None)
+            if doc is not None:
+                marca[campo] = _a_json(doc[campo])
+        return marca or None
+    except Exception as e:
+        logging.debug(f"Sin marca de agua para {getattr(coleccion, 'name', coleccion)}: {e}")
+        return None
+
+
+def _con_margen(valor):
+    """Retrocede la marca BACKUP_WATERMARK_OVERLAP_SECONDS; otros tipos se dejan igual"""
+    margen = timedelta(seconds=BACKUP_WATERMARK_OVERLAP_SECONDS)
+    if isinstance(valor, ObjectId):
+        return ObjectId.from_datetime(valor.generation_time - margen)
+    if isinstance(valor, datetime):
+        return valor - margen
+    return valor
+
+
+def filtro_incremental(marca):
+    """
+    Documentos insertados (_id) o modificados (updated_at) después de la marca
+
+    La marca se retrocede un margen: lo que cae dentro se vuelve a exportar,
+    pero la restauración hace upsert por _id, así que repetirlo no cambia nada.
+    """
+    if not marca:
+        return {}
+    condiciones = [{campo: {"$gt": _con_margen(_de_json(valor))}} for campo, valor in marca.items()]
+    return condiciones[0] if len(condiciones) == 1 else {"$or": condiciones}
+
+
+def _combinar(*filtros):
+    filtros = [f for f in filtros if f]
+    if not filtros:
+        return {}
+    return filtros[0] if len(filtros) == 1 else {"$and": filtros}
+
+
+def _escribir(temporal, colecciones, database, filtros, formato, codec, nivel, batch_size, workers, manifest):
+    if formato == "cas":
+        return _escribir_chunks(temporal, colecciones, database, filtros, codec, nivel, batch_size, workers, manifest)
+
+    es_zip = formato == "zip"
+    extension = ".jsonl.zst" if codec == "zstd" else ".jsonl.gz"
+
+    def exportar(destino, col_name):
+        return _exportar_seccion(destino, database, col_name, filtros.get(col_name), codec, nivel, batch_size,
+                                 marca=not es_zip)
+
+    with open(temporal, "wb") as crudo:
+        archivo = zipfile.ZipFile(crudo, "w", compression=zipfile.ZIP_STORED) if es_zip else None
+
+        def agregar(col_name, escribir):
+            # Los miembros ZIP van sin compresión ZIP: ya contienen un stream gzip/zstd
+            if es_zip:
+                miembro = f"{col_name}{extension}"
+                with archivo.open(miembro, "w", force_zip64=True) as entrada:
+                    datos = escribir(entrada)
+                datos = {"miembro": miembro, **datos}
+            else:
+                datos = escribir(crudo)
+            manifest["colecciones"][col_name].update(datos)
+
+        if workers > 1 and len(colecciones) > 1:
+            with tempfile.TemporaryDirectory(dir=os.path.dirname(temporal) or ".") as partes:
+                exportadas = _exportar_en_paralelo(colecciones, partes, workers, exportar)
+                for col_name in colecciones:
+                    ruta, datos = exportadas[col_name]
+
+                    def copiar(destino):
+                        with open(ruta, "rb") as origen:
+                            shutil.copyfileobj(origen, destino, 1024 * 1024)
+                        return datos
+
+                    agregar(col_name, copiar)
+                    os.remove(ruta)
+        else:
+            for col_name in colecciones:
+                agregar(col_name, lambda destino: exportar(destino, col_name))
+
+        if es_zip:
+            archivo.writestr(MANIFEST_ZIP, json.dumps(manifest, default=str, indent=2))
+            archivo.close()
+        else:
+            with _compresor(crudo, "gzip", nivel) as comprimido:
+                comprimido.write((json.dumps({MARCA_MANIFEST: manifest}, default=str) + "\n").encode("utf-8"))
+
+
+def sha256_archivo(ruta, bloque=1024 * 1024):
+    """SHA-256 del archivo comprimido tal como quedó en disco"""
+    sha256 = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for datos in iter(lambda: f.read(bloque), b""):
+            sha256.update(datos)
+    return sha256.hexdigest()
+
+
+def crear_respaldo(nombre, colecciones, database=None, filtro=None, directorio=BACKUP_DIR,
+                   formato="jsonl", codec=BACKUP_CODEC, nivel=None, batch_size=BACKUP_BATCH_SIZE,
+                   workers=BACKUP_WORKERS, base=None):
+    """
+    Genera <directorio>/<nombre>.jsonl.gz, <nombre>.zip o <nombre>.cas.json en streaming
+
+    El archivo se escribe como .part y se renombra al terminar, así un
+    respaldo incompleto nunca aparece en el listado.
+
+    Args:
+        formato: "jsonl" (gzip de un solo archivo), "zip" (un miembro por colección)
+                 o "cas" (manifest de chunks deduplicados)
+        codec: "gzip" o "zstd" (zip y cas)
+        nivel: Nivel de compresión (default BACKUP_GZIP_LEVEL / BACKUP_ZSTD_LEVEL)
+        workers: Colecciones exportadas a la vez (1 = secuencial, directo al archivo)
+        base: Manifest del respaldo anterior de la cadena; si se indica el
+              respaldo es incremental respecto a sus marcas de agua
+
+    Returns:
+        dict: archivo, colecciones {nombre: documentos}, documentos, bytes, sha256, segundos, manifest.
+              En "cas", bytes es el espacio nuevo en disco: manifest más chunks que no existían.
+    """
+    if database is None:
+        from config.db import db as database
+    if codec not in CODECS:
+        raise ValueError(f"Códec de respaldo no soportado: {codec}")
+    if formato == "jsonl":
+        codec = "gzip"
+    if nivel is None:
+        nivel = BACKUP_ZSTD_LEVEL if codec == "zstd" else BACKUP_GZIP_LEVEL
+    if codec == "zstd":
+        _zstd()
+
+    os.makedirs(directorio, exist_ok=True)
+    archivo = nombre + {"zip": EXTENSION_ZIP, "cas": EXTENSION_CAS}.get(formato, EXTENSION_JSONL)
+    ruta = os.path.join(directorio, archivo)
+    temporal = ruta + ".part"
+
+    colecciones = list(colecciones)
+    marcas_base = {c: datos.get("marca_agua") for c, datos in (base or {}).get("colecciones", {}).items()}
+    # Marcas tomadas antes de exportar: lo que cambie durante el respaldo entra en el siguiente
+    marcas = {c: marca_agua(database[c]) for c in colecciones}
+    filtros = {
+        c: _combinar(filtro, filtro_incremental(marcas_base.get(c)) if base else None)
+        for c in colecciones
+    }
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "archivo": archivo,
+        "tipo": TIPO_INCREMENTAL if base else TIPO_COMPLETO,
+        "base": base["archivo"] if base else None,
+        "completo": (base.get("completo") or base["archivo"]) if base else archivo,
+        "formato": formato,
+        "codec": codec,
+        "nivel": nivel,
+        "filtro": json_util.dumps(filtro or {}),
+        "creado": datetime.utcnow().isoformat(),
+        "colecciones": {c: {"marca_agua": marcas[c] or marcas_base.get(c)} for c in colecciones}
+    }
+    inicio = time.perf_counter()
+
+    try:
+        _escribir(temporal, colecciones, database, filtros, formato, codec, nivel,
+                  batch_size, max(1, workers), manifest)
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    por_coleccion = {c: datos["documentos"] for c, datos in manifest["colecciones"].items()}
+    return {
+        "archivo": archivo,
+        "colecciones": por_coleccion,
+        "documentos": sum(por_coleccion.values()),
+        "bytes": os.path.getsize(ruta) + sum(d.get("bytes_nuevos", 0) for d in manifest["colecciones"].values()),
+        "sha256": sha256_archivo(ruta),
+        "segundos": time.perf_counter() - inicio,
+        "manifest": manifest
+    }
+
+
+# ==========================================
+# LECTURA
+# ==========================================
+
+def _abrir_binario(origen):
+    return open(origen, "rb") if isinstance(origen, str) else origen
+
+
+def _firma(origen):
+    f = _abrir_binario(origen)
+    try:
+        return f.read(2)
+    finally:
+        if isinstance(origen, str):
+            f.close()
+        else:
+            f.seek(0)
+
+
+def _es_cas(origen):
+    return isinstance(origen, str) and origen.endswith(EXTENSION_CAS)
+
+
+def es_respaldo_streaming(origen):
+    """True si el origen es un .jsonl.gz, un .zip con manifest o un .cas.json (formatos de este motor)"""
+    if _es_cas(origen):
+        return True
+    firma = _firma(origen)
+    if firma == b"\x1f\x8b":
+        return True
+    if firma == b"PK":
+        with zipfile.ZipFile(origen) as archivo:
+            return MANIFEST_ZIP in archivo.namelist()
+    return False
+
+
+def _lineas_jsonl(origen):
+    crudo = gzip.open(origen, "rb") if isinstance(origen, str) else gzip.GzipFile(fileobj=origen, mode="rb")
+    with io.TextIOWrapper(crudo, encoding="utf-8") as entrada:
+        for linea in entrada:
+            if linea.strip():
+                yield linea
+
+
+def _leer_jsonl(origen, colecciones=None):
+    coleccion, incluida = None, False
+    for linea in _lineas_jsonl(origen):
+        if linea.startswith('{"$'):
+            marca = json.loads(linea)
+            if MARCA_COLECCION in marca:
+                coleccion = marca[MARCA_COLECCION]
+                incluida = colecciones is None or coleccion in colecciones
+                continue
+            if MARCA_MANIFEST in marca:
+                continue
+        if coleccion is None:
+            raise ValueError("Respaldo inválido: documento antes de la primera sección")
+        # Las secciones no seleccionadas se descomprimen pero no se decodifican
+        if incluida:
+            yield coleccion, json_util.loads(linea, json_options=_JSON_OPTIONS)
+
+
+def _abrir_miembro_binario(archivo, miembro):
+    crudo = archivo.open(miembro, "r")
+    if miembro.endswith(".zst"):
+        return _zstd().ZstdDecompressor().stream_reader(crudo)
+    if miembro.endswith(".gz"):
+        return gzip.GzipFile(fileobj=crudo, mode="rb")
+    return crudo
+
+
+def abrir_miembro(archivo, miembro):
+    """Stream de texto con las líneas sin comprimir de un miembro del ZIP"""
+    return io.TextIOWrapper(_abrir_miembro_binario(archivo, miembro), encoding="utf-8")
+
+
+class _LectorJSONLegado:
+    """
+    Lee en streaming el formato anterior {"coleccion": [doc, ...], ...}
+
+    Solo mantiene en memoria el documento que se está decodificando (más el
+    bloque leído), en lugar de json.load del archivo completo.
+    """
+
+    BLOQUE = 1024 * 1024
+
+    def __init__(self, texto):
+        self.texto = texto
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder(object_hook=lambda d: json_util.object_hook(d, _JSON_OPTIONS))
+
+    def _llenar(self):
+        datos = self.texto.read(self.BLOQUE)
+        self.buffer = self.buffer[self.pos:] + datos
+        self.pos = 0
+        return bool(datos)
+
+    def _siguiente(self):
+        """Siguiente carácter no blanco, sin consumirlo"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._llenar():
+                raise ValueError("Respaldo JSON incompleto")
+
+    def _consumir(self, esperados):
+        caracter = self._siguiente()
+        if caracter not in esperados:
+            raise ValueError(f"Respaldo JSON inválido: se esperaba {esperados!r} y se encontró {caracter!r}")
+        self.pos += 1
+        return caracter
+
+    def _valor(self):
+        self._siguiente()
+        while True:
+            try:
+                valor, fin = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # El valor quedó cortado por el bloque: se lee más y se reintenta
+                if not self._llenar():
+                    raise
+                continue
+            self.pos = fin
+            return valor
+
+    def __iter__(self):
+        self._consumir("{")
+        if self._siguiente() == "}":
+            return
+        while True:
+            coleccion = self._valor()
+            self._consumir(":")
+            self._consumir("[")
+            if self._siguiente() != "]":
+                while True:
+                    yield coleccion, self._valor()
+                    if self._consumir(",]") == "]":
+                        break
+            else:
+                self.pos += 1
+            if self._consumir(",}") == "}":
+                return
+
+
+def _leer_zip(origen, colecciones=None):
+    with zipfile.ZipFile(origen) as archivo:
+        if MANIFEST_ZIP not in archivo.namelist():
+            # ZIP anterior: un único .json con todas las colecciones
+            miembro = next((m for m in archivo.namelist() if m.endswith(".json")), None)
+            if miembro is None:
+                raise ValueError("No se encontró archivo JSON en el ZIP")
+            with io.TextIOWrapper(archivo.open(miembro, "r"), encoding="utf-8") as entrada:
+                yield from _filtrar(_LectorJSONLegado(entrada), colecciones)
+            return
+
+        manifest = json.loads(archivo.read(MANIFEST_ZIP))
+        for col_name, datos in manifest["colecciones"].items():
+            # Los miembros no seleccionados ni se abren
+            if colecciones is not None and col_name not in colecciones:
+                continue
+            with abrir_miembro(archivo, datos["miembro"]) as entrada:
+                for linea in entrada:
+                    if linea.strip():
+                        yield col_name, json_util.loads(linea, json_options=_JSON_OPTIONS)
+
+
+def _leer_chunks(ruta, colecciones=None):
+    with open(ruta, encoding="utf-8") as f:
+        manifest = json.load(f)
+    almacen = AlmacenChunks(os.path.join(os.path.dirname(ruta) or ".", manifest.get("almacen", DIRECTORIO_CHUNKS)))
+    for col_name, datos in manifest["colecciones"].items():
+        if colecciones is not None and col_name not in colecciones:
+            continue
+        for clave in datos.get("chunks", []):
+            for linea in almacen.leer(clave).decode("utf-8").splitlines():
+                if linea:
+                    yield col_name, json_util.loads(linea, json_options=_JSON_OPTIONS)
+
+
+def _filtrar(documentos, colecciones):
+    for col_name, doc in documentos:
+        if colecciones is None or col_name in colecciones:
+            yield col_name, doc
+
+
+def leer_respaldo(origen, colecciones=None):
+    """
+    Recorre un respaldo sin cargarlo completo. Acepta .jsonl.gz, .zip con
+    manifest, .cas.json (ruta en el directorio de su almacén de chunks) y
+    los formatos anteriores (.json y .zip con un .json).
+
+    Args:
+        origen: Ruta del archivo o stream binario con seek (p. ej. un archivo subido)
+        colecciones: Colecciones a leer (None = todas)
+
+    Yields:
+        tuple: (colección, documento BSON)
+    """
+    colecciones = set(colecciones) if colecciones else None
+    if _es_cas(origen):
+        yield from _leer_chunks(origen, colecciones)
+        return
+    firma = _firma(origen)
+
+    if firma == b"PK":
+        yield from _leer_zip(origen, colecciones)
+    elif firma == b"\x1f\x8b":
+        yield from _leer_jsonl(origen, colecciones)
+    else:
+        f = _abrir_binario(origen)
+        try:
+            entrada = io.TextIOWrapper(f, encoding="utf-8")
+            yield from _filtrar(_LectorJSONLegado(entrada), colecciones)
+            entrada.detach()
+        finally:
+            if isinstance(origen, str):
+                f.close()
+
+
+def _manifest_al_final(origen, maximo=4 * 1024 * 1024):
+    """
+    Manifest de un .jsonl.gz leyendo solo su último miembro gzip: se buscan
+    cabeceras desde el final hasta una que se descomprima completa
+    """
+    f = _abrir_binario(origen)
+    try:
+        f.seek(0, os.SEEK_END)
+        tamano = f.tell()
+        leer = min(tamano, 64 * 1024)
+        while True:
+            f.seek(tamano - leer)
+            cola = f.read(leer)
+            pos = len(cola)
+            while True:
+                pos = cola.rfind(CABECERA_GZIP, 0, pos)
+                if pos < 0:
+                    break
+                try:
+                    texto = gzip.decompress(cola[pos:])
+                except (OSError, EOFError, zlib.error):
+                    continue  # Coincidencia dentro de datos comprimidos o miembro cortado
+                if texto.startswith(b'{"' + MARCA_MANIFEST.encode()):
+                    return json.loads(texto)[MARCA_MANIFEST]
+                return None
+            if leer >= min(tamano, maximo):
+                return None
+            leer = min(tamano, leer * 4)
+    finally:
+        if isinstance(origen, str):
+            f.close()
+        else:
+            f.seek(0)
+
+
+def leer_manifest(origen):
+    """
+    Manifest de un respaldo sin recorrerlo. En ZIP solo lee manifest.json y
+    en .jsonl.gz su último miembro. Los formatos anteriores no tienen
+    manifest (None).
+    """
+    if _es_cas(origen):
+        with open(origen, encoding="utf-8") as f:
+            return json.load(f)
+    firma = _firma(origen)
+    if firma == b"PK":
+        with zipfile.ZipFile(origen) as archivo:
+            if MANIFEST_ZIP not in archivo.namelist():
+                return None
+            return json.loads(archivo.read(MANIFEST_ZIP))
+    if firma != b"\x1f\x8b":
+        return None
+
+    manifest = _manifest_al_final(origen)
+    if manifest is not None:
+        return manifest
+    # Sin manifest al final (archivo cortado o ajeno): se recorre completo
+    manifest = None
+    for linea in _lineas_jsonl(origen):
+        if linea.startswith('{"' + MARCA_MANIFEST):
+            manifest = json.loads(linea)[MARCA_MANIFEST]
+    return manifest
+
+
+def vista_previa(origen):
+    """
+    Resumen de un respaldo a partir de su manifest, sin leer los datos
+
+    Returns:
+        dict | None: archivo, tipo, base, completo, formato, codec, creado, documentos
+                     y colecciones {nombre: {documentos, bytes, error?}}; None sin manifest
+    """
+    manifest = leer_manifest(origen)
+    if manifest is None:
+        return None
+    colecciones = {}
+    for col_name, datos in manifest["colecciones"].items():
+        colecciones[col_name] = {"documentos": datos.get("documentos", 0), "bytes": datos.get("bytes", 0)}
+        if datos.get("error"):
+            colecciones[col_name]["error"] = datos["error"]
+    resumen = {clave: manifest.get(clave) for clave in ("archivo", "tipo", "base", "completo", "formato", "codec", "creado")}
+    resumen.update(documentos=sum(c["documentos"] for c in colecciones.values()), colecciones=colecciones)
+    return resumen
+
+
+# ==========================================
+# VERIFICACIÓN
+# ==========================================
+
+def _sumar(sumas, col_name, datos):
+    sha256, documentos = sumas.setdefault(col_name, (hashlib.sha256(), [0]))
+    sha256.update(datos)
+    documentos[0] += datos.count(b"\n")
+
+
+def _sumas_respaldo(origen, manifest, bloque=1024 * 1024):
+    """
+    Recorre los datos sin comprimir de cada colección acumulando SHA-256 y
+    documentos, sobre los mismos bytes que se hashearon al escribir
+
+    Returns:
+        dict: {colección: (sha256, [documentos])}
+    """
+    sumas = {}
+    if _es_cas(origen):
+        almacen = AlmacenChunks(os.path.join(os.path.dirname(origen) or ".", manifest.get("almacen", DIRECTORIO_CHUNKS)))
+        for col_name, datos in manifest["colecciones"].items():
+            for clave in datos.get("chunks", []):
+                _sumar(sumas, col_name, almacen.leer(clave))
+    elif _firma(origen) == b"PK":
+        # Al leer cada miembro completo zipfile también comprueba su CRC
+        with zipfile.ZipFile(origen) as archivo:
+            for col_name, datos in manifest["colecciones"].items():
+                with _abrir_miembro_binario(archivo, datos["miembro"]) as entrada:
+                    for bloque_datos in iter(lambda: entrada.read(bloque), b""):
+                        _sumar(sumas, col_name, bloque_datos)
+    else:
+        crudo = gzip.open(origen, "rb") if isinstance(origen, str) else gzip.GzipFile(fileobj=origen, mode="rb")
+        with crudo:
+            coleccion = None
+            for linea in crudo:
+                # Las marcas de sección y el manifest no forman parte del hash
+                if linea.startswith(b'{"$'):
+                    marca = json.loads(linea)
+                    if MARCA_COLECCION in marca:
+                        coleccion = marca[MARCA_COLECCION]
+                        continue
+                    if MARCA_MANIFEST in marca:
+                        continue
+                if coleccion is None:
+                    raise ValueError("Respaldo inválido: documento antes de la primera sección")
+                _sumar(sumas, coleccion, linea)
+    return sumas
+
+
+def verificar_respaldo(origen, sha256=None):
+    """
+    Comprueba que un respaldo se puede restaurar sin restaurarlo
+
+    Recorre el archivo en streaming (o sus chunks) y compara, por colección,
+    los documentos y el SHA-256 de las líneas sin comprimir con los del
+    manifest. Una colección que falló al respaldarse también invalida el
+    respaldo. No decodifica documentos ni escribe en la base.
+
+    Args:
+        origen: Ruta o stream binario (se deja al inicio al terminar)
+        sha256: SHA-256 esperado del archivo (el del catálogo), opcional
+
+    Returns:
+        dict: valido (None si el respaldo no tiene manifest y no se puede verificar),
+              colecciones {nombre: {documentos, esperados, valida}}, errores [str], segundos
+    """
+    inicio = time.perf_counter()
+    resultado = {"valido": False, "colecciones": {}, "errores": [], "segundos": 0.0}
+    errores = resultado["errores"]
+    try:
+        manifest = leer_manifest(origen)
+        if manifest is None:
+            resultado["valido"] = None
+            errores.append("Respaldo sin manifest (formato anterior): no se puede verificar")
+            return resultado
+
+        sumas = _sumas_respaldo(origen, manifest)
+        for col_name, datos in manifest["colecciones"].items():
+            sha256_col, documentos = sumas.get(col_name, (hashlib.sha256(), [0]))
+            entrada = {"documentos": documentos[0], "esperados": datos.get("documentos", 0)}
+            entrada["valida"] = not datos.get("error") and entrada["documentos"] == entrada["esperados"] \
+                and sha256_col.hexdigest() == datos.get("sha256")
+            resultado["colecciones"][col_name] = entrada
+            if datos.get("error"):
+                errores.append(f"{col_name}: falló al respaldarse ({datos['error']})")
+            elif entrada["documentos"] != entrada["esperados"]:
+                errores.append(f"{col_name}: {entrada['documentos']} documentos, el manifest indica {entrada['esperados']}")
+            elif not entrada["valida"]:
+                errores.append(f"{col_name}: el SHA-256 no coincide con el manifest")
+
+        if sha256 and isinstance(origen, str) and sha256_archivo(origen) != sha256:
+            errores.append("El SHA-256 del archivo no coincide con el del catálogo")
+        resultado["valido"] = not errores
+    except Exception as e:
+        # Archivo cortado, CRC de ZIP, chunk faltante o corrupto
+        errores.append(str(e) or type(e).__name__)
+    finally:
+        if not isinstance(origen, str):
+            origen.seek(0)
+        resultado["segundos"] = time.perf_counter() - inicio
+    return resultado
+
+
+# ==========================================
+# RESTAURACIÓN
+# ==========================================
+
+MAX_ERRORES_VALIDACION = 20
+
+
+def _validar(col_name, doc, errores):
+    try:
+        if not isinstance(doc, dict):
+            raise ValueError(f"se esperaba un documento y se encontró {type(doc).__name__}")
+        if len(BSON.encode(doc)) > MAX_BSON_SIZE:
+            raise ValueError("excede el tamaño máximo de un documento BSON")
+    except Exception as e:
+        if len(errores) < MAX_ERRORES_VALIDACION:
+            errores.append(f"{col_name} ({doc.get('_id') if isinstance(doc, dict) else '?'}): {e}")
+        return False
+    return True
+
+
+def restaurar_respaldo(origen, database=None, reemplazar=False, colecciones=None, dry_run=False,
+                       progreso=None, batch_size=BACKUP_BATCH_SIZE):
+    """
+    Aplica un respaldo en streaming con bulk_write de upserts por _id en lotes fijos
+
+    Args:
+        reemplazar: Elimina las colecciones del manifest antes de leer (y las de
+                    respaldos sin manifest antes de su primer lote); si no, los
+                    documentos se aplican encima de los actuales
+        colecciones: Colecciones a restaurar (None = todas las del respaldo,
+                     excepto COLECCIONES_INTERNAS, que nunca se restauran)
+        dry_run: Solo decodifica y valida los documentos, sin escribir
+        progreso: Callback(resumen) llamado después de cada lote
+
+    Returns:
+        dict: colecciones {nombre: documentos}, documentos, invalidos, errores, dry_run, segundos
+    """
+    if database is None:
+        from config.db import db as database
+
+    resumen = {"colecciones": {}, "documentos": 0, "invalidos": 0, "errores": [],
+               "dry_run": dry_run, "coleccion": None, "segundos": 0.0}
+    inicio = time.perf_counter()
+    lote, actual = [], None
+
+    if reemplazar:
+        # Las colecciones del manifest se limpian antes de leer: una sin documentos
+        # no aparece en el recorrido y conservaría los datos actuales
+        for col_name in (leer_manifest(origen) or {}).get("colecciones", {}):
+            if col_name in COLECCIONES_INTERNAS or (colecciones is not None and col_name not in colecciones):
+                continue
+            if not dry_run:
+                database[col_name].drop()
+            resumen["colecciones"][col_name] = 0
+
+    def volcar():
+        if actual is None:
+            return
+        if lote and not dry_run:
+            database[actual].bulk_write([
+                ReplaceOne({"_id": d["_id"]}, d, upsert=True) if "_id" in d else InsertOne(d)
+                for d in lote
+            ], ordered=False)
+        resumen["colecciones"][actual] += len(lote)
+        resumen["documentos"] += len(lote)
+        resumen["segundos"] = time.perf_counter() - inicio
+        lote.clear()
+        if progreso:
+            progreso(resumen)
+
+    for col_name, doc in leer_respaldo(origen, colecciones):
+        if col_name in COLECCIONES_INTERNAS:
+            continue
+        if col_name != actual:
+            volcar()
+            actual = col_name
+            resumen["coleccion"] = col_name
+            if col_name not in resumen["colecciones"]:
+                if reemplazar and not dry_run:
+                    database[col_name].drop()  # Limpia la colección actual
+                resumen["colecciones"][col_name] = 0
+        if dry_run and not _validar(col_name, doc, resumen["errores"]):
+            resumen["invalidos"] += 1
+            continue
+        lote.append(doc)
+        if len(lote) >= batch_size:
+            volcar()
+    volcar()
+
+    resumen["segundos"] = time.perf_counter() - inicio
+    return resumen
+
+
+def chunks_referenciados(directorio=BACKUP_DIR):
+    """Claves de todos los chunks que usa algún manifest .cas.json del directorio"""
+    referenciados = set()
+    if not os.path.isdir(directorio):
+        return referenciados
+    for archivo in os.listdir(directorio):
+        if archivo.endswith(EXTENSION_CAS):
+            manifest = leer_manifest(os.path.join(directorio, archivo))
+            for datos in manifest["colecciones"].values():
+                referenciados.update(datos.get("chunks", []))
+    return referenciados
+
+
+def recolectar_chunks(directorio=BACKUP_DIR, gracia_horas=BACKUP_CHUNK_GC_GRACE_HOURS):
+    """
+    Elimina del almacén los chunks que ya no referencia ningún respaldo
+    (llamar después de borrar respaldos por retención)
+
+    Returns:
+        tuple: (chunks eliminados, bytes liberados)
+    """
+    almacen = AlmacenChunks(os.path.join(directorio, DIRECTORIO_CHUNKS))
+    return almacen.recolectar(chunks_referenciados(directorio), gracia_horas)
+
+
+def planear_restauracion(archivo, directorio=BACKUP_DIR):
+    """
+    Cadena de archivos a aplicar para restaurar `archivo`: su respaldo
+    completo seguido de cada incremental hasta él, en orden
+
+    Raises:
+        ValueError: Si falta algún respaldo de la cadena
+    """
+    cadena = []
+    actual = archivo
+    while actual:
+        ruta = os.path.join(directorio, actual)
+        if not os.path.exists(ruta):
+            raise ValueError(f"Falta el respaldo '{actual}' de la cadena de '{archivo}'")
+        if actual in cadena:
+            raise ValueError(f"Cadena de respaldos circular en '{actual}'")
+        cadena.append(actual)
+        manifest = leer_manifest(ruta) or {}
+        if manifest.get("tipo", TIPO_COMPLETO) != TIPO_INCREMENTAL:
+            break
+        actual = manifest.get("base")
+    return list(reversed(cadena))
+
+
+def restaurar_cadena(archivo, database=None, directorio=BACKUP_DIR, colecciones=None, dry_run=False,
+                     progreso=None, batch_size=BACKUP_BATCH_SIZE):
+    """
+    Restaura `archivo` componiendo el completo (que reemplaza las colecciones)
+    con sus incrementales (upserts encima)
+
+    Returns:
+        tuple: (plan, resumen acumulado)
+    """
+    plan = planear_restauracion(archivo, directorio)
+    total = {"colecciones": {}, "documentos": 0, "invalidos": 0, "errores": [],
+             "dry_run": dry_run, "coleccion": None, "segundos": 0.0, "archivo": None}
+    base = dict(total["colecciones"])
+
+    def acumular(resumen):
+        for col_name, n in resumen["colecciones"].items():
+            total["colecciones"][col_name] = base.get(col_name, 0) + n
+        total["documentos"] = sum(total["colecciones"].values())
+        total["coleccion"] = resumen["coleccion"]
+        if progreso:
+            progreso(total)
+
+    for i, nombre in enumerate(plan):
+        total["archivo"] = nombre
+        base = dict(total["colecciones"])
+        resumen = restaurar_respaldo(os.path.join(directorio, nombre), database, reemplazar=(i == 0),
+                                     colecciones=colecciones, dry_run=dry_run, progreso=acumular,
+                                     batch_size=batch_size)
+        acumular(resumen)
+        total["invalidos"] += resumen["invalidos"]
+        total["errores"].extend(resumen["errores"][:MAX_ERRORES_VALIDACION - len(total["errores"])])
+        total["segundos"] += resumen["segundos"]
+    return plan, total
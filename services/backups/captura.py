@@ -0,0 +1,534 @@
+"""
+Captura de Cambios y Recuperación a un Momento - Restaurante Callejón 9
+=====================================================================
+Registra cada cambio de la base en segmentos BSON comprimidos para poder
+restaurar a cualquier momento: el respaldo más cercano anterior y, encima,
+los cambios capturados desde el respaldo completo de su cadena hasta el
+momento pedido (los incrementales no registran borrados).
+
+Fuentes:
+    - "stream":  change streams de la base (requiere replica set); captura
+                 inserciones, modificaciones (documento completo), borrados
+                 y colecciones eliminadas. Se reanuda con el resume token.
+    - "polling": servidores standalone; cada CAPTURA_POLL_SEGUNDOS consulta
+                 lo insertado (_id) o modificado (updated_at) después de la
+                 marca de agua de cada colección, menos el margen de
+                 BACKUP_WATERMARK_OVERLAP_SECONDS. No ve los borrados.
+    - "auto":    stream si el servidor lo soporta, si no polling. Una vez
+                 que la captura quedó en polling no se vuelve a intentar el
+                 stream (cambiar de fuente reinicia la cobertura).
+
+Segmentos: <CAPTURA_DIR>/cambios_<inicio>.bson.gz, nombrados por el primer
+cambio que contienen. Cada escritura agrega un miembro gzip con registros
+BSON consecutivos. El token o las marcas se guardan después de escribir,
+junto con el tamaño válido del segmento: si un lote quedó a medias, la
+siguiente ejecución recorta el segmento a ese tamaño y lo vuelve a capturar.
+Se abre un segmento nuevo cada CAPTURA_SEGMENTO_MB o CAPTURA_SEGMENTO_HORAS.
+
+    {"ts": datetime, "op": "u", "col": "usuarios", "doc": {...}}   <- alta o cambio
+    {"ts": datetime, "op": "d", "col": "usuarios", "id": ...}      <- borrado
+    {"ts": datetime, "op": "drop", "col": "usuarios"}              <- colección eliminada
+
+La reproducción es idempotente (reemplazo por _id y borrado), así que
+aplicar un cambio dos veces o uno ya incluido en el respaldo no altera
+el resultado.
+
+captura.json guarda desde cuándo la captura es continua: si el token se
+pierde (oplog rotado) la cobertura se reinicia y los respaldos anteriores
+ya no sirven de base para recuperar a un momento posterior.
+"""
+
+import os
+import json
+import gzip
+import zlib
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from bson import BSON, ObjectId, decode_all
+from bson.errors import InvalidBSON
+from pymongo import ReplaceOne, DeleteOne
+from pymongo.errors import OperationFailure
+
+from services.backups.backups import (
+    BACKUP_DIR, BACKUP_BATCH_SIZE, COLECCIONES_INTERNAS, marca_agua, filtro_incremental, leer_manifest,
+    planear_restauracion, restaurar_cadena
+)
+
+# Configuración
+CAPTURA_DIR = os.path.join(BACKUP_DIR, "cambios")
+CAPTURA_MODO = os.getenv("CAPTURA_MODO", "auto")
+CAPTURA_POLL_SEGUNDOS = int(os.getenv("CAPTURA_POLL_SEGUNDOS", "10"))
+CAPTURA_LOTE = int(os.getenv("CAPTURA_LOTE", "500"))
+CAPTURA_SEGMENTO_MB = int(os.getenv("CAPTURA_SEGMENTO_MB", "64"))
+CAPTURA_SEGMENTO_HORAS = int(os.getenv("CAPTURA_SEGMENTO_HORAS", "1"))
+CAPTURA_GZIP_LEVEL = int(os.getenv("CAPTURA_GZIP_LEVEL", "6"))
+
+# Colecciones internas que no se capturan (las mismas que no se respaldan ni se restauran)
+COLECCIONES_EXCLUIDAS = COLECCIONES_INTERNAS
+
+PREFIJO_SEGMENTO = "cambios_"
+EXTENSION_SEGMENTO = ".bson.gz"
+COBERTURA = "captura.json"
+FORMATO_FECHA = "%Y%m%dT%H%M%S%f"
+
+OP_CAMBIO = "u"
+OP_BORRADO = "d"
+OP_DROP = "drop"
+
+# Códigos de OperationFailure: sin replica set / token fuera del oplog
+_SIN_CHANGE_STREAMS = (40573, 40324)
+_HISTORIAL_PERDIDO = (286, 280)
+
+
+def _utc(fecha):
+    """datetime naive en UTC (como el resto de fechas guardadas)"""
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+# ==========================================
+# SEGMENTOS
+# ==========================================
+
+def _inicio_segmento(nombre):
+    return datetime.strptime(nombre[len(PREFIJO_SEGMENTO):-len(EXTENSION_SEGMENTO)], FORMATO_FECHA)
+
+
+def listar_segmentos(directorio=CAPTURA_DIR):
+    """
+    Returns:
+        list: [(inicio, ruta)] ordenados por el primer cambio que contienen
+    """
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(
+        (_inicio_segmento(nombre), os.path.join(directorio, nombre))
+        for nombre in os.listdir(directorio)
+        if nombre.startswith(PREFIJO_SEGMENTO) and nombre.endswith(EXTENSION_SEGMENTO)
+    )
+
+
+def escribir_segmento(registros, directorio=CAPTURA_DIR, ahora=None):
+    """
+    Agrega registros (ordenados por ts) al segmento vigente o a uno nuevo
+
+    Returns:
+        tuple: (ruta del segmento, bytes comprimidos escritos)
+    """
+    if not registros:
+        return None, 0
+    registros = sorted(registros, key=lambda r: r["ts"])
+    os.makedirs(directorio, exist_ok=True)
+
+    segmentos = listar_segmentos(directorio)
+    ahora = ahora or datetime.utcnow()
+    ruta = None
+    if segmentos:
+        inicio, ultima = segmentos[-1]
+        vencido = (ahora - inicio).total_seconds() >= CAPTURA_SEGMENTO_HORAS * 3600
+        if not vencido and os.path.getsize(ultima) < CAPTURA_SEGMENTO_MB * 1024 * 1024:
+            ruta = ultima
+    if ruta is None:
+        inicio = registros[0]["ts"]
+        # Los nombres crecen siempre: el orden por nombre es el orden de escritura
+        if segmentos and inicio <= segmentos[-1][0]:
+            inicio = segmentos[-1][0] + timedelta(microseconds=1)
+        ruta = os.path.join(directorio, f"{PREFIJO_SEGMENTO}{inicio.strftime(FORMATO_FECHA)}{EXTENSION_SEGMENTO}")
+
+    datos = gzip.compress(b"".join(BSON.encode(r) for r in registros), compresslevel=CAPTURA_GZIP_LEVEL, mtime=0)
+    with open(ruta, "ab") as f:
+        f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    return ruta, len(datos)
+
+
+def leer_segmento(ruta, bloque=1024 * 1024):
+    """
+    Registros de un segmento en orden de escritura
+
+    Se descomprime miembro por miembro: si el último quedó cortado por una
+    caída, los lotes anteriores se leen igual.
+    """
+    with open(ruta, "rb") as f:
+        descompresor, miembro, pendiente = zlib.decompressobj(31), [], b""
+        while True:
+            datos = pendiente or f.read(bloque)
+            pendiente = b""
+            if not datos:
+                break
+            try:
+                miembro.append(descompresor.decompress(datos))
+                if not descompresor.eof:
+                    continue
+                registros = decode_all(b"".join(miembro))
+            except (zlib.error, InvalidBSON) as e:
+                logging.warning(f"Segmento {os.path.basename(ruta)} dañado, se leyó hasta el último lote válido: {e}")
+                return
+            yield from registros
+            pendiente = descompresor.unused_data
+            descompresor, miembro = zlib.decompressobj(31), []
+        if miembro:
+            logging.warning(f"Segmento {os.path.basename(ruta)} truncado: se omite el último lote")
+
+
+def leer_cambios(desde, hasta, directorio=CAPTURA_DIR, colecciones=None):
+    """
+    Cambios con desde <= ts <= hasta, en el orden en que se capturaron
+
+    Se omiten los segmentos que terminan antes de `desde` (el siguiente
+    empieza antes) y se detiene en el primero que empieza después de `hasta`.
+    """
+    segmentos = listar_segmentos(directorio)
+    for i, (inicio, ruta) in enumerate(segmentos):
+        if inicio > hasta:
+            break
+        if i + 1 < len(segmentos) and segmentos[i + 1][0] < desde:
+            continue
+        for registro in leer_segmento(ruta):
+            if desde <= registro["ts"] <= hasta and (colecciones is None or registro["col"] in colecciones):
+                yield registro
+
+
+def purgar_segmentos(antes_de, directorio=CAPTURA_DIR):
+    """
+    Elimina los segmentos cuyos cambios son todos anteriores a `antes_de`
+    (el respaldo más antiguo que se conserva): ya no hay base sobre la cual
+    reproducirlos
+
+    Returns:
+        int: Segmentos eliminados
+    """
+    segmentos = listar_segmentos(directorio)
+    eliminados = 0
+    for (_, ruta), (siguiente, _) in zip(segmentos, segmentos[1:]):
+        if siguiente > antes_de:
+            break
+        os.remove(ruta)
+        eliminados += 1
+    return eliminados
+
+
+def leer_cobertura(directorio=CAPTURA_DIR):
+    """Estado de captura.json: {"iniciada": datetime, "modo": ...} o None"""
+    ruta = os.path.join(directorio, COBERTURA)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        cobertura = json.load(f)
+    cobertura["iniciada"] = datetime.fromisoformat(cobertura["iniciada"])
+    return cobertura
+
+
+def _escribir_cobertura(directorio, iniciada, modo):
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, COBERTURA)
+    with open(ruta + ".part", "w", encoding="utf-8") as f:
+        json.dump({"iniciada": iniciada.isoformat(), "modo": modo}, f)
+    os.replace(ruta + ".part", ruta)
+
+
+# ==========================================
+# CAPTURA
+# ==========================================
+
+class CapturaCambios:
+    """
+    Captura los cambios de una base durante una ventana de tiempo
+
+    Pensada para correr como tarea del planificador (una ejecución por
+    minuto con concesión exclusiva): cada ejecución continúa donde terminó
+    la anterior gracias al estado guardado en captura_estado.
+    """
+
+    def __init__(self, database=None, directorio=CAPTURA_DIR, modo=CAPTURA_MODO):
+        if database is None:
+            from config.db import db as database
+        self.database = database
+        self.directorio = directorio
+        self.modo = modo
+        self.estado_col = database["captura_estado"]
+
+    def _estado(self):
+        return self.estado_col.find_one({"_id": "captura"}) or {}
+
+    def _guardar_estado(self, **cambios):
+        self.estado_col.update_one({"_id": "captura"}, {"$set": cambios}, upsert=True)
+
+    def _escribir(self, lote):
+        ruta, escritos = escribir_segmento(lote, self.directorio)
+        if ruta:
+            self.segmento = {"segmento": os.path.basename(ruta), "segmento_bytes": os.path.getsize(ruta)}
+        return escritos
+
+    def _reparar(self, estado):
+        """Recorta el último segmento al tamaño registrado con el último token o marcas guardados"""
+        if not estado.get("segmento"):
+            return
+        ruta = os.path.join(self.directorio, estado["segmento"])
+        if os.path.exists(ruta) and os.path.getsize(ruta) > estado["segmento_bytes"]:
+            logging.warning(f"Segmento {estado['segmento']} con un lote incompleto: se recorta")
+            with open(ruta, "r+b") as f:
+                f.truncate(estado["segmento_bytes"])
+
+    def _reiniciar_cobertura(self, modo):
+        """Desde ahora la captura es continua (primer arranque o continuidad perdida)"""
+        ahora = datetime.utcnow()
+        _escribir_cobertura(self.directorio, ahora, modo)
+        logging.info(f"Captura de cambios ({modo}) continua desde {ahora.isoformat()}")
+        return ahora
+
+    def _colecciones(self):
+        return [c for c in self.database.list_collection_names() if c not in COLECCIONES_EXCLUIDAS]
+
+    def ejecutar(self, duracion=50):
+        """
+        Captura durante `duracion` segundos
+
+        Returns:
+            dict: modo, registros, bytes
+        """
+        self.segmento = {}
+        estado = self._estado()
+        self._reparar(estado)
+        # En auto, una captura que ya corre por polling sigue así: intentar el
+        # stream en cada ejecución no aporta nada en un standalone
+        if self.modo == "auto" and estado.get("modo") == "polling" and leer_cobertura(self.directorio):
+            self.modo = "polling"
+        if self.modo in ("auto", "stream"):
+            try:
+                return self._stream(duracion)
+            except OperationFailure as e:
+                if self.modo == "stream" or e.code not in _SIN_CHANGE_STREAMS:
+                    raise
+                logging.info("Change streams no disponibles (standalone): captura por polling")
+                self.modo = "polling"
+        return self._polling(duracion)
+
+    # --- Change streams ---
+
+    @staticmethod
+    def _registro(cambio):
+        tipo = cambio["operationType"]
+        ts = cambio.get("wallTime") or cambio["clusterTime"].as_datetime()
+        col = cambio.get("ns", {}).get("coll")
+        if tipo in ("insert", "update", "replace"):
+            # Sin fullDocument el documento ya se borró: su borrado viene después
+            if cambio.get("fullDocument") is None:
+                return None
+            return {"ts": _utc(ts), "op": OP_CAMBIO, "col": col, "doc": cambio["fullDocument"]}
+        if tipo == "delete":
+            return {"ts": _utc(ts), "op": OP_BORRADO, "col": col, "id": cambio["documentKey"]["_id"]}
+        if tipo in ("drop", "rename"):
+            return {"ts": _utc(ts), "op": OP_DROP, "col": col}
+        return None
+
+    def _stream(self, duracion):
+        estado = self._estado()
+        token = estado.get("token") if estado.get("modo") == "stream" else None
+        if leer_cobertura(self.directorio) is None:
+            token = None
+
+        pipeline = [{"$match": {"ns.coll": {"$nin": list(COLECCIONES_EXCLUIDAS)}}}]
+        resumen = {"modo": "stream", "registros": 0, "bytes": 0}
+        fin = time.monotonic() + duracion
+        try:
+            stream = self.database.watch(pipeline, full_document="updateLookup", resume_after=token,
+                                         max_await_time_ms=1000)
+        except OperationFailure as e:
+            if e.code not in _HISTORIAL_PERDIDO:
+                raise
+            logging.warning("El token de la captura ya no está en el oplog: se reinicia la cobertura")
+            token = None
+            stream = self.database.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000)
+        # La cobertura se reinicia solo con el stream ya abierto: si watch() falla
+        # (standalone) la cobertura vigente del polling no se toca
+        if token is None:
+            self._reiniciar_cobertura("stream")
+
+        with stream:
+            lote = []
+
+            def volcar():
+                resumen["bytes"] += self._escribir(lote)
+                resumen["registros"] += len(lote)
+                lote.clear()
+                # El token se guarda después de escribir: ante una caída se repite, no se pierde
+                self._guardar_estado(modo="stream", token=stream.resume_token, actualizado=datetime.utcnow(),
+                                     **self.segmento)
+
+            while stream.alive and time.monotonic() < fin:
+                cambio = stream.try_next()
+                if cambio is None:
+                    if lote:
+                        volcar()
+                    continue
+                if cambio["operationType"] == "invalidate":
+                    break
+                registro = self._registro(cambio)
+                if registro:
+                    lote.append(registro)
+                if len(lote) >= CAPTURA_LOTE:
+                    volcar()
+            volcar()
+        return resumen
+
+    # --- Polling ---
+
+    def _polling(self, duracion):
+        estado = self._estado()
+        if estado.get("modo") != "polling" or leer_cobertura(self.directorio) is None:
+            marcas = {}
+            self._reiniciar_cobertura("polling")
+        else:
+            # Las marcas se guardan como Extended JSON en texto (claves "$oid", "$date")
+            marcas = json.loads(estado.get("marcas") or "{}")
+
+        resumen = {"modo": "polling", "registros": 0, "bytes": 0}
+        fin = time.monotonic() + duracion
+        # filtro_incremental relee el margen de la marca en cada consulta: lo ya
+        # escrito en esta ejecución y sin cambios desde entonces no se repite
+        vistos = {}
+        while True:
+            lote = []
+            vigentes = {}
+            for col_name in self._colecciones():
+                coleccion = self.database[col_name]
+                # Marca tomada antes de leer: lo que cambie mientras tanto se vuelve a leer después
+                nueva = marca_agua(coleccion)
+                if col_name in marcas:
+                    for doc in coleccion.find(filtro_incremental(marcas[col_name])).batch_size(BACKUP_BATCH_SIZE):
+                        clave = (col_name, str(doc.get("_id")))
+                        vigentes[clave] = doc.get("updated_at")
+                        if clave in vistos and vistos[clave] == vigentes[clave]:
+                            continue
+                        lote.append({"ts": self._ts_documento(doc), "op": OP_CAMBIO, "col": col_name, "doc": doc})
+                # Colección nueva: su contenido actual lo cubre el próximo respaldo
+                marcas[col_name] = nueva or marcas.get(col_name)
+
+            resumen["bytes"] += self._escribir(lote)
+            resumen["registros"] += len(lote)
+            vistos = vigentes
+            self._guardar_estado(modo="polling", marcas=json.dumps(marcas), actualizado=datetime.utcnow(),
+                                 **self.segmento)
+
+            if time.monotonic() + CAPTURA_POLL_SEGUNDOS > fin:
+                return resumen
+            time.sleep(CAPTURA_POLL_SEGUNDOS)
+
+    @staticmethod
+    def _ts_documento(doc):
+        if isinstance(doc.get("updated_at"), datetime):
+            return _utc(doc["updated_at"])
+        if isinstance(doc.get("_id"), ObjectId):
+            return _utc(doc["_id"].generation_time)
+        return datetime.utcnow()
+
+
+# ==========================================
+# REPRODUCCIÓN
+# ==========================================
+
+def reproducir_cambios(desde, hasta, database=None, directorio=CAPTURA_DIR, colecciones=None, dry_run=False,
+                       progreso=None, batch_size=BACKUP_BATCH_SIZE):
+    """
+    Aplica los cambios capturados entre `desde` y `hasta` con bulk_write
+    ordenado por colección (el orden entre colecciones no importa)
+
+    Returns:
+        dict: registros, colecciones {nombre: operaciones}, borrados, ultimo, dry_run, segundos
+    """
+    if database is None:
+        from config.db import db as database
+
+    resumen = {"registros": 0, "colecciones": {}, "borrados": 0, "ultimo": None,
+               "dry_run": dry_run, "segundos": 0.0}
+    pendientes = {}
+    inicio = time.perf_counter()
+
+    def volcar(col_name):
+        operaciones = pendientes.pop(col_name, [])
+        if operaciones and not dry_run:
+            database[col_name].bulk_write(operaciones, ordered=True)
+
+    for registro in leer_cambios(desde, hasta, directorio, colecciones):
+        col_name = registro["col"]
+        if registro["op"] == OP_DROP:
+            volcar(col_name)
+            if not dry_run:
+                database[col_name].drop()
+        else:
+            if registro["op"] == OP_BORRADO:
+                operacion = DeleteOne({"_id": registro["id"]})
+                resumen["borrados"] += 1
+            else:
+                operacion = ReplaceOne({"_id": registro["doc"]["_id"]}, registro["doc"], upsert=True)
+            pendientes.setdefault(col_name, []).append(operacion)
+            if len(pendientes[col_name]) >= batch_size:
+                volcar(col_name)
+
+        resumen["registros"] += 1
+        resumen["colecciones"][col_name] = resumen["colecciones"].get(col_name, 0) + 1
+        resumen["ultimo"] = registro["ts"]
+        if progreso and resumen["registros"] % batch_size == 0:
+            resumen["segundos"] = time.perf_counter() - inicio
+            progreso(resumen)
+
+    for col_name in list(pendientes):
+        volcar(col_name)
+    resumen["segundos"] = time.perf_counter() - inicio
+    return resumen
+
+
+def restaurar_a_momento(hasta, archivo, database=None, directorio=BACKUP_DIR, directorio_cambios=CAPTURA_DIR,
+                        colecciones=None, dry_run=False, progreso=None, batch_size=BACKUP_BATCH_SIZE):
+    """
+    Restaura la base como estaba en `hasta` (UTC): la cadena de `archivo`
+    (el respaldo más reciente anterior a `hasta`) y encima los cambios
+    capturados desde la creación del respaldo completo de esa cadena
+
+    Sin `colecciones` se restauran y reproducen solo las colecciones del
+    respaldo: reproducir cambios sobre una colección que no se restauró la
+    dejaría con los datos actuales más una parte de su historial.
+
+    Raises:
+        ValueError: Si el respaldo es posterior a `hasta`, se generó con
+                    filtro, no incluye alguna de las colecciones pedidas o
+                    la captura no cubre sin huecos desde el respaldo completo
+
+    Returns:
+        tuple: (plan, resumen del respaldo, resumen de los cambios)
+    """
+    manifest = leer_manifest(os.path.join(directorio, archivo)) or {}
+    if not manifest.get("creado"):
+        raise ValueError(f"El respaldo '{archivo}' no tiene fecha de creación en su manifest")
+    if datetime.fromisoformat(manifest["creado"]) > hasta:
+        raise ValueError(f"El respaldo '{archivo}' es posterior al momento pedido")
+    if manifest.get("filtro") not in (None, "{}"):
+        raise ValueError(f"El respaldo '{archivo}' se generó con un filtro: no tiene el estado completo de sus colecciones")
+
+    # Los incrementales no registran borrados: los cambios se reproducen desde el
+    # respaldo completo de la cadena (reproducir de más es idempotente)
+    completo = planear_restauracion(archivo, directorio)[0]
+    manifest_completo = leer_manifest(os.path.join(directorio, completo)) or {}
+    if not manifest_completo.get("creado"):
+        raise ValueError(f"El respaldo '{completo}' no tiene fecha de creación en su manifest")
+    desde = datetime.fromisoformat(manifest_completo["creado"])
+    # BSON guarda los ts en milisegundos: un cambio del mismo milisegundo no debe quedar fuera
+    desde = desde.replace(microsecond=desde.microsecond // 1000 * 1000)
+
+    faltantes = [c for c in colecciones or [] if c not in manifest.get("colecciones", {})]
+    if faltantes:
+        raise ValueError(f"El respaldo '{archivo}' no incluye: {', '.join(faltantes)}")
+    colecciones = list(colecciones or manifest.get("colecciones", {}))
+
+    cobertura = leer_cobertura(directorio_cambios)
+    if cobertura is None or cobertura["iniciada"] > desde:
+        raise ValueError(f"La captura de cambios no cubre desde la creación de '{completo}' ({desde.isoformat()})")
+
+    plan, total = restaurar_cadena(archivo, database, directorio, colecciones, dry_run, progreso, batch_size)
+    cambios = reproducir_cambios(desde, hasta, database, directorio_cambios, set(colecciones), dry_run,
+                                 batch_size=batch_size)
+    return plan, total, cambios
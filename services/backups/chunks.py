@@ -0,0 +1,196 @@
+"""
+Almacén de chunks direccionado por contenido
+============================================
+Los respaldos "cas" no guardan la exportación completa: cada colección se
+parte en chunks definidos por su contenido, cada chunk se identifica por su
+BLAKE2b y se guarda una sola vez en <directorio>/chunks/ab/abcdef....gz.
+El respaldo queda como un manifest con la lista de chunks por colección, así
+una colección que no cambió entre dos noches no ocupa espacio nuevo.
+
+Corte por contenido: los límites caen siempre al final de un documento
+(una línea de Extended JSON) y se eligen con el hash de esa línea, no con
+su posición. Insertar o modificar un documento solo cambia el chunk que lo
+contiene; los siguientes vuelven a cortarse en los mismos documentos y se
+reutilizan. La probabilidad de corte es proporcional al tamaño de la línea,
+por lo que el tamaño medio del chunk es BACKUP_CHUNK_KB sin importar el
+tamaño de los documentos (mínimo 1/4 y máximo 4 veces ese valor).
+
+Recolección: recolectar() elimina los chunks que ningún manifest vigente
+referencia. Los chunks escritos o reutilizados hace menos de
+BACKUP_CHUNK_GC_GRACE_HOURS no se tocan, para no borrar los de un respaldo
+en curso cuyo manifest aún no existe. Cada chunk se aparta (renombrado a
+.gc) antes de borrarlo y su fecha se comprueba de nuevo, así un respaldo
+que lo reutiliza en ese momento no pierde el chunk.
+"""
+
+import os
+import gzip
+import time
+import uuid
+import hashlib
+import logging
+
+# Configuración
+BACKUP_CHUNK_KB = int(os.getenv("BACKUP_CHUNK_KB", "128"))
+BACKUP_CHUNK_GC_GRACE_HOURS = float(os.getenv("BACKUP_CHUNK_GC_GRACE_HOURS", "24"))
+
+EXTENSIONES = {"gzip": ".gz", "zstd": ".zst"}
+SUFIJO_RECOLECCION = ".gc"
+
+
+def _blake2b(datos, digest_size=32):
+    return hashlib.blake2b(datos, digest_size=digest_size)
+
+
+def trocear(lineas, promedio=BACKUP_CHUNK_KB * 1024):
+    """
+    Agrupa líneas (bytes) en chunks con límites definidos por contenido
+
+    Yields:
+        bytes: Contenido de cada chunk (líneas completas)
+    """
+    minimo, maximo = promedio // 4, promedio * 4
+    # Una línea de n bytes cierra el chunk con probabilidad n / promedio
+    umbral = (1 << 64) // promedio
+    partes, tamano = [], 0
+    for linea in lineas:
+        partes.append(linea)
+        tamano += len(linea)
+        if tamano >= maximo or (
+            tamano >= minimo
+            and int.from_bytes(_blake2b(linea, 8).digest(), "big") < len(linea) * umbral
+        ):
+            yield b"".join(partes)
+            partes, tamano = [], 0
+    if partes:
+        yield b"".join(partes)
+
+
+class AlmacenChunks:
+    """Chunks comprimidos en disco, uno por hash BLAKE2b de su contenido"""
+
+    def __init__(self, directorio, codec="gzip", nivel=6):
+        self.directorio = directorio
+        self.codec = codec
+        self.nivel = nivel
+
+    def _ruta(self, clave, codec):
+        return os.path.join(self.directorio, clave[:2], clave + EXTENSIONES[codec])
+
+    def _existente(self, clave):
+        for codec in EXTENSIONES:
+            ruta = self._ruta(clave, codec)
+            if os.path.exists(ruta):
+                return ruta
+        return None
+
+    def _comprimir(self, datos):
+        if self.codec == "zstd":
+            import zstandard
+            return zstandard.ZstdCompressor(level=self.nivel).compress(datos)
+        return gzip.compress(datos, compresslevel=self.nivel, mtime=0)
+
+    def guardar(self, datos):
+        """
+        Guarda un chunk si no existe
+
+        Returns:
+            tuple: (clave, bytes escritos en disco; 0 si ya existía)
+        """
+        clave = _blake2b(datos).hexdigest()
+        existente = self._existente(clave)
+        if existente:
+            # Renueva la fecha para que la recolección no lo borre mientras se referencia
+            try:
+                os.utime(existente)
+                return clave, 0
+            except FileNotFoundError:
+                pass  # Lo eliminó una recolección concurrente: se vuelve a escribir
+
+        ruta = self._ruta(clave, self.codec)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        comprimido = self._comprimir(datos)
+        temporal = f"{ruta}.{uuid.uuid4().hex[:8]}.part"
+        with open(temporal, "wb") as f:
+            f.write(comprimido)
+        os.replace(temporal, ruta)
+        return clave, len(comprimido)
+
+    def leer(self, clave):
+        """
+        Contenido sin comprimir de un chunk, verificado contra su clave
+
+        Raises:
+            ValueError: Si el chunk no existe o su contenido no corresponde al hash
+        """
+        ruta = self._existente(clave)
+        if ruta is None:
+            raise ValueError(f"Falta el chunk {clave}")
+        with open(ruta, "rb") as f:
+            comprimido = f.read()
+        if ruta.endswith(EXTENSIONES["zstd"]):
+            import zstandard
+            datos = zstandard.ZstdDecompressor().decompress(comprimido)
+        else:
+            datos = gzip.decompress(comprimido)
+        if _blake2b(datos).hexdigest() != clave:
+            raise ValueError(f"Chunk {clave} corrupto")
+        return datos
+
+    def _archivos(self):
+        if not os.path.isdir(self.directorio):
+            return
+        for prefijo in os.listdir(self.directorio):
+            carpeta = os.path.join(self.directorio, prefijo)
+            if os.path.isdir(carpeta):
+                for nombre in os.listdir(carpeta):
+                    yield os.path.join(carpeta, nombre), nombre.split(".", 1)[0]
+
+    def uso(self):
+        """
+        Returns:
+            tuple: (chunks, bytes en disco)
+        """
+        chunks = total = 0
+        for ruta, _ in self._archivos():
+            chunks += 1
+            total += os.path.getsize(ruta)
+        return chunks, total
+
+    def recolectar(self, referenciados, gracia_horas=BACKUP_CHUNK_GC_GRACE_HOURS):
+        """
+        Elimina los chunks que no están en `referenciados` y no se usaron
+        durante el periodo de gracia
+
+        Returns:
+            tuple: (chunks eliminados, bytes liberados)
+        """
+        limite = time.time() - gracia_horas * 3600
+        eliminados = liberados = 0
+        for ruta, clave in list(self._archivos()):
+            # Los .gc huérfanos de una recolección interrumpida se recogen aunque el chunk siga vigente
+            if clave in referenciados and not ruta.endswith(SUFIJO_RECOLECCION):
+                continue
+            try:
+                # Los .part huérfanos de una escritura interrumpida también se recogen
+                if os.stat(ruta).st_mtime >= limite:
+                    continue
+                # Un respaldo concurrente puede reutilizar el chunk (os.utime) entre el
+                # stat y el borrado: se aparta primero, así guardar() ya no lo encuentra
+                # y lo reescribe, y la fecha se vuelve a leer una vez apartado
+                apartado = ruta
+                if not ruta.endswith(SUFIJO_RECOLECCION):
+                    apartado = f"{ruta}.{uuid.uuid4().hex[:8]}{SUFIJO_RECOLECCION}"
+                    os.replace(ruta, apartado)
+                estado = os.stat(apartado)
+                if estado.st_mtime >= limite:
+                    os.replace(apartado, ruta)
+                    continue
+                os.remove(apartado)
+                eliminados += 1
+                liberados += estado.st_size
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"No se pudo eliminar el chunk {ruta}: {e}")
+        return eliminados, liberados
@@ -0,0 +1,234 @@
+"""
+Métricas de Latencia y MongoDB - Restaurante Callejón 9
+========================================================
+    - Histograma de latencia por ruta (endpoint + método)
+    - Comandos Mongo por petición (detecta N+1) vía pymongo CommandListener,
+      correlacionados con el request_id de Flask
+    - Muestras de consultas lentas (> METRICS_SLOW_QUERY_MS)
+
+Se exponen en formato de texto Prometheus (ver routes: /metrics, solo admin).
+
+METRICS_SAMPLE_RATE (0..1) decide qué peticiones se instrumentan. Con 0 el
+listener no se registra en el MongoClient y los hooks de Flask no se
+instalan, así que el costo es nulo.
+"""
+
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque, defaultdict
+from flask import g, request
+from pymongo import monitoring
+
+# Configuración
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+METRICS_SLOW_QUERY_MS = float(os.getenv("METRICS_SLOW_QUERY_MS", "100"))
+METRICS_SLOW_SAMPLES = int(os.getenv("METRICS_SLOW_SAMPLES", "50"))
+
+# Buckets de latencia en segundos
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets de comandos Mongo por petición
+COMMAND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# Estado de la petición instrumentada actual (None si no se muestrea)
+_peticion_actual = contextvars.ContextVar("metrics_peticion", default=None)
+
+
+class Histograma:
+    """Histograma acumulativo estilo Prometheus"""
+
+    __slots__ = ("buckets", "conteos", "suma", "total")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+        self.suma += valor
+        self.total += 1
+
+    def lineas(self, nombre, etiquetas):
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {self.total}'
+        yield f"{nombre}_sum{{{etiquetas}}} {self.suma:.6f}"
+        yield f"{nombre}_count{{{etiquetas}}} {self.total}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+class MetricsRegistry:
+    """Almacén en memoria de las métricas del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(lambda: Histograma(LATENCY_BUCKETS))
+        self.comandos_por_peticion = defaultdict(lambda: Histograma(COMMAND_BUCKETS))
+        self.comandos = defaultdict(lambda: [0, 0.0, 0])  # (cmd, col) -> [total, segundos, fallos]
+        self.lentas = deque(maxlen=METRICS_SLOW_SAMPLES)
+
+    def registrar_peticion(self, endpoint, metodo, segundos, comandos):
+        with self._lock:
+            self.latencias[(endpoint, metodo)].observar(segundos)
+            self.comandos_por_peticion[endpoint].observar(comandos)
+
+    def registrar_comando(self, comando, coleccion, segundos, fallo=False):
+        with self._lock:
+            datos = self.comandos[(comando, coleccion)]
+            datos[0] += 1
+            datos[1] += segundos
+            if fallo:
+                datos[2] += 1
+
+    def registrar_lenta(self, muestra):
+        with self._lock:
+            self.lentas.append(muestra)
+
+    def prometheus(self, extras=None):
+        """Serializa las métricas en formato de texto Prometheus"""
+        lineas = []
+        with self._lock:
+            lineas += [
+                "# HELP callejon9_http_request_duration_seconds Latencia de peticiones por ruta",
+                "# TYPE callejon9_http_request_duration_seconds histogram"
+            ]
+            for (endpoint, metodo), hist in sorted(self.latencias.items()):
+                etiquetas = f'endpoint="{_escapar(endpoint)}",method="{metodo}"'
+                lineas += hist.lineas("callejon9_http_request_duration_seconds", etiquetas)
+
+            lineas += [
+                "# HELP callejon9_mongo_commands_per_request Comandos Mongo ejecutados por petición",
+                "# TYPE callejon9_mongo_commands_per_request histogram"
+            ]
+            for endpoint, hist in sorted(self.comandos_por_peticion.items()):
+                lineas += hist.lineas("callejon9_mongo_commands_per_request", f'endpoint="{_escapar(endpoint)}"')
+
+            lineas += [
+                "# HELP callejon9_mongo_commands_total Comandos Mongo por comando y colección",
+                "# TYPE callejon9_mongo_commands_total counter"
+            ]
+            for (comando, coleccion), (total, _, _) in sorted(self.comandos.items()):
+                lineas.append(f'callejon9_mongo_commands_total{{command="{comando}",collection="{_escapar(coleccion)}"}} {total}')
+
+            lineas += [
+                "# HELP callejon9_mongo_command_seconds_total Tiempo acumulado en comandos Mongo",
+                "# TYPE callejon9_mongo_command_seconds_total counter"
+            ]
+            for (comando, coleccion), (_, segundos, _) in sorted(self.comandos.items()):
+                lineas.append(f'callejon9_mongo_command_seconds_total{{command="{comando}",collection="{_escapar(coleccion)}"}} {segundos:.6f}')
+
+            lineas += [
+                "# HELP callejon9_mongo_command_failures_total Comandos Mongo fallidos",
+                "# TYPE callejon9_mongo_command_failures_total counter"
+            ]
+            for (comando, coleccion), (_, _, fallos) in sorted(self.comandos.items()):
+                lineas.append(f'callejon9_mongo_command_failures_total{{command="{comando}",collection="{_escapar(coleccion)}"}} {fallos}')
+
+            lineas += [
+                "# HELP callejon9_mongo_slow_query_seconds Muestras recientes de consultas lentas",
+                "# TYPE callejon9_mongo_slow_query_seconds gauge"
+            ]
+            for m in self.lentas:
+                etiquetas = ",".join(f'{k}="{_escapar(m[k])}"' for k in ("request_id", "endpoint", "command", "collection"))
+                lineas.append(f"callejon9_mongo_slow_query_seconds{{{etiquetas}}} {m['segundos']:.6f}")
+
+        for nombre, (tipo, ayuda, valores) in (extras or {}).items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for etiquetas, valor in valores:
+                lineas.append(f"{nombre}{{{etiquetas}}} {valor}" if etiquetas else f"{nombre} {valor}")
+
+        return "\n".join(lineas) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Cuenta y cronometra los comandos Mongo de la petición instrumentada"""
+
+    def started(self, event):
+        estado = _peticion_actual.get()
+        if estado is None:
+            return
+        coleccion = event.command.get(event.command_name)
+        estado["pendientes"][event.request_id] = coleccion if isinstance(coleccion, str) else ""
+
+    def _terminar(self, event, fallo):
+        estado = _peticion_actual.get()
+        if estado is None:
+            return
+        coleccion = estado["pendientes"].pop(event.request_id, "")
+        segundos = event.duration_micros / 1e6
+        estado["comandos"] += 1
+        registry.registrar_comando(event.command_name, coleccion, segundos, fallo)
+
+        if segundos * 1000 >= METRICS_SLOW_QUERY_MS:
+            registry.registrar_lenta({
+                "request_id": estado["request_id"],
+                "endpoint": estado["endpoint"],
+                "command": event.command_name,
+                "collection": coleccion,
+                "segundos": segundos
+            })
+
+    def succeeded(self, event):
+        self._terminar(event, False)
+
+    def failed(self, event):
+        self._terminar(event, True)
+
+
+def event_listeners():
+    """Listeners para MongoClient(event_listeners=...); vacío si está desactivado"""
+    return [MongoCommandMetrics()] if METRICS_SAMPLE_RATE > 0 else []
+
+
+class RequestMetrics:
+    """Hooks de Flask que abren y cierran la medición de cada petición"""
+
+    def __init__(self, app=None, sample_rate=METRICS_SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.sample_rate <= 0:
+            return
+        app.before_request(self._antes)
+        app.teardown_request(self._despues)
+
+    def _antes(self):
+        if request.path.startswith("/static") or random.random() >= self.sample_rate:
+            return
+        g.metrics_token = _peticion_actual.set({
+            "request_id": g.get("request_id", ""),
+            "endpoint": request.endpoint or "sin_ruta",
+            "inicio": time.perf_counter(),
+            "comandos": 0,
+            "pendientes": {}
+        })
+
+    def _despues(self, exc=None):
+        token = g.pop("metrics_token", None)
+        if token is None:
+            return
+        estado = _peticion_actual.get()
+        _peticion_actual.reset(token)
+        registry.registrar_peticion(
+            estado["endpoint"],
+            request.method,
+            time.perf_counter() - estado["inicio"],
+            estado["comandos"]
+        )
@@ -0,0 +1,134 @@
+"""
+Logging Estructurado de Peticiones - Restaurante Callejón 9
+============================================================
+Reemplaza los print() de app.before_request por una línea JSON por petición
+con método, ruta, estado, duración y usuario.
+
+    - La escritura a stdout la hace un QueueListener en su propio hilo; el
+      hilo de la petición solo encola el registro (QueueHandler).
+    - REQUEST_LOG_SAMPLE_RATE (0..1) controla qué fracción de peticiones se
+      registra; errores 5xx y peticiones lentas se registran siempre.
+    - REQUEST_LOG_LEVELS asigna nivel por prefijo de ruta, p. ej.
+      "/api/notificaciones=DEBUG,/admin=INFO". Rutas con nivel menor a
+      REQUEST_LOG_LEVEL no se registran.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request, session
+
+# Configuración
+REQUEST_LOG_LEVEL = os.getenv("REQUEST_LOG_LEVEL", "INFO")
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", "1.0"))
+REQUEST_LOG_SLOW_MS = float(os.getenv("REQUEST_LOG_SLOW_MS", "1000"))
+REQUEST_LOG_LEVELS = os.getenv("REQUEST_LOG_LEVELS", "")
+
+logger = logging.getLogger("callejon9.requests")
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        data.update(getattr(record, "campos", {}))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _parse_niveles(config):
+    """Convierte "prefijo=NIVEL,..." en [(prefijo, nivel)] ordenado del más largo al más corto"""
+    niveles = []
+    for item in config.split(","):
+        if "=" not in item:
+            continue
+        prefijo, nivel = item.split("=", 1)
+        niveles.append((prefijo.strip(), logging.getLevelName(nivel.strip().upper())))
+    return sorted(niveles, key=lambda x: len(x[0]), reverse=True)
+
+
+class RequestLogger:
+    """Middleware de logging estructurado y muestreado para Flask"""
+
+    def __init__(self, app=None, sample_rate=REQUEST_LOG_SAMPLE_RATE,
+                 slow_ms=REQUEST_LOG_SLOW_MS, niveles=REQUEST_LOG_LEVELS, stream=None):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.niveles = _parse_niveles(niveles)
+        self.listener = None
+        self.stream = stream or sys.stdout
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Configura el logger asíncrono y registra los hooks de la app"""
+        if not logger.handlers:
+            cola = queue.SimpleQueue()
+            salida = logging.StreamHandler(self.stream)
+            salida.setFormatter(JsonFormatter())
+            self.listener = QueueListener(cola, salida, respect_handler_level=False)
+            self.listener.start()
+            atexit.register(self.listener.stop)
+
+            logger.addHandler(QueueHandler(cola))
+            logger.setLevel(REQUEST_LOG_LEVEL)
+            logger.propagate = False
+
+        app.before_request(self._antes)
+        app.after_request(self._despues)
+
+    def nivel_ruta(self, path):
+        """Nivel configurado para la ruta (el prefijo más largo gana)"""
+        for prefijo, nivel in self.niveles:
+            if path.startswith(prefijo):
+                return nivel
+        return logging.INFO
+
+    def _antes(self):
+        g.request_start = time.perf_counter()
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+
+    def _despues(self, response):
+        inicio = g.get("request_start")
+        if inicio is None or request.path.startswith("/static"):
+            return response
+
+        response.headers["X-Request-ID"] = g.request_id
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        if response.status_code >= 500:
+            nivel = logging.ERROR
+        elif duracion_ms >= self.slow_ms:
+            nivel = logging.WARNING
+        else:
+            nivel = self.nivel_ruta(request.path)
+            if not logger.isEnabledFor(nivel) or random.random() >= self.sample_rate:
+                return response
+
+        logger.log(nivel, "request", extra={"campos": {
+            "request_id": g.request_id,
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+            "duracion_ms": round(duracion_ms, 2),
+            "usuario_id": session.get("usuario_id"),
+            "rol": session.get("usuario_rol"),
+            "ip": request.remote_addr
+        }})
+        return response
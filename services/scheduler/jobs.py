@@ -0,0 +1,107 @@
+"""
+Tareas periódicas del sistema
+=============================
+Se registran en el planificador al crearlo (get_scheduler). Los imports
+de controladores y modelos van dentro de cada tarea para no cargar Flask
+ni conexiones extra al importar este módulo desde el proceso dedicado.
+"""
+
+import os
+
+JOB_RESPALDO = "respaldo_automatico"
+JOB_RETENCION = "retencion_respaldos"
+JOB_ALERTAS = "alertas_stock"
+JOB_ESTADISTICAS = "estadisticas_diarias"
+JOB_CAPTURA = "captura_cambios"
+JOB_VERIFICACION = "verificacion_respaldos"
+
+CRON_ALERTAS = os.getenv("SCHEDULER_CRON_ALERTAS", "*/15 * * * *")
+CRON_ESTADISTICAS = os.getenv("SCHEDULER_CRON_ESTADISTICAS", "15 0 * * *")
+CRON_RETENCION = os.getenv("SCHEDULER_CRON_RETENCION", "30 3 * * *")
+CRON_VERIFICACION = os.getenv("SCHEDULER_CRON_VERIFICACION", "*/30 * * * *")
+CAPTURA_CAMBIOS = os.getenv("CAPTURA_CAMBIOS", "1") == "1"
+CAPTURA_VENTANA_SEGUNDOS = int(os.getenv("CAPTURA_VENTANA_SEGUNDOS", "50"))
+
+
+def cron_respaldo(frequency="daily", hour="02:00"):
+    """Traduce la configuración de auto_backup (frecuencia y hora HH:MM) a cron"""
+    hora, minuto = (int(x) for x in hour.split(":"))
+    if frequency == "weekly":
+        return f"{minuto} {hora} * * 1"
+    if frequency == "monthly":
+        return f"{minuto} {hora} 1 * *"
+    return f"{minuto} {hora} * * *"
+
+
+def respaldo_automatico():
+    from controllers.admin.BackupController import BackupController
+    stats = BackupController._ejecutar_respaldo_automatico()
+    return f"{stats['archivo']}: {stats['documentos']} documentos"
+
+
+def retencion_respaldos():
+    from controllers.admin.BackupController import BackupController
+    return f"{BackupController._limpiar_respaldos_antiguos()} archivos eliminados"
+
+
+def verificacion_respaldos():
+    from controllers.admin.BackupController import BackupController
+    verificados, fallidos = BackupController._verificar_pendientes()
+    return f"{verificados} respaldos verificados, {fallidos} con errores"
+
+
+def alertas_stock():
+    from models.inventario_model import AlertaStock
+    return f"{len(AlertaStock.generar_alertas_automaticas())} alertas nuevas"
+
+
+def estadisticas_diarias():
+    from models.reports_model import ReportsModel
+    return f"{ReportsModel.consolidar_estadisticas_diarias()} días consolidados"
+
+
+def captura_cambios():
+    from services.backups.captura import CapturaCambios
+    resumen = CapturaCambios().ejecutar(CAPTURA_VENTANA_SEGUNDOS)
+    return f"{resumen['registros']} cambios ({resumen['modo']})"
+
+
+def registrar_jobs(scheduler):
+    """Registra las tareas del sistema; el respaldo toma su horario de la configuración"""
+    from config.db import db
+    config = db.configuracion.find_one({"tipo": "auto_backup"}) or {}
+
+    scheduler.registrar(
+        JOB_RESPALDO,
+        cron_respaldo(config.get("frequency", "daily"), config.get("hour", "02:00")),
+        respaldo_automatico,
+        lease_segundos=1800,
+        habilitado=bool(config.get("enabled")),
+        descripcion="Respaldo automático (incremental sobre la cadena vigente)"
+    )
+    scheduler.registrar(
+        JOB_RETENCION, CRON_RETENCION, retencion_respaldos,
+        descripcion="Elimina las cadenas de respaldos automáticos vencidas"
+    )
+    # Además del horario, cada respaldo nuevo la adelanta al siguiente tick (ejecutar_ahora)
+    scheduler.registrar(
+        JOB_VERIFICACION, CRON_VERIFICACION, verificacion_respaldos,
+        lease_segundos=1800, catch_up=False,
+        descripcion="Verifica checksums y documentos de los respaldos nuevos contra su manifest"
+    )
+    # Una ejecución perdida de alertas no se recupera: la siguiente la cubre
+    scheduler.registrar(
+        JOB_ALERTAS, CRON_ALERTAS, alertas_stock, catch_up=False,
+        descripcion="Genera alertas de stock crítico"
+    )
+    scheduler.registrar(
+        JOB_ESTADISTICAS, CRON_ESTADISTICAS, estadisticas_diarias,
+        descripcion="Consolida las ventas de los días cerrados en estadisticas_diarias"
+    )
+    # Cada minuto continúa la captura donde la dejó la ejecución anterior (token o marcas en Mongo)
+    scheduler.registrar(
+        JOB_CAPTURA, "* * * * *", captura_cambios,
+        lease_segundos=CAPTURA_VENTANA_SEGUNDOS + 60,
+        habilitado=CAPTURA_CAMBIOS,
+        descripcion="Captura de cambios para recuperación a un momento"
+    )
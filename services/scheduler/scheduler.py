@@ -0,0 +1,335 @@
+"""
+Planificador de Tareas - Restaurante Callejón 9
+===============================================
+Ejecuta tareas periódicas (respaldos, alertas, consolidaciones, retención)
+con horarios tipo cron y una concesión (lease) en Mongo por tarea, de modo
+que aunque varios procesos corran el planificador (un hilo por worker de
+gunicorn o el proceso dedicado run_scheduler_command) cada ejecución la
+realiza exactamente uno.
+
+Colecciones:
+    - scheduler_jobs:      un documento por tarea (_id = nombre) con cron,
+                           habilitado, next_run (UTC) y la concesión vigente
+    - scheduler_historial: una entrada por ejecución con duración, estado
+                           y resultado; expira a los SCHEDULER_HISTORY_DAYS
+
+Ejecuciones perdidas: si el servidor estuvo apagado y next_run quedó en el
+pasado, la tarea corre una sola vez al volver (las ejecuciones perdidas se
+agrupan) y se reprograma desde ahora. Con catch_up=False se omite y se
+registra como "omitida".
+
+Los cron se evalúan en SCHEDULER_TZ (hora local del restaurante).
+"""
+
+import os
+import uuid
+import socket
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from pymongo import ReturnDocument, DESCENDING
+
+# Configuración
+SCHEDULER_TICK_SECONDS = int(os.getenv("SCHEDULER_TICK_SECONDS", "30"))
+SCHEDULER_TZ = os.getenv("SCHEDULER_TZ", "America/Mexico_City")
+SCHEDULER_HISTORY_DAYS = int(os.getenv("SCHEDULER_HISTORY_DAYS", "90"))
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "600"))
+
+ESTADO_OK = "ok"
+ESTADO_ERROR = "error"
+ESTADO_OMITIDA = "omitida"
+
+
+class Cron:
+    """
+    Expresión cron de 5 campos: minuto hora día-del-mes mes día-de-la-semana
+
+    Admite *, listas (1,15), rangos (1-5), pasos (*/15, 0-30/10) y domingo
+    como 0 o 7. Si día del mes y día de la semana están restringidos, basta
+    con que coincida uno de los dos (semántica de cron clásico).
+    """
+
+    CAMPOS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expresion):
+        partes = expresion.split()
+        if len(partes) != 5:
+            raise ValueError(f"Expresión cron inválida (se esperan 5 campos): {expresion!r}")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = (
+            self._campo(parte, minimo, maximo) for parte, (minimo, maximo) in zip(partes, self.CAMPOS)
+        )
+        # Domingo también puede escribirse como 7
+        self.dias_semana = frozenset(d % 7 for d in dias_semana)
+        self.dia_restringido = partes[2] != "*"
+        self.semana_restringida = partes[4] != "*"
+
+    @staticmethod
+    def _campo(parte, minimo, maximo):
+        valores = set()
+        for item in parte.split(","):
+            rango, _, paso = item.partition("/")
+            paso = int(paso) if paso else 1
+            if rango == "*":
+                inicio, fin = minimo, maximo
+            elif "-" in rango:
+                inicio, fin = (int(x) for x in rango.split("-"))
+            else:
+                inicio = fin = int(rango)
+            if inicio < minimo or fin > maximo or inicio > fin or paso < 1:
+                raise ValueError(f"Campo cron fuera de rango: {parte!r}")
+            valores.update(range(inicio, fin + 1, paso))
+        return frozenset(valores)
+
+    def _coincide_dia(self, fecha):
+        dia = fecha.day in self.dias
+        # isoweekday: lunes=1 ... domingo=7 -> domingo=0
+        semana = fecha.isoweekday() % 7 in self.dias_semana
+        if self.dia_restringido and self.semana_restringida:
+            return dia or semana
+        return dia and semana
+
+    def siguiente(self, desde):
+        """Primer minuto estrictamente posterior a `desde` (datetime local sin tzinfo)"""
+        actual = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = actual + timedelta(days=366 * 5)
+        while actual < limite:
+            if actual.month not in self.meses:
+                anio, mes = (actual.year + 1, 1) if actual.month == 12 else (actual.year, actual.month + 1)
+                actual = datetime(anio, mes, 1)
+                continue
+            if not self._coincide_dia(actual):
+                actual = datetime(actual.year, actual.month, actual.day) + timedelta(days=1)
+                continue
+            if actual.hour not in self.horas:
+                actual = actual.replace(minute=0) + timedelta(hours=1)
+                continue
+            if actual.minute not in self.minutos:
+                actual += timedelta(minutes=1)
+                continue
+            return actual
+        raise ValueError(f"La expresión cron {self.expresion!r} no tiene próximas ejecuciones")
+
+
+class Job:
+    """Tarea registrada en el planificador"""
+
+    def __init__(self, nombre, cron, funcion, lease_segundos=SCHEDULER_LEASE_SECONDS,
+                 catch_up=True, habilitado=True, descripcion=""):
+        self.nombre = nombre
+        self.cron = cron
+        self.funcion = funcion
+        self.lease_segundos = lease_segundos
+        self.catch_up = catch_up
+        self.habilitado = habilitado
+        self.descripcion = descripcion
+
+
+class Scheduler:
+    """Planificador con concesiones en Mongo e historial de ejecuciones"""
+
+    def __init__(self, database=None, tick_segundos=SCHEDULER_TICK_SECONDS, zona=SCHEDULER_TZ):
+        if database is None:
+            from config.db import db as database
+        self.jobs_col = database["scheduler_jobs"]
+        self.historial_col = database["scheduler_historial"]
+        self.tick_segundos = tick_segundos
+        self.zona = pytz.timezone(zona)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.jobs = {}
+        self._detener = threading.Event()
+        self._hilo = None
+        self._indices_creados = False
+
+    # ==========================================
+    # PROGRAMACIÓN
+    # ==========================================
+
+    def _asegurar_indices(self):
+        if self._indices_creados:
+            return
+        self.historial_col.create_index([("job", 1), ("inicio", DESCENDING)])
+        self.historial_col.create_index("inicio", expireAfterSeconds=SCHEDULER_HISTORY_DAYS * 86400)
+        self._indices_creados = True
+
+    def proxima_ejecucion(self, cron, desde_utc=None):
+        """Próxima ejecución en UTC (naive, como el resto de fechas guardadas)"""
+        desde_utc = desde_utc or datetime.utcnow()
+        local = pytz.utc.localize(desde_utc).astimezone(self.zona).replace(tzinfo=None)
+        siguiente = Cron(cron).siguiente(local)
+        return self.zona.localize(siguiente).astimezone(pytz.utc).replace(tzinfo=None)
+
+    def registrar(self, nombre, cron, funcion, **opciones):
+        """
+        Registra una tarea. El cron y habilitado del código solo son valores
+        iniciales: si la tarea ya existe en scheduler_jobs se conservan los
+        guardados (p. ej. el horario de respaldos configurado por el admin).
+        """
+        Cron(cron)  # Valida la expresión al registrar
+        job = Job(nombre, cron, funcion, **opciones)
+        self.jobs[nombre] = job
+        self._asegurar_indices()
+        self.jobs_col.update_one({"_id": nombre}, {
+            "$setOnInsert": {
+                "cron": cron,
+                "habilitado": job.habilitado,
+                "next_run": self.proxima_ejecucion(cron),
+                "lease_owner": None,
+                "lease_until": None
+            },
+            "$set": {"descripcion": job.descripcion}
+        }, upsert=True)
+        return job
+
+    def programar(self, nombre, cron=None, habilitado=None):
+        """Cambia el horario o activa/desactiva una tarea y recalcula next_run"""
+        cambios = {}
+        if cron is not None:
+            cambios["cron"] = cron
+            cambios["next_run"] = self.proxima_ejecucion(cron)
+        if habilitado is not None:
+            cambios["habilitado"] = habilitado
+        if cambios:
+            self.jobs_col.update_one({"_id": nombre}, {"$set": cambios}, upsert=True)
+
+    def ejecutar_ahora(self, nombre):
+        """Adelanta la próxima ejecución de una tarea al siguiente tick"""
+        self.jobs_col.update_one({"_id": nombre}, {"$set": {"next_run": datetime.utcnow()}})
+
+    # ==========================================
+    # EJECUCIÓN
+    # ==========================================
+
+    def _tomar(self, job, ahora):
+        """Intenta tomar la concesión de una tarea vencida; devuelve el documento previo o None"""
+        return self.jobs_col.find_one_and_update(
+            {
+                "_id": job.nombre,
+                "habilitado": True,
+                "next_run": {"$lte": ahora},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": ahora}}]
+            },
+            {"$set": {"lease_owner": self.owner, "lease_until": ahora + timedelta(seconds=job.lease_segundos)}},
+            return_document=ReturnDocument.BEFORE
+        )
+
+    def _renovar(self, job, terminado):
+        """Extiende la concesión mientras la tarea sigue corriendo"""
+        intervalo = max(job.lease_segundos / 3, 1)
+        while not terminado.wait(intervalo):
+            self.jobs_col.update_one(
+                {"_id": job.nombre, "lease_owner": self.owner},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=job.lease_segundos)}}
+            )
+
+    def _liberar(self, job, doc, estado, inicio, duracion_ms):
+        self.jobs_col.update_one({"_id": job.nombre, "lease_owner": self.owner}, {"$set": {
+            "lease_owner": None,
+            "lease_until": None,
+            "next_run": self.proxima_ejecucion(doc.get("cron", job.cron), max(datetime.utcnow(), inicio)),
+            "last_run": inicio,
+            "last_status": estado,
+            "last_duration_ms": duracion_ms
+        }})
+
+    def _ejecutar(self, job, doc, ahora):
+        programado = doc.get("next_run") or ahora
+        atraso = (ahora - programado).total_seconds()
+        registro = {
+            "job": job.nombre,
+            "owner": self.owner,
+            "programado": programado,
+            "atraso_segundos": round(atraso, 1),
+            "inicio": ahora
+        }
+
+        # Una ejecución perdida (más de dos ticks de atraso) sin catch_up se omite
+        if not job.catch_up and atraso > 2 * self.tick_segundos:
+            registro.update(estado=ESTADO_OMITIDA, fin=ahora, duracion_ms=0)
+            self.historial_col.insert_one(registro)
+            self._liberar(job, doc, ESTADO_OMITIDA, ahora, 0)
+            return registro
+
+        terminado = threading.Event()
+        threading.Thread(target=self._renovar, args=(job, terminado), daemon=True).start()
+        inicio = time.perf_counter()
+        try:
+            resultado = job.funcion()
+            registro.update(estado=ESTADO_OK, resultado=str(resultado)[:500] if resultado is not None else None)
+        except Exception as e:
+            logging.exception(f"Tarea {job.nombre} falló")
+            registro.update(estado=ESTADO_ERROR, error=str(e)[:500])
+        finally:
+            terminado.set()
+
+        duracion_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        registro.update(fin=datetime.utcnow(), duracion_ms=duracion_ms)
+        self.historial_col.insert_one(registro)
+        self._liberar(job, doc, registro["estado"], ahora, duracion_ms)
+        logging.info(f"Tarea {job.nombre}: {registro['estado']} en {duracion_ms:.0f} ms")
+        return registro
+
+    def ejecutar_pendientes(self, ahora=None):
+        """
+        Ejecuta las tareas vencidas cuya concesión se obtenga
+
+        Returns:
+            list: Registros de historial de las ejecuciones hechas por este proceso
+        """
+        ejecutadas = []
+        for job in list(self.jobs.values()):
+            ahora_job = ahora or datetime.utcnow()
+            doc = self._tomar(job, ahora_job)
+            if doc is not None:
+                ejecutadas.append(self._ejecutar(job, doc, ahora_job))
+        return ejecutadas
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            try:
+                self.ejecutar_pendientes()
+            except Exception as e:
+                logging.error(f"Error en el planificador: {e}")
+            self._detener.wait(self.tick_segundos)
+
+    def iniciar(self):
+        """Inicia el bucle en un hilo daemon (una vez por proceso)"""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="scheduler")
+            self._hilo.start()
+            logging.info(f"Planificador iniciado ({self.owner}, {len(self.jobs)} tareas)")
+
+    def detener(self):
+        self._detener.set()
+
+    # ==========================================
+    # CONSULTA
+    # ==========================================
+
+    def estado(self, historial=10):
+        """Tareas con su programación y sus últimas ejecuciones"""
+        tareas = []
+        for doc in self.jobs_col.find().sort("_id", 1):
+            doc["historial"] = list(self.historial_col.find({"job": doc["_id"]}, {"_id": 0})
+                                    .sort("inicio", DESCENDING).limit(historial))
+            tareas.append(doc)
+        return tareas
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Planificador compartido del proceso con las tareas del sistema registradas"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from services.scheduler.jobs import registrar_jobs
+            _scheduler = Scheduler()
+            registrar_jobs(_scheduler)
+    return _scheduler
@@ -0,0 +1,127 @@
+"""
+Almacén de Códigos Temporales 2FA
+=================================
+Guarda los códigos SMS/Email de TwoFactorService fuera del proceso para que
+sean visibles desde cualquier worker y sobrevivan a un reinicio.
+
+Backends:
+    - "mongo": colección "codigos_2fa" con índice TTL sobre "expira"
+    - "memory": diccionario en proceso con barrido periódico de vencidos
+
+Cada código lleva un contador de intentos; verificar consume un intento de
+forma atómica y al llegar a MAX_INTENTOS el código deja de ser válido.
+"""
+
+import os
+import threading
+import logging
+from datetime import datetime
+from pymongo import ReturnDocument
+
+# Configuración
+TWO_FACTOR_STORE = os.getenv("TWO_FACTOR_STORE", "mongo")
+MAX_INTENTOS = int(os.getenv("TWO_FACTOR_MAX_INTENTOS", "5"))
+SWEEP_SECONDS = int(os.getenv("TWO_FACTOR_SWEEP_SECONDS", "60"))
+
+
+class CodigoStore:
+    """Interfaz de almacenamiento de códigos temporales por usuario"""
+
+    def guardar(self, user_id, codigo, expira):
+        """Guarda (o reemplaza) el código del usuario y reinicia sus intentos"""
+        raise NotImplementedError
+
+    def consumir_intento(self, user_id, max_intentos=MAX_INTENTOS):
+        """
+        Suma un intento al código vigente del usuario
+
+        Returns:
+            dict | None: {"codigo", "expira", "intentos"} si el código sigue
+            vigente y no superó max_intentos; None en otro caso
+        """
+        raise NotImplementedError
+
+    def eliminar(self, user_id):
+        """Elimina el código del usuario"""
+        raise NotImplementedError
+
+
+class MongoCodigoStore(CodigoStore):
+    """Códigos en MongoDB; el índice TTL elimina los vencidos"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index("expira", expireAfterSeconds=0)
+
+    def guardar(self, user_id, codigo, expira):
+        self.collection.replace_one(
+            {"_id": str(user_id)},
+            {"codigo": codigo, "expira": expira, "intentos": 0},
+            upsert=True
+        )
+
+    def consumir_intento(self, user_id, max_intentos=MAX_INTENTOS):
+        return self.collection.find_one_and_update(
+            {
+                "_id": str(user_id),
+                "expira": {"$gt": datetime.utcnow()},
+                "intentos": {"$lt": max_intentos}
+            },
+            {"$inc": {"intentos": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def eliminar(self, user_id):
+        self.collection.delete_one({"_id": str(user_id)})
+
+
+class MemoryCodigoStore(CodigoStore):
+    """Códigos en memoria del proceso con barrido de vencidos en segundo plano"""
+
+    def __init__(self, sweep_seconds=SWEEP_SECONDS):
+        self._codigos = {}
+        self._lock = threading.Lock()
+        self._sweep_seconds = sweep_seconds
+        self._sweeper = threading.Thread(target=self._barrer, daemon=True, name="2fa-sweeper")
+        self._sweeper.start()
+
+    def _barrer(self):
+        evento = threading.Event()
+        while not evento.wait(self._sweep_seconds):
+            self.limpiar_vencidos()
+
+    def limpiar_vencidos(self):
+        """Elimina los códigos vencidos. Retorna cuántos se eliminaron."""
+        ahora = datetime.utcnow()
+        with self._lock:
+            vencidos = [uid for uid, datos in self._codigos.items() if datos["expira"] <= ahora]
+            for uid in vencidos:
+                del self._codigos[uid]
+        if vencidos:
+            logging.info(f"2FA: {len(vencidos)} códigos vencidos eliminados")
+        return len(vencidos)
+
+    def guardar(self, user_id, codigo, expira):
+        with self._lock:
+            self._codigos[str(user_id)] = {"codigo": codigo, "expira": expira, "intentos": 0}
+
+    def consumir_intento(self, user_id, max_intentos=MAX_INTENTOS):
+        with self._lock:
+            datos = self._codigos.get(str(user_id))
+            if not datos or datos["expira"] <= datetime.utcnow() or datos["intentos"] >= max_intentos:
+                return None
+            datos["intentos"] += 1
+            return dict(datos)
+
+    def eliminar(self, user_id):
+        with self._lock:
+            self._codigos.pop(str(user_id), None)
+
+
+def crear_codigo_store(backend=TWO_FACTOR_STORE):
+    """Construye el almacén de códigos según TWO_FACTOR_STORE"""
+    if backend == "memory":
+        return MemoryCodigoStore()
+
+    from config.db import db
+    return MongoCodigoStore(db["codigos_2fa"])
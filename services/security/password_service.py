@@ -1,14 +1,102 @@
+import os
 import bcrypt
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+
+class PasswordServiceBusy(RuntimeError):
+    """Se lanza cuando la cola del pool de hasheo está llena."""
+
 
 class PasswordService:
     """
     Servicio encargado del hasheo y verificación de contraseñas.
     Utiliza bcrypt para una seguridad robusta.
+
+    Las operaciones bcrypt se ejecutan en un pool de hilos acotado (bcrypt
+    libera el GIL) para que una ráfaga de logins no acapare los hilos de
+    petición. Si hay más operaciones en espera que PASSWORD_POOL_MAX_QUEUE
+    se rechazan con PasswordServiceBusy en lugar de encolarse sin límite.
     """
-    
+
     # Costo recomendado para bcrypt. Ajustar si el hardware es muy limitado.
-    BCRYPT_ROUNDS = 12 
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+    # Hilos del pool y operaciones máximas en espera
+    POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "4"))
+    POOL_MAX_QUEUE = int(os.getenv("PASSWORD_POOL_MAX_QUEUE", "32"))
+
+    # Segundos máximos esperando un lugar en la cola
+    POOL_ACQUIRE_TIMEOUT = float(os.getenv("PASSWORD_POOL_ACQUIRE_TIMEOUT", "2"))
+
+    _executor = None
+    _slots = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, rounds: Optional[int] = None, workers: Optional[int] = None,
+                  max_queue: Optional[int] = None) -> None:
+        """
+        Ajusta el costo y el tamaño del pool en caliente.
+
+        Args:
+            rounds: Nuevo costo bcrypt (los hashes viejos se rehashean en el login).
+            workers: Número de hilos del pool.
+            max_queue: Operaciones máximas en espera.
+        """
+        with cls._lock:
+            if rounds is not None:
+                cls.BCRYPT_ROUNDS = rounds
+            if workers is not None:
+                cls.POOL_WORKERS = workers
+            if max_queue is not None:
+                cls.POOL_MAX_QUEUE = max_queue
+
+            anterior = None
+            if workers is not None or max_queue is not None:
+                # El pool nuevo queda instalado antes de cerrar el anterior
+                anterior = cls._executor
+                cls._executor, cls._slots = cls._nuevo_pool()
+
+        # Sin esperar: las operaciones ya encoladas en el pool anterior terminan igual
+        if anterior is not None:
+            anterior.shutdown(wait=False)
+
+    @classmethod
+    def _nuevo_pool(cls):
+        """Crea el pool y el semáforo de la cola con la configuración actual."""
+        executor = ThreadPoolExecutor(
+            max_workers=cls.POOL_WORKERS,
+            thread_name_prefix="bcrypt"
+        )
+        return executor, threading.BoundedSemaphore(cls.POOL_WORKERS + cls.POOL_MAX_QUEUE)
+
+    @classmethod
+    def _run(cls, fn, *args):
+        """Ejecuta fn en el pool respetando el límite de la cola."""
+        for intento in range(2):
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor, cls._slots = cls._nuevo_pool()
+                executor, slots = cls._executor, cls._slots
+
+            if not slots.acquire(timeout=cls.POOL_ACQUIRE_TIMEOUT):
+                raise PasswordServiceBusy("Demasiadas operaciones de contraseña en espera.")
+
+            try:
+                future = executor.submit(fn, *args)
+            except RuntimeError:
+                slots.release()
+                # configure() cerró este pool entre la lectura y el submit: se usa el nuevo
+                if intento:
+                    raise
+                continue
+            except Exception:
+                slots.release()
+                raise
+            future.add_done_callback(lambda _: slots.release())
+            return future.result()
 
     @staticmethod
     def hash_password(password: str) -> str:
@@ -23,14 +111,14 @@ class PasswordService:
         """
         if not password:
             raise ValueError("La contraseña no puede estar vacía.")
-            
+
         # 1. Codificar la contraseña a bytes
         password_bytes = password.encode('utf-8')
-        
-        # 2. Generar el salt (sal) y hashear en una sola operación
+
+        # 2. Generar el salt (sal) y hashear en una sola operación (en el pool)
         salt = bcrypt.gensalt(rounds=PasswordService.BCRYPT_ROUNDS)
-        hashed_bytes = bcrypt.hashpw(password_bytes, salt)
-        
+        hashed_bytes = PasswordService._run(bcrypt.hashpw, password_bytes, salt)
+
         # 3. Decodificar a string para guardar en la base de datos (MongoDB)
         return hashed_bytes.decode('utf-8')
 
@@ -48,15 +136,58 @@ class PasswordService:
         """
         if not password or not hashed_password:
             return False
-            
+
         try:
             # bcrypt.checkpw trabaja con bytes, por lo que codificamos ambos
             password_bytes = password.encode('utf-8')
             hashed_bytes = hashed_password.encode('utf-8')
-            
-            return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+            return PasswordService._run(bcrypt.checkpw, password_bytes, hashed_bytes)
+        except PasswordServiceBusy:
+            raise
         except ValueError:
             # Esto puede ocurrir si el hash_password no tiene el formato bcrypt correcto
             return False
         except Exception:
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def get_rounds(hashed_password: str) -> Optional[int]:
+        """
+        Obtiene el costo con el que se generó un hash bcrypt ($2b$<costo>$...).
+
+        Returns:
+            int | None: El costo, o None si no es un hash bcrypt.
+        """
+        try:
+            partes = hashed_password.split('$')
+            if len(partes) < 4 or not partes[1].startswith('2'):
+                return None
+            return int(partes[2])
+        except (AttributeError, ValueError):
+            return None
+
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        """
+        Indica si un hash fue generado con un costo distinto al configurado.
+        """
+        rounds = PasswordService.get_rounds(hashed_password)
+        return rounds is not None and rounds != PasswordService.BCRYPT_ROUNDS
+
+    @staticmethod
+    def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verifica la contraseña y, si es válida pero el costo cambió, genera
+        un hash nuevo para guardarlo (rehash transparente en el login).
+
+        Returns:
+            tuple: (es_valida, hash_nuevo o None si no hay que actualizar)
+        """
+        if not PasswordService.verify_password(password, hashed_password):
+            return False, None
+
+        if PasswordService.needs_rehash(hashed_password):
+            return True, PasswordService.hash_password(password)
+
+        return True, None
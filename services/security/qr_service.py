@@ -0,0 +1,96 @@
+"""
+Servicio de Códigos QR
+======================
+Renderizado único de QR para el setup de 2FA.
+
+Formatos (QR_FORMAT):
+    - "png": imagen PIL (por defecto; data URL más pequeño)
+    - "svg": qrcode.image.svg, sin raster PIL (no requiere Pillow, escalable)
+
+Los resultados se guardan en una caché corta en memoria indexada por
+(provisioning URI, formato) para no regenerar el mismo QR en reintentos:
+el setup de 2FA reutiliza el secret pendiente de la sesión, así que un
+reintento produce la misma URI.
+"""
+
+import os
+import io
+import time
+import base64
+import threading
+from collections import OrderedDict
+
+import qrcode
+import qrcode.image.svg
+
+# Configuración
+QR_FORMAT = os.getenv("QR_FORMAT", "png")
+QR_CACHE_SECONDS = int(os.getenv("QR_CACHE_SECONDS", "300"))
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "256"))
+
+MIME_TYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png"
+}
+
+
+class QRService:
+    """Genera QR como data URL, con caché por URI"""
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _render(data, formato):
+        """Genera los bytes del QR en el formato pedido"""
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+            image_factory=qrcode.image.svg.SvgPathImage if formato == "svg" else None
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        img = qr.make_image(fill_color="black", back_color="white") if formato == "png" else qr.make_image()
+
+        buffer = io.BytesIO()
+        img.save(buffer)
+        return buffer.getvalue()
+
+    @staticmethod
+    def render_base64(data, formato=QR_FORMAT):
+        """
+        Devuelve el QR codificado en base64 (sin prefijo data:), usando la caché
+
+        Args:
+            data: Contenido del QR (p. ej. provisioning URI de TOTP)
+            formato: "png" o "svg"
+        """
+        if formato not in MIME_TYPES:
+            raise ValueError(f"Formato de QR no soportado: {formato}")
+
+        clave = (data, formato)
+        ahora = time.monotonic()
+
+        with QRService._lock:
+            item = QRService._cache.get(clave)
+            if item and ahora - item[1] < QR_CACHE_SECONDS:
+                QRService._cache.move_to_end(clave)
+                return item[0]
+
+        contenido = base64.b64encode(QRService._render(data, formato)).decode("utf-8")
+
+        with QRService._lock:
+            QRService._cache[clave] = (contenido, ahora)
+            QRService._cache.move_to_end(clave)
+            while len(QRService._cache) > QR_CACHE_SIZE:
+                QRService._cache.popitem(last=False)
+
+        return contenido
+
+    @staticmethod
+    def render_data_url(data, formato=QR_FORMAT):
+        """Devuelve el QR como data URL listo para <img src>"""
+        return f"data:{MIME_TYPES[formato]};base64,{QRService.render_base64(data, formato)}"
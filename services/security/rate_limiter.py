@@ -0,0 +1,201 @@
+"""
+Rate Limiting de Login
+======================
+Ventana deslizante de intentos fallidos por IP y por email (o usuario en 2FA).
+
+Se consulta ANTES de buscar al usuario o ejecutar bcrypt, de modo que una
+ráfaga de credential stuffing se rechaza sin tocar la base de datos de
+usuarios ni el pool de contraseñas.
+
+Backends (LOGIN_RATE_STORE):
+    - "memory": registro exacto de timestamps por clave (un solo worker)
+    - "mongo": contador de ventana deslizante aproximado (ventana actual +
+      anterior ponderada) en la colección "rate_limits" con índice TTL,
+      compartido entre workers
+"""
+
+import os
+import time
+import threading
+from collections import deque, defaultdict
+from datetime import datetime, timedelta
+
+# Configuración
+LOGIN_RATE_STORE = os.getenv("LOGIN_RATE_STORE", "mongo")
+LOGIN_MAX_FALLOS_EMAIL = int(os.getenv("LOGIN_MAX_FALLOS_EMAIL", "5"))
+LOGIN_VENTANA_EMAIL = int(os.getenv("LOGIN_VENTANA_EMAIL", "900"))
+LOGIN_MAX_FALLOS_IP = int(os.getenv("LOGIN_MAX_FALLOS_IP", "30"))
+LOGIN_VENTANA_IP = int(os.getenv("LOGIN_VENTANA_IP", "300"))
+
+
+class RateLimitStore:
+    """Interfaz de conteo de eventos en una ventana deslizante"""
+
+    def contar(self, clave, ventana):
+        """
+        Returns:
+            tuple: (eventos en la ventana, segundos hasta que salga el más antiguo)
+        """
+        raise NotImplementedError
+
+    def registrar(self, clave, ventana):
+        """Registra un evento para la clave"""
+        raise NotImplementedError
+
+    def limpiar(self, clave):
+        """Elimina el historial de la clave"""
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Ventana deslizante exacta en memoria del proceso"""
+
+    def __init__(self):
+        self._eventos = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def _podar(self, eventos, ahora, ventana):
+        while eventos and eventos[0] <= ahora - ventana:
+            eventos.popleft()
+
+    def contar(self, clave, ventana):
+        ahora = time.monotonic()
+        with self._lock:
+            eventos = self._eventos.get(clave)
+            if not eventos:
+                return 0, 0
+            self._podar(eventos, ahora, ventana)
+            if not eventos:
+                del self._eventos[clave]
+                return 0, 0
+            return len(eventos), max(0, int(eventos[0] + ventana - ahora) + 1)
+
+    def registrar(self, clave, ventana):
+        ahora = time.monotonic()
+        with self._lock:
+            eventos = self._eventos[clave]
+            self._podar(eventos, ahora, ventana)
+            eventos.append(ahora)
+
+    def limpiar(self, clave):
+        with self._lock:
+            self._eventos.pop(clave, None)
+
+
+class MongoRateLimitStore(RateLimitStore):
+    """
+    Ventana deslizante aproximada en MongoDB
+
+    Cada clave tiene un contador por ventana fija; el conteo deslizante es
+    actual + anterior * (fracción de la ventana anterior aún cubierta).
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.collection.create_index("expira", expireAfterSeconds=0)
+        self.collection.create_index("clave")
+
+    @staticmethod
+    def _ventana_actual(ventana):
+        ahora = time.time()
+        indice = int(ahora // ventana)
+        return indice, (ahora - indice * ventana) / ventana
+
+    def contar(self, clave, ventana):
+        indice, transcurrido = self._ventana_actual(ventana)
+        docs = {
+            d["_id"]: d.get("n", 0)
+            for d in self.collection.find(
+                {"_id": {"$in": [f"{clave}:{indice}", f"{clave}:{indice - 1}"]}}
+            )
+        }
+        actual = docs.get(f"{clave}:{indice}", 0)
+        anterior = docs.get(f"{clave}:{indice - 1}", 0)
+        total = actual + int(anterior * (1 - transcurrido))
+        return total, int(ventana * (1 - transcurrido)) + 1
+
+    def registrar(self, clave, ventana):
+        indice, _ = self._ventana_actual(ventana)
+        self.collection.update_one(
+            {"_id": f"{clave}:{indice}"},
+            {
+                "$inc": {"n": 1},
+                "$setOnInsert": {
+                    "clave": clave,
+                    "expira": datetime.utcnow() + timedelta(seconds=ventana * 2)
+                }
+            },
+            upsert=True
+        )
+
+    def limpiar(self, clave):
+        self.collection.delete_many({"clave": clave})
+
+
+class LoginRateLimiter:
+    """Límites de intentos fallidos de login por IP y por cuenta"""
+
+    def __init__(self, store,
+                 max_fallos_email=LOGIN_MAX_FALLOS_EMAIL, ventana_email=LOGIN_VENTANA_EMAIL,
+                 max_fallos_ip=LOGIN_MAX_FALLOS_IP, ventana_ip=LOGIN_VENTANA_IP):
+        self.store = store
+        self.limites = {
+            "ip": (max_fallos_ip, ventana_ip),
+            "email": (max_fallos_email, ventana_email)
+        }
+        self._bloqueados = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def verificar(self, ip=None, email=None):
+        """
+        Comprueba si la IP o la cuenta superaron su límite
+
+        Returns:
+            int: Segundos a esperar (0 si se permite el intento)
+        """
+        for tipo, valor in (("ip", ip), ("email", email)):
+            if not valor:
+                continue
+            maximo, ventana = self.limites[tipo]
+            fallos, espera = self.store.contar(f"{tipo}:{valor}", ventana)
+            if fallos >= maximo:
+                with self._lock:
+                    self._bloqueados[tipo] += 1
+                return max(espera, 1)
+        return 0
+
+    def registrar_fallo(self, ip=None, email=None):
+        """Suma un intento fallido a la IP y a la cuenta"""
+        for tipo, valor in (("ip", ip), ("email", email)):
+            if valor:
+                self.store.registrar(f"{tipo}:{valor}", self.limites[tipo][1])
+
+    def registrar_exito(self, email=None):
+        """Un login correcto reinicia el contador de la cuenta"""
+        if email:
+            self.store.limpiar(f"email:{email}")
+
+    def estadisticas(self):
+        """Intentos rechazados por tipo de límite desde el arranque del proceso"""
+        with self._lock:
+            return {
+                "bloqueados_ip": self._bloqueados["ip"],
+                "bloqueados_email": self._bloqueados["email"],
+                "bloqueados_total": sum(self._bloqueados.values())
+            }
+
+
+_limiter = None
+
+
+def get_login_limiter():
+    """Limiter compartido del proceso (se crea en el primer uso)"""
+    global _limiter
+    if _limiter is None:
+        if LOGIN_RATE_STORE == "memory":
+            store = MemoryRateLimitStore()
+        else:
+            from config.db import db
+            store = MongoRateLimitStore(db["rate_limits"])
+        _limiter = LoginRateLimiter(store)
+    return _limiter
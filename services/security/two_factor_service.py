@@ -10,12 +10,12 @@ Tipos de 2FA:
 """
 
 import pyotp
-import qrcode
-import io
-import base64
 import secrets
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from services.security.code_store import crear_codigo_store, MAX_INTENTOS
+from services.security.qr_service import QRService, QR_FORMAT
 
 logging.basicConfig(level=logging.INFO)
 
@@ -27,8 +27,9 @@ CODIGO_EXPIRATION_MINUTES = 5
 class TwoFactorService:
     """Servicio auxiliar para operaciones de 2FA"""
     
-    # Almacenamiento temporal de códigos (en producción usar Redis)
-    _codigos_temporales = {}
+    # Almacenamiento de códigos temporales (ver services/security/code_store.py)
+    _store = None
+    _store_lock = threading.Lock()
     
     @staticmethod
     def generar_secret():
@@ -36,7 +37,7 @@ class TwoFactorService:
         return pyotp.random_base32()
     
     @staticmethod
-    def generar_qr_code(secret, nombre_cuenta, emisor="Callejon 9"):
+    def generar_qr_code(secret, nombre_cuenta, emisor="Callejon 9", formato=QR_FORMAT):
         """
         Genera un código QR para escanear con la app autenticadora
         
@@ -44,6 +45,7 @@ class TwoFactorService:
             secret: Secreto TOTP
             nombre_cuenta: Email o nombre del usuario
             emisor: Nombre del servicio/empresa
+            formato: "png" o "svg" (por defecto QR_FORMAT)
             
         Returns:
             Data URL del código QR (base64)
@@ -54,25 +56,7 @@ class TwoFactorService:
             issuer_name=emisor
         )
         
-        # Generar código QR
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(totp_uri)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convertir a base64
-        buffer = io.BytesIO()
-        img.save(buffer)
-        buffer.seek(0)
-        
-        data_url = f"data:image/png;base64,{base64.b64encode(buffer.read()).decode()}"
-        return data_url
+        return QRService.render_data_url(totp_uri, formato)
     
     @staticmethod
     def verificar_totp(secret, codigo):
@@ -98,38 +82,47 @@ class TwoFactorService:
         """Genera un código numérico de 6 dígitos para SMS/Email"""
         return ''.join(str(secrets.randbelow(10)) for _ in range(CODIGO_2FA_LENGTH))
     
+    @staticmethod
+    def get_store():
+        """Almacén de códigos temporales (se crea en el primer uso, uno por proceso)"""
+        if TwoFactorService._store is None:
+            # Con hilos, dos primeros usos crearían dos almacenes en memoria distintos
+            with TwoFactorService._store_lock:
+                if TwoFactorService._store is None:
+                    TwoFactorService._store = crear_codigo_store()
+        return TwoFactorService._store
+    
     @staticmethod
     def guardar_codigo_temporal(user_id, codigo):
         """Guarda un código temporal para SMS/Email"""
-        TwoFactorService._codigos_temporales[user_id] = {
-            "codigo": codigo,
-            "expira": datetime.utcnow()
-        }
+        expira = datetime.utcnow() + timedelta(minutes=CODIGO_EXPIRATION_MINUTES)
+        TwoFactorService.get_store().guardar(user_id, codigo, expira)
     
     @staticmethod
     def verificar_codigo_temporal(user_id, codigo_ingresado):
         """
         Verifica un código temporal (SMS/Email)
         
+        Cada verificación consume un intento; tras MAX_INTENTOS fallidos el
+        código queda inválido aunque no haya expirado.
+        
         Returns:
             True si el código es válido y no ha expirado
         """
-        datos = TwoFactorService._codigos_temporales.get(user_id)
+        store = TwoFactorService.get_store()
+        datos = store.consumir_intento(user_id)
         if not datos:
             return False
         
         # Verificar código
-        if datos["codigo"] != codigo_ingresado:
-            return False
-        
-        # Verificar expiración (5 minutos)
-        tiempo_transcurrido = (datetime.utcnow() - datos["expira"]).total_seconds()
-        if tiempo_transcurrido > CODIGO_EXPIRATION_MINUTES * 60:
-            del TwoFactorService._codigos_temporales[user_id]
+        if not secrets.compare_digest(str(datos["codigo"]), str(codigo_ingresado)):
+            if datos["intentos"] >= MAX_INTENTOS:
+                logging.warning(f"2FA: intentos agotados para usuario {user_id}")
+                store.eliminar(user_id)
             return False
         
         # Limpiar código usado
-        del TwoFactorService._codigos_temporales[user_id]
+        store.eliminar(user_id)
         return True
     
     @staticmethod
@@ -0,0 +1,257 @@
+"""
+Almacén de Sesiones - Restaurante Callejón 9
+=============================================
+Reemplaza el backend filesystem de Flask-Session por un almacén compartido:
+
+    - MongoSessionStore: colección "sesiones" con índice TTL sobre "expira"
+      (Mongo elimina las sesiones vencidas, sin limpieza manual)
+    - MemorySessionStore: diccionario en proceso (desarrollo / un solo worker)
+    - LRUSessionCache: caché LRU en memoria delante de cualquier almacén
+
+La cookie solo lleva el id de sesión firmado; el contenido se serializa con
+msgpack y solo se escribe cuando la sesión cambia. Si no cambió, se
+reescribe como máximo una vez cada SESSION_TOUCH_SECONDS para renovar su
+expiración.
+"""
+
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import msgspec
+from bson.binary import Binary
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+
+# Configuración
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "2048"))
+SESSION_CACHE_SECONDS = float(os.getenv("SESSION_CACHE_SECONDS", "5"))
+SESSION_TOUCH_SECONDS = int(os.getenv("SESSION_TOUCH_SECONDS", "300"))
+SESSION_ID_LENGTH = 32
+
+
+class SessionStore:
+    """Interfaz mínima de un almacén de sesiones (payload en bytes)"""
+
+    def get(self, sid):
+        """Retorna el payload de la sesión o None si no existe / venció"""
+        raise NotImplementedError
+
+    def set(self, sid, data, expira):
+        """Guarda el payload con su fecha de expiración"""
+        raise NotImplementedError
+
+    def delete(self, sid):
+        """Elimina la sesión"""
+        raise NotImplementedError
+
+
+class MongoSessionStore(SessionStore):
+    """Sesiones en MongoDB con índice TTL"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        # expireAfterSeconds=0: el documento vence en la fecha de "expira"
+        self.collection.create_index("expira", expireAfterSeconds=0)
+
+    def get(self, sid):
+        doc = self.collection.find_one({"_id": sid})
+        # El monitor TTL corre cada ~60s, se valida también aquí
+        if not doc or doc["expira"] <= datetime.utcnow():
+            return None
+        return bytes(doc["data"])
+
+    def set(self, sid, data, expira):
+        self.collection.update_one(
+            {"_id": sid},
+            {"$set": {"data": Binary(data), "expira": expira}},
+            upsert=True
+        )
+
+    def delete(self, sid):
+        self.collection.delete_one({"_id": sid})
+
+
+class MemorySessionStore(SessionStore):
+    """Sesiones en memoria del proceso (no compartidas entre workers)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+            if not item:
+                return None
+            if item[1] <= datetime.utcnow():
+                del self._data[sid]
+                return None
+            return item[0]
+
+    def set(self, sid, data, expira):
+        with self._lock:
+            self._data[sid] = (data, expira)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class LRUSessionCache(SessionStore):
+    """
+    Caché LRU delante de otro almacén (write-through)
+
+    Las entradas se sirven desde memoria durante SESSION_CACHE_SECONDS; pasado
+    ese tiempo se releen del almacén para ver cambios hechos por otros workers.
+    """
+
+    def __init__(self, backend, max_items=SESSION_CACHE_SIZE, ttl_seconds=SESSION_CACHE_SECONDS):
+        self.backend = backend
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, sid, data, expira):
+        with self._lock:
+            self._cache[sid] = (data, expira, datetime.utcnow())
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.max_items:
+                self._cache.popitem(last=False)
+
+    def get(self, sid):
+        ahora = datetime.utcnow()
+        with self._lock:
+            item = self._cache.get(sid)
+            if item and item[1] > ahora and (ahora - item[2]).total_seconds() < self.ttl_seconds:
+                self._cache.move_to_end(sid)
+                return item[0]
+
+        data = self.backend.get(sid)
+        if data is None:
+            with self._lock:
+                self._cache.pop(sid, None)
+            return None
+
+        # Expiración real desconocida aquí: se limita a la vida de la caché
+        self._put(sid, data, ahora + timedelta(seconds=self.ttl_seconds))
+        return data
+
+    def set(self, sid, data, expira):
+        self.backend.set(sid, data, expira)
+        self._put(sid, data, expira)
+
+    def delete(self, sid):
+        self.backend.delete(sid)
+        with self._lock:
+            self._cache.pop(sid, None)
+
+
+class StoreSession(CallbackDict, SessionMixin):
+    """Sesión respaldada por un SessionStore"""
+
+    def __init__(self, initial=None, sid=None, new=False, touched=0):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.touched = touched
+        self.modified = False
+
+
+class StoreSessionInterface(SessionInterface):
+    """SessionInterface de Flask sobre un SessionStore"""
+
+    salt = "callejon9-session"
+
+    def __init__(self, store, touch_seconds=SESSION_TOUCH_SECONDS):
+        self.store = store
+        self.touch_seconds = touch_seconds
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def _nueva_sesion(self):
+        return StoreSession(sid=secrets.token_urlsafe(SESSION_ID_LENGTH), new=True)
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._nueva_sesion()
+
+        try:
+            sid = self._signer(app).unsign(cookie).decode("utf-8")
+        except BadSignature:
+            return self._nueva_sesion()
+
+        raw = self.store.get(sid)
+        if raw is None:
+            # Id desconocido o vencido: nunca se reutiliza (session fixation)
+            return self._nueva_sesion()
+
+        try:
+            payload = self._decoder.decode(raw)
+        except msgspec.DecodeError:
+            return self._nueva_sesion()
+
+        return StoreSession(payload.get("d"), sid=sid, touched=payload.get("t", 0))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        ahora = datetime.utcnow()
+        expira = ahora + app.permanent_session_lifetime
+        ahora_ts = int(ahora.timestamp())
+
+        # Sin cambios: solo se renueva la expiración cada touch_seconds
+        if not (session.modified or session.new or ahora_ts - session.touched >= self.touch_seconds):
+            return
+
+        payload = self._encoder.encode({"d": dict(session), "t": ahora_ts})
+        self.store.set(session.sid, payload, expira)
+
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid).decode("utf-8"),
+            expires=expira if app.config.get("SESSION_PERMANENT", True) else None,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def crear_session_interface(backend="mongo"):
+    """
+    Construye la SessionInterface según SESSION_BACKEND
+
+    Args:
+        backend: "mongo" (compartido entre workers) o "memory"
+
+    Returns:
+        StoreSessionInterface con caché LRU delante del almacén
+    """
+    if backend == "memory":
+        store = MemorySessionStore()
+    else:
+        from config.db import db
+        store = MongoSessionStore(db["sesiones"])
+
+    return StoreSessionInterface(LRUSessionCache(store))
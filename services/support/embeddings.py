@@ -0,0 +1,357 @@
+"""
+Similitud Semántica de Soporte - Restaurante Callejón 9
+========================================================
+Embeddings en CPU para FAQ semántica y detección de tickets duplicados.
+
+Modelo (EMBEDDINGS_MODEL_DIR): embeddings estáticos en formato model2vec,
+un directorio local con tokenizer.json y model.safetensors. Un texto se
+codifica como el promedio normalizado de los vectores de sus tokens, así que
+solo se necesitan tokenizers + safetensors + numpy (sin torch).
+
+Índices (EMBEDDINGS_DIR):
+    - <nombre>.npy: matriz float16 (filas normalizadas), se abre con mmap
+    - <nombre>.json: ids de cada fila, modelo, dimensión y último _id
+      indexado (tickets) o versión de la FAQ (faq)
+Un índice generado con otro modelo o dimensión no se usa. El de FAQ es
+pequeño: se regenera en la petición cuando cambia FAQ.obtener_version()
+(como el índice BM25) o el modelo. El de tickets solo lo crea
+reindex_embeddings_command (sin él, la búsqueda de similares responde
+EmbeddingsNoDisponibles en lugar de codificar la colección completa en la
+petición). Los tickets creados después se codifican de forma incremental en
+memoria; el comando reescribe los archivos.
+
+La similitud es el producto punto (coseno) calculado por bloques, con top-k
+por argpartition.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+# Configuración
+EMBEDDINGS_MODEL_DIR = os.getenv("EMBEDDINGS_MODEL_DIR", os.path.join("storage", "models", "embeddings"))
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", os.path.join("storage", "embeddings"))
+EMBEDDINGS_BATCH_SIZE = int(os.getenv("EMBEDDINGS_BATCH_SIZE", "256"))
+EMBEDDINGS_MAX_TOKENS = int(os.getenv("EMBEDDINGS_MAX_TOKENS", "256"))
+EMBEDDINGS_SYNC_SECONDS = int(os.getenv("EMBEDDINGS_SYNC_SECONDS", "30"))
+
+# Filas por bloque al calcular similitudes sobre la matriz float16
+BLOQUE_FILAS = 4096
+
+
+class EmbeddingsNoDisponibles(Exception):
+    """El modelo de embeddings local no está instalado o el índice no se ha generado"""
+    pass
+
+
+class IndiceIncompatible(EmbeddingsNoDisponibles):
+    """El índice persistido se generó con otro modelo o dimensión"""
+    pass
+
+
+class StaticEmbeddingModel:
+    """Codificador de embeddings estáticos (tokenizer.json + model.safetensors)"""
+
+    def __init__(self, ruta=EMBEDDINGS_MODEL_DIR, max_tokens=EMBEDDINGS_MAX_TOKENS):
+        tokenizer_path = os.path.join(ruta, "tokenizer.json")
+        pesos_path = os.path.join(ruta, "model.safetensors")
+        if not (os.path.isfile(tokenizer_path) and os.path.isfile(pesos_path)):
+            raise EmbeddingsNoDisponibles(f"No se encontró el modelo de embeddings en {ruta}")
+
+        from tokenizers import Tokenizer
+        from safetensors.numpy import load_file
+
+        self.nombre = os.path.basename(os.path.normpath(ruta))
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.no_padding()
+        self.tokenizer.no_truncation()
+        tensores = load_file(pesos_path)
+        self.vectores = tensores.get("embeddings", next(iter(tensores.values()))).astype(np.float32)
+        self.dim = self.vectores.shape[1]
+        self.max_tokens = max_tokens
+
+    def encode(self, textos, batch_size=EMBEDDINGS_BATCH_SIZE):
+        """
+        Codifica textos en lotes
+
+        Returns:
+            np.ndarray: (len(textos), dim) float32 con filas normalizadas
+        """
+        salida = np.zeros((len(textos), self.dim), dtype=np.float32)
+        for inicio in range(0, len(textos), batch_size):
+            lote = [t or "" for t in textos[inicio:inicio + batch_size]]
+            ids = [e.ids[:self.max_tokens] for e in self.tokenizer.encode_batch(lote, add_special_tokens=False)]
+
+            longitudes = np.array([len(x) for x in ids])
+            con_tokens = np.flatnonzero(longitudes)
+            if not len(con_tokens):
+                continue
+
+            # Promedio por texto en una sola pasada: suma por segmentos con reduceat
+            todos = np.fromiter((i for x in ids for i in x), dtype=np.int64, count=int(longitudes.sum()))
+            offsets = np.concatenate(([0], np.cumsum(longitudes[con_tokens])[:-1]))
+            sumas = np.add.reduceat(self.vectores[todos], offsets, axis=0)
+            salida[inicio + con_tokens] = sumas / longitudes[con_tokens, None]
+
+        normas = np.linalg.norm(salida, axis=1, keepdims=True)
+        np.divide(salida, normas, out=salida, where=normas > 0)
+        return salida
+
+
+class EmbeddingIndex:
+    """Matriz float16 de embeddings persistida en disco y abierta con mmap"""
+
+    def __init__(self, nombre, directorio=EMBEDDINGS_DIR):
+        self.nombre = nombre
+        self.matriz_path = os.path.join(directorio, f"{nombre}.npy")
+        self.meta_path = os.path.join(directorio, f"{nombre}.json")
+        self.matriz = None
+        self.ids = []
+        self.meta = {}
+        # Filas agregadas desde el último guardado (float32, en memoria)
+        self._extra = None
+        self._extra_ids = []
+        self._lock = threading.Lock()
+
+    def cargar(self, esperado=None):
+        """
+        Abre la matriz persistida con mmap; False si no existe
+
+        Args:
+            esperado: {"modelo": ..., "dim": ...} del modelo actual
+
+        Raises:
+            IndiceIncompatible: Si el índice no corresponde a `esperado`
+        """
+        if not (os.path.isfile(self.matriz_path) and os.path.isfile(self.meta_path)):
+            return False
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        matriz = np.load(self.matriz_path, mmap_mode="r")
+        if esperado:
+            distintos = [k for k, v in esperado.items() if meta.get(k) != v]
+            if matriz.ndim != 2 or (len(matriz) and matriz.shape[1] != esperado.get("dim")):
+                distintos.append("matriz")
+            if distintos:
+                raise IndiceIncompatible(
+                    f"Índice '{self.nombre}' generado con otro modelo ({', '.join(distintos)} distinto): "
+                    f"ejecuta python -m cqrs.commands.admin.reindex_embeddings_command"
+                )
+        with self._lock:
+            self.matriz, self.ids, self.meta = matriz, meta["ids"], meta
+            self._extra, self._extra_ids = None, []
+        return True
+
+    def guardar(self, ids, vectores, **meta):
+        """Escribe la matriz (float16) y sus metadatos de forma atómica y la vuelve a abrir"""
+        os.makedirs(os.path.dirname(self.matriz_path) or ".", exist_ok=True)
+        tmp_matriz, tmp_meta = self.matriz_path + ".tmp.npy", self.meta_path + ".tmp"
+
+        np.save(tmp_matriz, np.asarray(vectores, dtype=np.float16))
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(dict(meta, ids=list(ids), filas=len(ids), creado=time.time()), f)
+
+        os.replace(tmp_matriz, self.matriz_path)
+        os.replace(tmp_meta, self.meta_path)
+        self.cargar()
+
+    def agregar(self, ids, vectores):
+        """Agrega filas en memoria (se persisten en la siguiente reindexación)"""
+        if not len(ids):
+            return
+        vectores = np.asarray(vectores, dtype=np.float32)
+        with self._lock:
+            self._extra = vectores if self._extra is None else np.vstack([self._extra, vectores])
+            self._extra_ids = self._extra_ids + list(ids)
+
+    def __len__(self):
+        return len(self.ids) + len(self._extra_ids)
+
+    def buscar(self, vector, top_k=5, excluir=None):
+        """
+        Returns:
+            list: [(id, similitud)] ordenado de mayor a menor
+        """
+        with self._lock:
+            matriz, ids, extra, extra_ids = self.matriz, self.ids, self._extra, self._extra_ids
+
+        total = (len(ids) if matriz is not None else 0) + len(extra_ids)
+        if not total:
+            return []
+
+        q = np.asarray(vector, dtype=np.float32).ravel()
+        puntajes = np.empty(total, dtype=np.float32)
+        n = 0
+        if matriz is not None:
+            n = len(ids)
+            # float16 -> float32 por bloques en un buffer reutilizado (BLAS no opera float16)
+            buffer = np.empty((min(BLOQUE_FILAS, n), matriz.shape[1]), dtype=np.float32)
+            for inicio in range(0, n, BLOQUE_FILAS):
+                bloque = buffer[:min(BLOQUE_FILAS, n - inicio)]
+                np.copyto(bloque, matriz[inicio:inicio + len(bloque)])
+                puntajes[inicio:inicio + len(bloque)] = bloque @ q
+        if extra is not None:
+            puntajes[n:] = extra @ q
+
+        todos_ids = ids + extra_ids if extra_ids else ids
+
+        # Se pide una fila más cuando hay que descartar el propio ticket
+        k = min(top_k + (excluir is not None), total)
+        mejores = np.argpartition(puntajes, -k)[-k:]
+        mejores = mejores[np.argsort(puntajes[mejores])[::-1]]
+        resultado = [(todos_ids[i], round(float(puntajes[i]), 4)) for i in mejores if todos_ids[i] != excluir]
+        return resultado[:top_k]
+
+
+def texto_ticket(ticket):
+    return f"{ticket.get('asunto') or ''}. {ticket.get('descripcion') or ''}".strip(". ")
+
+
+def texto_faq(faq):
+    return f"{faq.get('pregunta') or ''} {faq.get('respuesta') or ''}".strip()
+
+
+class SimilarityService:
+    """Tickets similares y búsqueda semántica de FAQ"""
+
+    def __init__(self, modelo=None, directorio=EMBEDDINGS_DIR):
+        self._modelo = modelo
+        self.faq = EmbeddingIndex("faq", directorio)
+        self.tickets = EmbeddingIndex("tickets", directorio)
+        self._ultimo_ticket = None
+        self._sync_at = 0.0
+        self._faq_revisada = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def modelo(self):
+        if self._modelo is None:
+            self._modelo = StaticEmbeddingModel()
+        return self._modelo
+
+    def _meta(self):
+        return {"modelo": self.modelo.nombre, "dim": self.modelo.dim}
+
+    # === INDEXACIÓN ===
+
+    def reindexar_faq(self):
+        from models.soporte_model import FAQ
+        # Versión leída antes que las entradas: un cambio concurrente provoca otra regeneración
+        version = FAQ.obtener_version()
+        entradas = FAQ.obtener_faq()
+        vectores = self.modelo.encode([texto_faq(f) for f in entradas])
+        self.faq.guardar([str(f["_id"]) for f in entradas], vectores, version=version, **self._meta())
+        return len(entradas)
+
+    def refrescar_faq(self):
+        """
+        Regenera el índice de FAQ si cambió la versión de la FAQ o el modelo
+        (revisión como máximo cada EMBEDDINGS_SYNC_SECONDS)
+        """
+        ahora = time.monotonic()
+        if self._faq_revisada and ahora - self._faq_revisada < EMBEDDINGS_SYNC_SECONDS:
+            return
+        with self._lock:
+            if self._faq_revisada and ahora - self._faq_revisada < EMBEDDINGS_SYNC_SECONDS:
+                return
+            from models.soporte_model import FAQ
+            version = FAQ.obtener_version()
+            if self.faq.matriz is None or self.faq.meta.get("version") != version:
+                # Otro proceso pudo haberlo regenerado ya
+                try:
+                    vigente = self.faq.cargar(self._meta()) and self.faq.meta.get("version") == version
+                except IndiceIncompatible:
+                    logging.warning("Índice de FAQ generado con otro modelo: se regenera")
+                    vigente = False
+                if not vigente:
+                    self.reindexar_faq()
+            self._faq_revisada = ahora
+
+    def reindexar_tickets(self, batch_size=EMBEDDINGS_BATCH_SIZE * 4):
+        """Recodifica todos los tickets leyendo la colección por lotes"""
+        from models.soporte_model import Ticket
+        cursor = Ticket.collection.find({}, {"asunto": 1, "descripcion": 1}).sort("_id", 1).batch_size(batch_size)
+
+        ids, bloques, lote = [], [], []
+        for t in cursor:
+            lote.append(t)
+            if len(lote) >= batch_size:
+                bloques.append(self.modelo.encode([texto_ticket(x) for x in lote]).astype(np.float16))
+                ids += [str(x["_id"]) for x in lote]
+                lote = []
+        if lote:
+            bloques.append(self.modelo.encode([texto_ticket(x) for x in lote]).astype(np.float16))
+            ids += [str(x["_id"]) for x in lote]
+
+        vectores = np.vstack(bloques) if bloques else np.zeros((0, self.modelo.dim), dtype=np.float16)
+        self.tickets.guardar(ids, vectores, ultimo_id=ids[-1] if ids else None, **self._meta())
+        self._ultimo_ticket = ids[-1] if ids else None
+        return len(ids)
+
+    def sincronizar_tickets(self):
+        """
+        Codifica en memoria los tickets creados después del último indexado
+
+        Raises:
+            EmbeddingsNoDisponibles: Si todavía no existe el índice persistido
+            IndiceIncompatible: Si se generó con otro modelo
+        """
+        if self.tickets.matriz is None:
+            # Lo pudo generar el comando después de abrir el servicio
+            with self._lock:
+                if self.tickets.matriz is None and not self.tickets.cargar(self._meta()):
+                    raise EmbeddingsNoDisponibles(
+                        "Índice de tickets no generado: ejecuta "
+                        "python -m cqrs.commands.admin.reindex_embeddings_command"
+                    )
+                self._ultimo_ticket = self.tickets.meta.get("ultimo_id")
+        ahora = time.monotonic()
+        if ahora - self._sync_at < EMBEDDINGS_SYNC_SECONDS:
+            return
+        with self._lock:
+            if ahora - self._sync_at < EMBEDDINGS_SYNC_SECONDS:
+                return
+            from bson.objectid import ObjectId
+            from models.soporte_model import Ticket
+
+            filtro = {"_id": {"$gt": ObjectId(self._ultimo_ticket)}} if self._ultimo_ticket else {}
+            nuevos = list(Ticket.collection.find(filtro, {"asunto": 1, "descripcion": 1}).sort("_id", 1))
+            if nuevos:
+                self.tickets.agregar(
+                    [str(t["_id"]) for t in nuevos],
+                    self.modelo.encode([texto_ticket(t) for t in nuevos])
+                )
+                self._ultimo_ticket = str(nuevos[-1]["_id"])
+            self._sync_at = ahora
+
+    # === CONSULTAS ===
+
+    def tickets_similares(self, ticket=None, texto=None, top_k=5):
+        """Tickets más parecidos a un ticket (se excluye a sí mismo) o a un texto libre"""
+        self.sincronizar_tickets()
+        texto = texto if texto is not None else texto_ticket(ticket)
+        excluir = str(ticket["_id"]) if ticket and ticket.get("_id") else None
+        return self.tickets.buscar(self.modelo.encode([texto])[0], top_k, excluir)
+
+    def buscar_faq(self, pregunta, top_k=3):
+        """FAQ semánticamente más cercanas a la pregunta: [(faq_id, similitud)]"""
+        self.refrescar_faq()
+        return self.faq.buscar(self.modelo.encode([pregunta])[0], top_k)
+
+
+_servicio = None
+_servicio_lock = threading.Lock()
+
+
+def get_similarity_service():
+    """Servicio compartido del proceso (los índices persistidos se abren en su primer uso)"""
+    global _servicio
+    if _servicio is None:
+        with _servicio_lock:
+            if _servicio is None:
+                _servicio = SimilarityService()
+    return _servicio
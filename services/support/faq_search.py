@@ -0,0 +1,204 @@
+"""
+Búsqueda de FAQ - Restaurante Callejón 9
+========================================
+Índice invertido BM25 en memoria construido desde la colección "faq".
+
+    - Texto normalizado: minúsculas, sin acentos, sin stopwords y con un
+      recorte simple de plurales ("horarios" -> "horario")
+    - Los pesos BM25 de cada (término, entrada) se precalculan al construir
+      como arreglos numpy; una consulta solo suma los arreglos de sus términos
+      y elige el top-k con argpartition
+    - Campos ponderados: keywords x3, pregunta x2, respuesta x1
+    - Se reconstruye cuando cambia la versión de FAQ en "configuracion"
+      (ver FAQ.crear/actualizar/eliminar), revisada cada FAQ_INDEX_CHECK_SECONDS
+
+Si la colección está vacía se indexan las respuestas por defecto del chat.
+"""
+
+import os
+import re
+import math
+import time
+import logging
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Configuración
+FAQ_INDEX_CHECK_SECONDS = int(os.getenv("FAQ_INDEX_CHECK_SECONDS", "30"))
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.1"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PESOS_CAMPOS = {"keywords": 3, "pregunta": 2, "respuesta": 1}
+
+STOPWORDS = frozenset("""
+a al algo como con cual cuales cuando de del donde el ella en es esta este
+hay la las le lo los me mi mis no o para pero por que se si sin sobre su sus
+te tu tus un una unos unas y ya yo puedo puede quiero tengo tienen cual
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9ñ]+")
+
+# Respuestas del chat previas a la colección "faq"
+FAQ_POR_DEFECTO = [
+    {
+        "pregunta": "¿Cuál es el horario de atención?",
+        "keywords": ["horario", "hora", "atención"],
+        "respuesta": "⏰ Nuestro horario es Lunes a Viernes 9AM-6PM, Sábados 9AM-2PM"
+    },
+    {
+        "pregunta": "¿Cómo consulto el estado de mi ticket?",
+        "keywords": ["ticket", "seguimiento", "estado"],
+        "respuesta": "🎫 Puedes consultar tu ticket en 'Mis Tickets' con tu número de referencia"
+    },
+    {
+        "pregunta": "¿Cómo los contacto?",
+        "keywords": ["contacto", "whatsapp", "teléfono"],
+        "respuesta": "📞 WhatsApp: +52 722 123 4567 | Email: soporte@tuempresa.com",
+        "necesita_humano": True
+    }
+]
+
+
+def _sin_acentos(texto):
+    # La ñ se conserva: "año" y "ano" son palabras distintas
+    texto = texto.lower().replace("ñ", "\0")
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).replace("\0", "ñ")
+
+
+def _raiz(token):
+    if len(token) > 4 and token.endswith("es"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenizar(texto):
+    """Texto -> lista de términos normalizados"""
+    if not texto:
+        return []
+    if isinstance(texto, (list, tuple)):
+        texto = " ".join(str(t) for t in texto)
+    return [
+        _raiz(t) for t in _TOKEN_RE.findall(_sin_acentos(str(texto)))
+        if t not in STOPWORDS
+    ]
+
+
+class FAQSearchIndex:
+    """Índice BM25 de entradas de FAQ"""
+
+    def __init__(self, cargar_entradas=None, obtener_version=None,
+                 check_seconds=FAQ_INDEX_CHECK_SECONDS):
+        self._cargar_entradas = cargar_entradas
+        self._obtener_version = obtener_version
+        self.check_seconds = check_seconds
+        # (entradas, postings) se reemplaza como una sola tupla
+        self._datos = ([], {})
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def construir(self, entradas):
+        """Precalcula el índice invertido con pesos BM25 por (término, entrada)"""
+        frecuencias = []
+        for entrada in entradas:
+            tf = Counter()
+            for campo, peso in PESOS_CAMPOS.items():
+                for termino in tokenizar(entrada.get(campo)):
+                    tf[termino] += peso
+            frecuencias.append(tf)
+
+        n = len(frecuencias)
+        promedio = (sum(sum(tf.values()) for tf in frecuencias) / n) if n else 0.0
+
+        documentos_por_termino = defaultdict(int)
+        for tf in frecuencias:
+            for termino in tf:
+                documentos_por_termino[termino] += 1
+
+        listas = defaultdict(lambda: ([], []))
+        for i, tf in enumerate(frecuencias):
+            longitud = sum(tf.values())
+            norma = BM25_K1 * (1 - BM25_B + BM25_B * longitud / promedio) if promedio else BM25_K1
+            for termino, f in tf.items():
+                df = documentos_por_termino[termino]
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                listas[termino][0].append(i)
+                listas[termino][1].append(idf * f * (BM25_K1 + 1) / (f + norma))
+
+        postings = {
+            termino: (np.array(ids, dtype=np.int32), np.array(pesos, dtype=np.float32))
+            for termino, (ids, pesos) in listas.items()
+        }
+
+        # Asignación atómica: las búsquedas concurrentes ven el índice viejo o el nuevo
+        self._datos = (list(entradas), postings)
+
+    def refrescar(self):
+        """Reconstruye si cambió la versión (revisión como máximo cada check_seconds)"""
+        if self._cargar_entradas is None:
+            return
+        ahora = time.monotonic()
+        if self._checked_at and ahora - self._checked_at < self.check_seconds:
+            return
+
+        with self._lock:
+            if self._checked_at and ahora - self._checked_at < self.check_seconds:
+                return
+            try:
+                version = self._obtener_version() if self._obtener_version else 0
+                if version != self._version:
+                    inicio = time.perf_counter()
+                    self.construir(self._cargar_entradas() or FAQ_POR_DEFECTO)
+                    self._version = version
+                    logging.info(f"Índice FAQ construido: {len(self._datos[0])} entradas "
+                                 f"en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+            except Exception as e:
+                logging.error(f"Error al construir índice FAQ: {e}")
+                if not self._datos[0]:
+                    self.construir(FAQ_POR_DEFECTO)
+            self._checked_at = ahora
+
+    def invalidar(self):
+        """Fuerza la revisión de versión en la siguiente búsqueda"""
+        self._checked_at = 0.0
+        self._version = None
+
+    def buscar(self, pregunta, top_k=3):
+        """
+        Returns:
+            list: [(puntaje, entrada)] ordenado de mayor a menor
+        """
+        self.refrescar()
+        entradas, postings = self._datos
+
+        listas = [postings[t] for t in set(tokenizar(pregunta)) if t in postings]
+        if not listas:
+            return []
+
+        puntajes = np.zeros(len(entradas), dtype=np.float32)
+        for ids, pesos in listas:
+            puntajes[ids] += pesos
+
+        top_k = min(top_k, len(entradas))
+        mejores = np.argpartition(puntajes, -top_k)[-top_k:]
+        mejores = mejores[np.argsort(puntajes[mejores])[::-1]]
+        return [(round(float(puntajes[i]), 4), entradas[i]) for i in mejores if puntajes[i] > 0]
+
+
+_indice = None
+
+
+def get_faq_index():
+    """Índice compartido del proceso, alimentado por la colección "faq"."""
+    global _indice
+    if _indice is None:
+        from models.soporte_model import FAQ
+        _indice = FAQSearchIndex(FAQ.obtener_faq, FAQ.obtener_version)
+    return _indice
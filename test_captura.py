@@ -0,0 +1,243 @@
+"""
+Script de Prueba - Captura de Cambios
+Comprueba que la captura en modo "auto" sobre un servidor sin change
+streams (standalone) conserva su cobertura entre ejecuciones, y que la
+recuperación a un momento aplica los borrados hechos entre el respaldo
+completo y el último incremental de la cadena.
+
+No requiere MongoDB: usa bases en memoria cuyo watch() falla como en
+un standalone (código 40573).
+
+Uso:
+    python test_captura.py
+"""
+
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+
+class EstadoEnMemoria:
+    """Colección captura_estado mínima: find_one y update_one con $set"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, filtro):
+        doc = self.docs.get(filtro["_id"])
+        return dict(doc) if doc else None
+
+    def update_one(self, filtro, cambios, upsert=False):
+        self.docs.setdefault(filtro["_id"], {"_id": filtro["_id"]}).update(cambios["$set"])
+
+
+class BaseStandalone:
+    """Base sin colecciones de datos donde watch() falla como en un servidor standalone"""
+
+    def __init__(self):
+        self.estado = EstadoEnMemoria()
+        self.intentos_stream = 0
+
+    def __getitem__(self, nombre):
+        return self.estado
+
+    def list_collection_names(self):
+        return ["captura_estado"]
+
+    def watch(self, *args, **kwargs):
+        self.intentos_stream += 1
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+
+class CursorEnMemoria:
+    """Cursor mínimo: sort, limit y batch_size sobre una lista ya filtrada"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, campo, direccion=1):
+        self.docs.sort(key=lambda d: d[campo], reverse=direccion < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class ColeccionEnMemoria:
+    """Lo que usan los respaldos: find con $gt/$exists/$or/$and, drop y bulk_write"""
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+
+    @staticmethod
+    def _cumple(doc, filtro):
+        for campo, condicion in filtro.items():
+            if campo in ("$or", "$and"):
+                resultados = [ColeccionEnMemoria._cumple(doc, f) for f in condicion]
+                if not (any(resultados) if campo == "$or" else all(resultados)):
+                    return False
+            elif "$exists" in condicion:
+                if (campo in doc) != condicion["$exists"]:
+                    return False
+            elif campo not in doc or not doc[campo] > condicion["$gt"]:
+                return False
+        return True
+
+    def find(self, filtro=None, proyeccion=None):
+        return CursorEnMemoria([dict(d) for d in self.docs.values() if self._cumple(d, filtro or {})])
+
+    def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs[doc["_id"]] = dict(doc)
+
+    def delete_one(self, filtro):
+        self.docs.pop(filtro["_id"], None)
+
+    def drop(self):
+        self.docs.clear()
+
+    def bulk_write(self, operaciones, ordered=True):
+        for op in operaciones:
+            if type(op).__name__ == "DeleteOne":
+                self.delete_one(op._filter)
+            else:
+                self.insert_one(op._doc)
+
+
+class BaseEnMemoria(BaseStandalone):
+    """Base con colecciones de datos en memoria (y sin change streams)"""
+
+    def __init__(self):
+        super().__init__()
+        self.colecciones = {}
+
+    def __getitem__(self, nombre):
+        if nombre == "captura_estado":
+            return self.estado
+        return self.colecciones.setdefault(nombre, ColeccionEnMemoria(nombre))
+
+    def list_collection_names(self):
+        return ["captura_estado"] + list(self.colecciones)
+
+
+def test_auto_standalone_conserva_cobertura():
+    """Dos ejecuciones en modo auto sin change streams: la cobertura no se mueve"""
+    print("\n" + "="*60)
+    print("TEST 1: Captura auto en standalone")
+    print("="*60)
+
+    from services.backups.captura import CapturaCambios, leer_cobertura
+
+    database = BaseStandalone()
+    with tempfile.TemporaryDirectory() as directorio:
+        primera = CapturaCambios(database, directorio, modo="auto").ejecutar(duracion=0)
+        cobertura = leer_cobertura(directorio)
+        print(f"✅ Primera ejecución: {primera['modo']}, cobertura desde {cobertura['iniciada']}")
+
+        segunda = CapturaCambios(database, directorio, modo="auto").ejecutar(duracion=0)
+        despues = leer_cobertura(directorio)
+        print(f"✅ Segunda ejecución: {segunda['modo']}, cobertura desde {despues['iniciada']}")
+
+    assert primera["modo"] == segunda["modo"] == "polling"
+    assert despues == cobertura, "La cobertura se reinició en la segunda ejecución"
+    # El stream solo se intenta mientras no hay captura por polling en curso
+    assert database.intentos_stream == 1
+
+
+def test_momento_aplica_borrados_anteriores_al_incremental():
+    """Un borrado entre el completo y el incremental no revive; una colección vacía se limpia"""
+    print("\n" + "="*60)
+    print("TEST 2: Recuperación a un momento con cadena incremental")
+    print("="*60)
+
+    from services.backups.backups import crear_respaldo, leer_manifest
+    from services.backups.captura import (
+        restaurar_a_momento, escribir_segmento, _escribir_cobertura, OP_CAMBIO, OP_BORRADO
+    )
+
+    database = BaseEnMemoria()
+    pedidos, mesas = database["pedidos"], database["mesas"]
+    for nombre in ("a", "b"):
+        pedidos.insert_one({"_id": ObjectId(), "nombre": nombre})
+    b = next(d for d in pedidos.docs.values() if d["nombre"] == "b")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        respaldos = os.path.join(directorio, "respaldos")
+        cambios = os.path.join(directorio, "cambios")
+        _escribir_cobertura(cambios, datetime.utcnow() - timedelta(minutes=1), "stream")
+
+        completo = crear_respaldo("completo", ["pedidos", "mesas"], database, directorio=respaldos, workers=1)
+        print(f"✅ Completo: {completo['colecciones']}")
+
+        # Cambios después del completo, registrados como los registraría el stream
+        pedidos.delete_one({"_id": b["_id"]})
+        c = {"_id": ObjectId(), "nombre": "c"}
+        pedidos.insert_one(c)
+        escribir_segmento([
+            {"ts": datetime.utcnow(), "op": OP_BORRADO, "col": "pedidos", "id": b["_id"]},
+            {"ts": datetime.utcnow(), "op": OP_CAMBIO, "col": "pedidos", "doc": c}
+        ], cambios)
+
+        incremental = crear_respaldo("incremental", ["pedidos", "mesas"], database, directorio=respaldos,
+                                     workers=1, base=leer_manifest(os.path.join(respaldos, completo["archivo"])))
+        hasta = datetime.utcnow()
+        # Posterior al momento pedido: no debe sobrevivir a la restauración
+        mesas.insert_one({"_id": ObjectId(), "numero": 1})
+
+        plan, _, reproducidos = restaurar_a_momento(hasta, incremental["archivo"], database,
+                                                    directorio=respaldos, directorio_cambios=cambios)
+        print(f"✅ Plan: {' -> '.join(plan)}, {reproducidos['registros']} cambios reproducidos")
+
+    nombres = sorted(d["nombre"] for d in pedidos.docs.values())
+    print(f"✅ Pedidos restaurados: {nombres}")
+    assert nombres == ["a", "c"], f"El borrado de 'b' no se aplicó: {nombres}"
+    assert not mesas.docs, "La colección vacía en el respaldo conservó los datos actuales"
+
+
+def main():
+    pruebas = [
+        ("Captura auto en standalone", test_auto_standalone_conserva_cobertura),
+        ("Recuperación a un momento con incrementales", test_momento_aplica_borrados_anteriores_al_incremental)
+    ]
+
+    resultados = []
+    for nombre, test_func in pruebas:
+        # Cada prueba falla con una excepción (assert); si termina, pasó
+        try:
+            test_func()
+            resultados.append((nombre, True))
+        except Exception as e:
+            print(f"\n❌ Error ejecutando {nombre}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            resultados.append((nombre, False))
+
+    print("\n" + "="*60)
+    print("RESUMEN DE PRUEBAS")
+    print("="*60)
+    for nombre, resultado in resultados:
+        status = "✅ PASÓ" if resultado else "❌ FALLÓ"
+        print(f"{status} - {nombre}")
+
+    exitosas = sum(1 for _, r in resultados if r)
+    print(f"\nResultado: {exitosas}/{len(resultados)} pruebas exitosas")
+    return exitosas == len(resultados)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
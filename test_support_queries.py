@@ -0,0 +1,206 @@
+"""
+Script de Prueba - Consultas del Módulo de Soporte
+Comprueba que el número de consultas a Mongo por petición de las vistas de
+soporte es constante sin importar cuántos tickets existan (sin N+1 al
+resolver el nombre de cada cliente).
+
+No requiere MongoDB: las vistas leen una base en memoria que cuenta cada
+operación enviada (find, find_one, aggregate, count_documents...). No evalúa
+los filtros: para contar consultas basta con respetar $limit, skip y limit.
+
+Uso:
+    python test_support_queries.py
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+# config.db exige estas variables; el cliente real nunca se usa
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "callejon9_test")
+
+from bson import ObjectId
+
+TAMANOS = (10, 100, 1000)
+
+
+class CursorContado:
+    """Cursor sobre una lista: sort se ignora, skip y limit recortan"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n] if n else self.docs
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return iter([dict(d) for d in self.docs])
+
+
+class ColeccionContada:
+    """Colección en memoria que suma una consulta por operación en su base"""
+
+    def __init__(self, base, nombre):
+        self.base = base
+        self.nombre = nombre
+        self.docs = []
+
+    def _contar(self, operacion):
+        self.base.consultas.append(f"{self.nombre}.{operacion}")
+
+    def find(self, filtro=None, proyeccion=None):
+        self._contar("find")
+        return CursorContado(self.docs)
+
+    def find_one(self, filtro=None, proyeccion=None):
+        self._contar("find_one")
+        return dict(self.docs[0]) if self.docs else None
+
+    def count_documents(self, filtro, **kwargs):
+        self._contar("count_documents")
+        return len(self.docs)
+
+    def aggregate(self, pipeline):
+        self._contar("aggregate")
+        if "$facet" in pipeline[0]:
+            return iter([{nombre: self._etapas(etapas) for nombre, etapas in pipeline[0]["$facet"].items()}])
+        return iter(self._etapas(pipeline))
+
+    def _etapas(self, etapas):
+        """Los $group no se evalúan (quedan vacíos); $limit recorta"""
+        if any("$group" in e for e in etapas):
+            return []
+        docs = [dict(d) for d in self.docs]
+        for etapa in etapas:
+            if "$limit" in etapa:
+                docs = docs[:etapa["$limit"]]
+        return docs
+
+    def create_index(self, *args, **kwargs):
+        self._contar("create_index")
+
+
+class BaseContada:
+    """Base en memoria que registra las consultas enviadas"""
+
+    def __init__(self):
+        self.consultas = []
+        self.colecciones = {}
+
+    def __getitem__(self, nombre):
+        return self.colecciones.setdefault(nombre, ColeccionContada(self, nombre))
+
+    __getattr__ = __getitem__
+
+
+def _preparar(base):
+    """Apunta el controlador y el modelo de tickets a la base en memoria"""
+    import controllers.support.supportController as modulo_soporte
+    from models.soporte_model import Ticket
+
+    modulo_soporte.db = base
+    # Solo interesan las consultas: se omite el render de las plantillas
+    modulo_soporte.render_template = lambda plantilla, **contexto: contexto
+    Ticket.collection = base["tickets"]
+    Ticket.migracion_collection = base["configuracion"]
+    # Índices y marca de migración ya revisados: no suman consultas según el momento
+    Ticket._indices_creados = True
+    Ticket._migrado = True
+
+
+def _sembrar(base, n):
+    """n tickets abiertos, cada uno de un cliente distinto (id guardado como string)"""
+    usuarios = [{"_id": ObjectId(), "usuario_nombre": f"Cliente{i}", "usuario_apellidos": "Prueba"}
+                for i in range(n)]
+    base["usuarios"].docs = usuarios
+    base["tickets"].docs = [
+        {"_id": ObjectId(), "usuario_id": str(u["_id"]), "asunto": "Pedido",
+         "estado": "pendiente", "prioridad": "media"}
+        for u in usuarios
+    ]
+
+
+def test_consultas_constantes_por_vista():
+    """Cada vista hace las mismas consultas con 10, 100 y 1000 tickets"""
+    print("\n" + "="*60)
+    print("TEST 1: Consultas Mongo por petición (soporte)")
+    print("="*60)
+
+    from flask import Flask
+    from controllers.support.supportController import supportController
+
+    vistas = {
+        "DashboardData": ("/soporte/api/dashboard", supportController.DashboardData),
+        "TicketsActivos": ("/soporte/tickets?page=1", supportController.TicketsActivos),
+        "AlertasSoporte": ("/soporte/alertas", supportController.AlertasSoporte),
+        "GestionEquipo": ("/soporte/gestion", supportController.GestionEquipo)
+    }
+    app = Flask(__name__)
+    base = BaseContada()
+    _preparar(base)
+
+    conteos = {nombre: [] for nombre in vistas}
+    for n in TAMANOS:
+        _sembrar(base, n)
+        supportController.invalidar_cache_dashboard()
+        for nombre, (ruta, vista) in vistas.items():
+            base.consultas.clear()
+            with app.test_request_context(ruta):
+                respuesta = vista()
+            assert "error" not in (respuesta.get_json() if hasattr(respuesta, "get_json") else respuesta), \
+                f"{nombre} falló con {n} tickets"
+            conteos[nombre].append(len(base.consultas))
+            print(f"   {nombre:15} | {n:5} tickets | {len(base.consultas):2} consultas | {base.consultas}")
+
+    for nombre, valores in conteos.items():
+        assert len(set(valores)) == 1, f"{nombre}: las consultas crecen con los tickets {valores}"
+        # Los nombres de cliente se resuelven: al menos una consulta a usuarios
+        assert valores[0] > 0
+    print("✅ Consultas por petición constantes en todas las vistas")
+
+
+def main():
+    pruebas = [
+        ("Consultas constantes por vista", test_consultas_constantes_por_vista)
+    ]
+
+    resultados = []
+    for nombre, test_func in pruebas:
+        # Cada prueba falla con una excepción (assert); si termina, pasó
+        try:
+            test_func()
+            resultados.append((nombre, True))
+        except Exception as e:
+            print(f"\n❌ Error ejecutando {nombre}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            resultados.append((nombre, False))
+
+    print("\n" + "="*60)
+    print("RESUMEN DE PRUEBAS")
+    print("="*60)
+    for nombre, resultado in resultados:
+        status = "✅ PASÓ" if resultado else "❌ FALLÓ"
+        print(f"{status} - {nombre}")
+
+    exitosas = sum(1 for _, r in resultados if r)
+    print(f"\nResultado: {exitosas}/{len(resultados)} pruebas exitosas")
+    return exitosas == len(resultados)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark de 30 días simulados: un respaldo completo diario en ZIP contra
+el almacén deduplicado ("cas"). Cada día la base cambia como en operación
+normal: ventas, comandas, auditoría y notificaciones crecen, algunos
+clientes y mesas se modifican y el catálogo (platillos, usuarios,
+configuración) casi no cambia.
+
+Reporta el espacio acumulado en disco y el tiempo de cada respaldo. Con
+--retencion N se eliminan los respaldos de más de N días y se recolectan
+los chunks sin referencias, como hace la tarea de retención.
+
+Uso: python utils/bench_backup_dedup.py [--dias 30] [--escala 0.2] [--retencion 0]
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bson import ObjectId
+from services.backups.backups import crear_respaldo, recolectar_chunks
+
+# colección: (documentos iniciales, insertados por día, modificados por día)
+COLECCIONES = {
+    "usuarios": (2_000, 2, 5),
+    "clientes": (20_000, 50, 100),
+    "mesas": (40, 0, 40),
+    "comandas": (120_000, 400, 0),
+    "ventas": (150_000, 400, 0),
+    "platillos": (300, 0, 2),
+    "configuracion": (50, 0, 0),
+    "auditoria": (80_000, 1_000, 0),
+    "notificaciones": (50_000, 300, 300)
+}
+
+
+class ColeccionSimulada:
+    """Documentos en memoria ordenados por _id con la interfaz de cursor que usa el motor"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.docs = []
+
+    def find(self, filtro=None, proyeccion=None):
+        return self
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return iter(list(self.docs))
+
+
+class BaseSimulada(dict):
+    def __init__(self, escala, semilla=7):
+        super().__init__()
+        self.random = random.Random(semilla)
+        self.siguiente_id = 0
+        self.fecha = datetime(2025, 1, 1)
+        self.escala = escala
+        for nombre, (iniciales, _, _) in COLECCIONES.items():
+            self[nombre] = ColeccionSimulada(nombre)
+            self._insertar(nombre, int(iniciales * escala))
+
+    def _documento(self, nombre):
+        self.siguiente_id += 1
+        return {
+            "_id": ObjectId(f"{self.siguiente_id:024x}"),
+            "coleccion": nombre,
+            "folio": f"F-{self.siguiente_id:08d}",
+            "mesa": self.random.randint(1, 40),
+            "total": round(self.random.uniform(100, 2000), 2),
+            "estado": "pagada",
+            "nota": "".join(self.random.choices("abcdefghij ", k=self.random.randint(10, 80))),
+            "created_at": self.fecha,
+            "updated_at": self.fecha
+        }
+
+    def _insertar(self, nombre, n):
+        self[nombre].docs.extend(self._documento(nombre) for _ in range(n))
+
+    def avanzar_dia(self):
+        self.fecha += timedelta(days=1)
+        for nombre, (_, insertados, modificados) in COLECCIONES.items():
+            docs = self[nombre].docs
+            for i in self.random.sample(range(len(docs)), min(len(docs), max(0, round(modificados * self.escala)))):
+                docs[i] = {**docs[i], "estado": self.random.choice(["pagada", "cancelada", "leida"]),
+                           "updated_at": self.fecha}
+            self._insertar(nombre, round(insertados * self.escala))
+
+
+def tamano(directorio):
+    total = 0
+    for raiz, _, archivos in os.walk(directorio):
+        total += sum(os.path.getsize(os.path.join(raiz, f)) for f in archivos)
+    return total
+
+
+def simular(dias, escala, retencion):
+    database = BaseSimulada(escala)
+    resultados = []
+    with tempfile.TemporaryDirectory() as dir_zip, tempfile.TemporaryDirectory() as dir_cas:
+        for dia in range(1, dias + 1):
+            database.avanzar_dia()
+            nombre = f"auto_backup_{dia:02d}"
+            completo = crear_respaldo(nombre, list(COLECCIONES), database, directorio=dir_zip,
+                                      formato="zip", workers=1)
+            dedup = crear_respaldo(nombre, list(COLECCIONES), database, directorio=dir_cas,
+                                   formato="cas", workers=1)
+            assert completo["documentos"] == dedup["documentos"]
+
+            if retencion and dia > retencion:
+                vencido = f"auto_backup_{dia - retencion:02d}"
+                os.remove(os.path.join(dir_zip, vencido + ".zip"))
+                os.remove(os.path.join(dir_cas, vencido + ".cas.json"))
+                # Misma recolección que la tarea de retención, sin periodo de gracia
+                recolectar_chunks(dir_cas, gracia_horas=0)
+
+            resultados.append({
+                "dia": dia,
+                "documentos": completo["documentos"],
+                "zip_segundos": completo["segundos"],
+                "cas_segundos": dedup["segundos"],
+                "zip_disco": tamano(dir_zip),
+                "cas_disco": tamano(dir_cas),
+                "cas_nuevo": dedup["bytes"]
+            })
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Respaldos diarios ZIP vs deduplicados")
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--escala", type=float, default=0.2, help="Multiplica documentos y cambios diarios")
+    parser.add_argument("--retencion", type=int, default=0, help="Días de retención (0 = conservar todo)")
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    print("=" * 78)
+    print(f"🗄️ {args.dias} DÍAS DE RESPALDOS COMPLETOS (escala {args.escala}, retención {args.retencion or '-'})")
+    print("=" * 78)
+    print(f"{'día':>4} | {'docs':>9} | {'zip s':>6} | {'cas s':>6} | {'cas nuevo':>9} | "
+          f"{'zip disco':>9} | {'cas disco':>9}")
+    resultados = simular(args.dias, args.escala, args.retencion)
+    for r in resultados:
+        if r["dia"] in (1, 2) or r["dia"] % 5 == 0 or r["dia"] == args.dias:
+            print(f"{r['dia']:4} | {r['documentos']:9,} | {r['zip_segundos']:6.2f} | {r['cas_segundos']:6.2f} | "
+                  f"{r['cas_nuevo'] / mb:7.2f}MB | {r['zip_disco'] / mb:7.1f}MB | {r['cas_disco'] / mb:7.1f}MB")
+
+    final = resultados[-1]
+    zip_s = sum(r["zip_segundos"] for r in resultados)
+    cas_s = sum(r["cas_segundos"] for r in resultados)
+    print("-" * 78)
+    print(f"   Disco al día {final['dia']}: ZIP {final['zip_disco'] / mb:.1f} MB, "
+          f"deduplicado {final['cas_disco'] / mb:.1f} MB "
+          f"(ahorro {100 * (1 - final['cas_disco'] / final['zip_disco']):.1f}%)")
+    print(f"   Tiempo total: ZIP {zip_s:.1f} s, deduplicado {cas_s:.1f} s "
+          f"(x{zip_s / cas_s:.2f})")
+    print("=" * 78)
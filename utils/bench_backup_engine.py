@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark del motor de respaldos: pico de memoria (RSS) y documentos/s del
+respaldo en streaming (.jsonl.gz y .zip por colección) contra el método anterior (list + json_util + json.dump)
+
+Cada modo corre en un subproceso para medir su propio pico de RSS. Los
+documentos se generan con un cursor sintético, sin servidor Mongo.
+
+Uso: python utils/bench_backup_engine.py [documentos] [documentos_legacy]
+"""
+import os
+import sys
+import json
+import time
+import random
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bson import ObjectId, json_util
+from services.backups.backups import crear_respaldo
+
+
+class CursorSintetico:
+    """Imita Collection.find(...).batch_size(n) generando documentos tipo venta"""
+
+    def __init__(self, total):
+        self.total = total
+
+    def find(self, filtro=None):
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        base = datetime(2025, 1, 1)
+        for i in range(self.total):
+            yield {
+                "_id": ObjectId(),
+                "folio": f"V-{i:08d}",
+                "mesa": random.randint(1, 40),
+                "mesero_id": ObjectId(),
+                "productos": [
+                    {"platillo": f"Platillo {j}", "cantidad": j % 3 + 1, "precio": 89.5 + j}
+                    for j in range(3)
+                ],
+                "total": round(random.uniform(100, 2000), 2),
+                "estado": "pagada",
+                "created_at": base + timedelta(seconds=i)
+            }
+
+
+def pico_rss_mb():
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def modo_streaming(total, directorio):
+    stats = crear_respaldo("bench", ["ventas"], {"ventas": CursorSintetico(total)}, directorio=directorio)
+    return stats["bytes"]
+
+
+def modo_zip(total, directorio):
+    stats = crear_respaldo("bench", ["ventas"], {"ventas": CursorSintetico(total)}, directorio=directorio,
+                           formato="zip")
+    return stats["bytes"]
+
+
+def modo_legacy(total, directorio):
+    data = list(CursorSintetico(total).find({}))
+    backup_data = {"ventas": json.loads(json_util.dumps(data))}
+    ruta = os.path.join(directorio, "bench.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(backup_data, f, ensure_ascii=False, indent=4)
+    return os.path.getsize(ruta)
+
+
+MODOS = {"legacy": modo_legacy, "streaming": modo_streaming, "zip": modo_zip}
+
+
+def correr(modo, total):
+    """Ejecuta un modo en un subproceso y devuelve su resultado"""
+    salida = subprocess.run(
+        [sys.executable, __file__, "--modo", modo, str(total)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--modo":
+        modo, total = sys.argv[2], int(sys.argv[3])
+        base = pico_rss_mb()
+        with tempfile.TemporaryDirectory() as directorio:
+            inicio = time.perf_counter()
+            tamano = MODOS[modo](total, directorio)
+            segundos = time.perf_counter() - inicio
+        print(json.dumps({
+            "pico_mb": pico_rss_mb(), "base_mb": base, "segundos": segundos,
+            "docs_s": total / segundos, "archivo_mb": tamano / 1024 / 1024
+        }))
+        sys.exit(0)
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    total_legacy = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+
+    print("=" * 70)
+    print("💾 BENCHMARK MOTOR DE RESPALDOS")
+    print("=" * 70)
+    for modo, n in (("legacy", total_legacy), ("streaming", total_legacy), ("streaming", total), ("zip", total)):
+        r = correr(modo, n)
+        print(f"   {modo:9} | {n:9,} docs | pico RSS {r['pico_mb']:7.1f} MB (base {r['base_mb']:.0f}) | "
+              f"{r['docs_s']:8,.0f} docs/s | archivo {r['archivo_mb']:7.1f} MB")
+    print("=" * 70)
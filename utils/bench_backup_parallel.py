@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark del respaldo completo de las 14 colecciones: tiempo de reloj
+exportando una colección tras otra (workers=1) contra el pool de hilos.
+
+Los cursores son sintéticos y simulan la latencia de cada getMore con el
+servidor (--latencia ms por lote), que es el tiempo que el pool solapa.
+Con latencia 0 solo se solapa la compresión.
+
+Uso: python utils/bench_backup_parallel.py [--workers 4] [--latencia 10] [--escala 1.0]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bson import ObjectId
+from services.backups.backups import crear_respaldo, BACKUP_BATCH_SIZE
+
+# Documentos por colección (aproximan una sucursal con un año de operación)
+COLECCIONES = {
+    "usuarios": 2_000,
+    "clientes": 20_000,
+    "mesas": 40,
+    "comandas": 120_000,
+    "ventas": 150_000,
+    "platillos": 300,
+    "actividad_reciente": 60_000,
+    "estadisticas_diarias": 365,
+    "prestamos": 5_000,
+    "pagos": 40_000,
+    "configuracion": 50,
+    "auditoria": 80_000,
+    "ia_logs": 30_000,
+    "notificaciones": 50_000
+}
+
+
+class CursorSintetico:
+    """Imita Collection.find(...).batch_size(n) con latencia por lote"""
+
+    def __init__(self, total, latencia):
+        self.total = total
+        self.latencia = latencia
+        self.lote = BACKUP_BATCH_SIZE
+
+    def find(self, filtro=None):
+        return self
+
+    def batch_size(self, n):
+        self.lote = n
+        return self
+
+    def __iter__(self):
+        base = datetime(2025, 1, 1)
+        for i in range(self.total):
+            if i % self.lote == 0 and self.latencia:
+                time.sleep(self.latencia)
+            yield {
+                "_id": ObjectId(),
+                "folio": f"F-{i:08d}",
+                "mesa": random.randint(1, 40),
+                "total": round(random.uniform(100, 2000), 2),
+                "estado": "pagada",
+                "created_at": base + timedelta(seconds=i)
+            }
+
+
+def respaldo(workers, latencia, escala, formato):
+    database = {
+        nombre: CursorSintetico(int(n * escala), latencia / 1000)
+        for nombre, n in COLECCIONES.items()
+    }
+    with tempfile.TemporaryDirectory() as directorio:
+        stats = crear_respaldo("bench", list(COLECCIONES), database, directorio=directorio,
+                               formato=formato, workers=workers)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Respaldo secuencial vs paralelo")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latencia", type=float, default=10, help="ms por lote (getMore)")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplica los documentos")
+    args = parser.parse_args()
+
+    total = sum(int(n * args.escala) for n in COLECCIONES.values())
+
+    print("=" * 70)
+    print(f"💾 RESPALDO COMPLETO: {len(COLECCIONES)} colecciones, {total:,} documentos")
+    print(f"   latencia simulada {args.latencia} ms por lote de {BACKUP_BATCH_SIZE}")
+    print("=" * 70)
+    for formato in ("jsonl", "zip"):
+        tiempos = {}
+        for workers in (1, args.workers):
+            stats = respaldo(workers, args.latencia, args.escala, formato)
+            assert stats["documentos"] == total
+            tiempos[workers] = stats["segundos"]
+            print(f"   {formato:5} | workers={workers:2} | {stats['segundos']:7.2f} s | "
+                  f"{total / stats['segundos']:9,.0f} docs/s | {stats['bytes'] / 1024 / 1024:6.1f} MB")
+        print(f"   {formato:5} | aceleración x{tiempos[1] / tiempos[args.workers]:.2f}")
+    print("=" * 70)
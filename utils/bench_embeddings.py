@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de similitud por embeddings: top-k coseno sobre la matriz
+float16 abierta con mmap (vectores aleatorios, no requiere el modelo)
+Uso: python utils/bench_embeddings.py [filas] [dim]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from services.support.embeddings import EmbeddingIndex
+
+
+def medir(fn, iteraciones=20):
+    """Devuelve milisegundos por llamada"""
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        fn()
+    return (time.perf_counter() - inicio) / iteraciones * 1000
+
+
+if __name__ == "__main__":
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+
+    print("=" * 60)
+    print(f"🧠 BENCHMARK EMBEDDINGS - dim {dim}, float16 + mmap")
+    print("=" * 60)
+
+    for filas in ([int(sys.argv[1])] if len(sys.argv) > 1 else [1000, 10000, 100000]):
+        vectores = np.random.randn(filas, dim).astype(np.float32)
+        vectores /= np.linalg.norm(vectores, axis=1, keepdims=True)
+
+        with tempfile.TemporaryDirectory() as directorio:
+            indice = EmbeddingIndex("bench", directorio)
+            indice.guardar([str(i) for i in range(filas)], vectores)
+            tamano = os.path.getsize(indice.matriz_path) / 1024 / 1024
+            ms = medir(lambda: indice.buscar(vectores[0], 5, excluir="0"))
+            print(f"   {filas:7} filas | {tamano:6.1f} MB en disco | top-5: {ms:7.2f} ms")
+            del indice
+
+    print("=" * 60)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del índice BM25 de FAQ: construcción y latencia por consulta
+Uso: python utils/bench_faq_search.py [entradas] [consultas]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.support.faq_search import FAQSearchIndex, FAQ_POR_DEFECTO
+
+PALABRAS = (
+    "pedido reservación mesa horario pago tarjeta factura domicilio envío menú "
+    "platillo bebida alergia vegano promoción descuento cupón cancelar reembolso "
+    "ticket estado cuenta contraseña acceso sucursal estacionamiento evento grupo "
+    "propina mesero cocina tiempo espera queja sugerencia whatsapp teléfono correo"
+).split()
+
+
+def entrada(i):
+    random.seed(i)
+    return {
+        "pregunta": "¿" + " ".join(random.choices(PALABRAS, k=6)) + "?",
+        "keywords": random.sample(PALABRAS, 3),
+        "respuesta": " ".join(random.choices(PALABRAS, k=25))
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    consultas = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    entradas = FAQ_POR_DEFECTO + [entrada(i) for i in range(n)]
+
+    print("=" * 60)
+    print(f"🔎 BENCHMARK FAQ BM25 - {len(entradas)} entradas")
+    print("=" * 60)
+
+    indice = FAQSearchIndex()
+    inicio = time.perf_counter()
+    indice.construir(entradas)
+    print(f"   Construcción: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    preguntas = [" ".join(random.choices(PALABRAS, k=4)) for _ in range(consultas)]
+    inicio = time.perf_counter()
+    for p in preguntas:
+        indice.buscar(p, 3)
+    print(f"   Consulta top-3: {(time.perf_counter() - inicio) / consultas * 1000:.3f} ms")
+
+    for p in ("¿A qué hora abren?", "quiero hablar por whatsapp", "seguimiento de mi ticket"):
+        puntaje, mejor = indice.buscar(p, 1)[0]
+        print(f"   '{p}' -> {puntaje} | {mejor['respuesta'][:50]}")
+    print("=" * 60)
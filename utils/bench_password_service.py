@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark de throughput de login para PasswordService
+Simula una ráfaga de logins concurrentes con 1, 4 y 8 hilos en el pool bcrypt
+Uso: python utils/bench_password_service.py [logins] [rounds]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.security.password_service import PasswordService
+
+
+def medir(workers, logins, hashed, password="clave-de-prueba"):
+    """Ejecuta `logins` verificaciones concurrentes y devuelve logins/segundo"""
+    PasswordService.configure(workers=workers, max_queue=logins)
+
+    # Un hilo "de petición" por login, como una ráfaga al inicio del turno
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as peticiones:
+        resultados = list(peticiones.map(
+            lambda _: PasswordService.verify_password(password, hashed),
+            range(logins)
+        ))
+    duracion = time.perf_counter() - inicio
+
+    assert all(resultados)
+    return logins / duracion, duracion
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else PasswordService.BCRYPT_ROUNDS
+
+    PasswordService.configure(rounds=rounds)
+    hashed = PasswordService.hash_password("clave-de-prueba")
+
+    print("=" * 60)
+    print(f"🔐 BENCHMARK LOGIN - {logins} logins, bcrypt rounds={rounds}, CPUs={os.cpu_count()}")
+    print("=" * 60)
+
+    for workers in (1, 4, 8):
+        throughput, duracion = medir(workers, logins, hashed)
+        print(f"   workers={workers}: {throughput:7.1f} logins/s  ({duracion:.2f}s total)")
+
+    print("=" * 60)
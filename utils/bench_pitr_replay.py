@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la recuperación a un momento: escritura de segmentos de
+cambios y velocidad de reproducción.
+
+Genera --cambios registros sintéticos (80% altas/cambios con el documento
+completo, 20% borrados) repartidos en varias colecciones y mide:
+    - captura:  registros/s escritos a segmentos BSON gzip en lotes de CAPTURA_LOTE
+    - lectura:  registros/s leídos y decodificados con leer_cambios
+    - replay:   registros/s de reproducir_cambios hasta la mitad del rango
+
+Sin --uri el replay va a una base nula que solo cuenta las operaciones
+(mide lectura, decodificación y armado de los bulk_write); con --uri se
+aplica en una base temporal de ese servidor, que se elimina al terminar.
+
+Uso: python utils/bench_pitr_replay.py [--cambios 200000] [--uri mongodb://localhost:27017]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from bson import ObjectId
+from services.backups.captura import (
+    escribir_segmento, leer_cambios, listar_segmentos, reproducir_cambios, CAPTURA_LOTE,
+    OP_CAMBIO, OP_BORRADO
+)
+
+COLECCIONES = ("comandas", "ventas", "clientes", "notificaciones", "usuarios")
+
+
+class ColeccionNula:
+    def __init__(self):
+        self.operaciones = 0
+
+    def bulk_write(self, operaciones, ordered=True):
+        self.operaciones += len(operaciones)
+
+    def drop(self):
+        pass
+
+
+class BaseNula(dict):
+    def __missing__(self, nombre):
+        self[nombre] = ColeccionNula()
+        return self[nombre]
+
+
+def generar(total, directorio):
+    """Escribe `total` cambios, un segundo simulado cada 10 registros"""
+    rng = random.Random(3)
+    inicio = datetime(2025, 3, 14, 8, 0)
+    ids = {c: [] for c in COLECCIONES}
+    lote = []
+    t0 = time.perf_counter()
+    for i in range(total):
+        col = rng.choice(COLECCIONES)
+        ts = inicio + timedelta(milliseconds=100 * i)
+        if ids[col] and rng.random() < 0.2:
+            registro = {"ts": ts, "op": OP_BORRADO, "col": col, "id": ids[col].pop(rng.randrange(len(ids[col])))}
+        else:
+            _id = ObjectId()
+            ids[col].append(_id)
+            registro = {"ts": ts, "op": OP_CAMBIO, "col": col, "doc": {
+                "_id": _id, "folio": f"F-{i:08d}", "mesa": rng.randint(1, 40),
+                "total": round(rng.uniform(100, 2000), 2), "estado": "pagada",
+                "created_at": ts, "updated_at": ts
+            }}
+        lote.append(registro)
+        if len(lote) >= CAPTURA_LOTE:
+            escribir_segmento(lote, directorio, ahora=ts)
+            lote = []
+    escribir_segmento(lote, directorio, ahora=inicio + timedelta(milliseconds=100 * total))
+    return inicio, inicio + timedelta(milliseconds=100 * total), time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Captura y reproducción de cambios")
+    parser.add_argument("--cambios", type=int, default=200_000)
+    parser.add_argument("--uri", help="Servidor Mongo para aplicar el replay (base temporal)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        desde, hasta, segundos_captura = generar(args.cambios, directorio)
+        segmentos = listar_segmentos(directorio)
+        tamano = sum(os.path.getsize(ruta) for _, ruta in segmentos)
+
+        t0 = time.perf_counter()
+        leidos = sum(1 for _ in leer_cambios(desde, hasta, directorio))
+        segundos_lectura = time.perf_counter() - t0
+
+        mitad = desde + (hasta - desde) / 2
+        cliente = None
+        if args.uri:
+            from pymongo import MongoClient
+            cliente = MongoClient(args.uri)
+            database = cliente[f"bench_pitr_{os.getpid()}"]
+        else:
+            database = BaseNula()
+        try:
+            resumen = reproducir_cambios(desde, mitad, database, directorio)
+        finally:
+            if cliente:
+                cliente.drop_database(database.name)
+
+    print("=" * 70)
+    print(f"⏪ CAPTURA Y REPLAY: {args.cambios:,} cambios, {len(segmentos)} segmentos, "
+          f"{tamano / 1024 / 1024:.1f} MB ({tamano / args.cambios:.0f} B/cambio)")
+    print("=" * 70)
+    print(f"   captura | {args.cambios / segundos_captura:10,.0f} cambios/s | {segundos_captura:6.2f} s")
+    print(f"   lectura | {leidos / segundos_lectura:10,.0f} cambios/s | {segundos_lectura:6.2f} s")
+    print(f"   replay  | {resumen['registros'] / resumen['segundos']:10,.0f} cambios/s | "
+          f"{resumen['segundos']:6.2f} s | {resumen['registros']:,} cambios hasta {resumen['ultimo']} "
+          f"({'Mongo' if args.uri else 'base nula'})")
+    print("=" * 70)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de generación de QR: PNG (PIL) contra SVG, con y sin caché
+Uso: python utils/bench_qr_service.py [iteraciones]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pyotp
+from services.security.qr_service import QRService
+
+
+def medir(fn, iteraciones):
+    """Devuelve milisegundos por llamada"""
+    inicio = time.perf_counter()
+    for i in range(iteraciones):
+        fn(i)
+    return (time.perf_counter() - inicio) / iteraciones * 1000
+
+
+def uri(i):
+    # Un secreto distinto por iteración para medir el render sin caché
+    return pyotp.TOTP(pyotp.random_base32()).provisioning_uri(
+        name=f"usuario{i}@callejon9.mx", issuer_name="Callejon 9"
+    )
+
+
+if __name__ == "__main__":
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    fija = uri(0)
+
+    print("=" * 60)
+    print(f"🔳 BENCHMARK QR - {iteraciones} iteraciones")
+    print("=" * 60)
+
+    for formato in ("png", "svg"):
+        sin_cache = medir(lambda i: QRService.render_data_url(uri(i), formato), iteraciones)
+        con_cache = medir(lambda i: QRService.render_data_url(fija, formato), iteraciones)
+        tamano = len(QRService.render_data_url(fija, formato))
+        print(f"   {formato.upper()}: {sin_cache:6.2f} ms/QR sin caché | "
+              f"{con_cache:6.3f} ms/QR con caché | data URL {tamano} bytes")
+
+    print("=" * 60)
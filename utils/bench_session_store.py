@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de overhead por petición del almacén de sesiones
+Compara Flask-Session filesystem contra StoreSessionInterface (memoria y,
+opcionalmente, MongoDB con caché LRU)
+Uso: python utils/bench_session_store.py [peticiones] [--mongo]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, session
+from flask_session import Session
+from services.sessions.session_store import (
+    StoreSessionInterface, MemorySessionStore, MongoSessionStore, LRUSessionCache
+)
+
+# Sesión típica después del login (sin permisos ni perfiles copiados)
+SESION_LOGIN = {
+    "usuario_id": "65f1c0ffee0000000000abcd",
+    "usuario_nombre": "Usuario",
+    "usuario_apellidos": "De Prueba",
+    "usuario_email": "usuario@callejon9.mx",
+    "usuario_rol": "2",
+    "usuario_foto": "",
+    "token_session": "x" * 43,
+    "theme": "light",
+    "2fa_enabled": False,
+    "2fa_verificado": True
+}
+
+
+def crear_app(configurar):
+    app = Flask(__name__)
+    app.secret_key = "bench"
+    app.config["SESSION_PERMANENT"] = True
+    configurar(app)
+
+    @app.route("/login")
+    def login():
+        session.update(SESION_LOGIN)
+        return "ok"
+
+    @app.route("/")
+    def index():
+        # Lectura típica de un decorador + vista
+        return session.get("usuario_nombre", "")
+
+    return app
+
+
+def medir(app, peticiones):
+    """Devuelve microsegundos por petición (solo lectura de sesión)"""
+    client = app.test_client()
+    client.get("/login")
+    for _ in range(500):
+        client.get("/")
+
+    inicio = time.perf_counter()
+    for _ in range(peticiones):
+        client.get("/")
+    return (time.perf_counter() - inicio) / peticiones * 1e6
+
+
+def sin_sesion(app):
+    pass
+
+
+if __name__ == "__main__":
+    peticiones = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 2000
+    usar_mongo = "--mongo" in sys.argv
+
+    def filesystem(app):
+        app.config["SESSION_TYPE"] = "filesystem"
+        app.config["SESSION_FILE_DIR"] = tempfile.mkdtemp(prefix="bench_sesiones_")
+        Session(app)
+
+    def memoria(app):
+        app.session_interface = StoreSessionInterface(LRUSessionCache(MemorySessionStore()))
+
+    escenarios = [("sin sesión (base)", sin_sesion), ("filesystem", filesystem), ("memoria + LRU", memoria)]
+
+    if usar_mongo:
+        from config.db import db
+
+        def mongo(app):
+            app.session_interface = StoreSessionInterface(LRUSessionCache(MongoSessionStore(db["bench_sesiones"])))
+
+        def mongo_sin_cache(app):
+            app.session_interface = StoreSessionInterface(MongoSessionStore(db["bench_sesiones"]))
+
+        escenarios += [("mongo + LRU", mongo), ("mongo sin caché", mongo_sin_cache)]
+
+    print("=" * 60)
+    print(f"🍪 BENCHMARK SESIONES - {peticiones} peticiones por escenario")
+    print("=" * 60)
+
+    base = None
+    for nombre, configurar in escenarios:
+        us = medir(crear_app(configurar), peticiones)
+        base = us if base is None else base
+        print(f"   {nombre:<20} {us:8.1f} µs/petición  (overhead {us - base:+.1f} µs)")
+
+    if usar_mongo:
+        db["bench_sesiones"].drop()
+
+    print("=" * 60)